@@ -1,65 +1,316 @@
+import ast
 import os
-import sys
+import re
+import threading
 import sublime
 import sublime_plugin
+from concurrent.futures import ThreadPoolExecutor
 
-try:
-    import jedi
-except ImportError:
-    PLUGIN_DIR = os.path.dirname(__file__)
-    JEDI_LIB_PATH = os.path.join(PLUGIN_DIR, "jedi_lib")
-    if JEDI_LIB_PATH not in sys.path:
-        sys.path.append(JEDI_LIB_PATH)
-    import jedi
+from .core import environment
+from .core.client import close_view, get_client as get_analysis_client, stop_server
+from .core.completion import completion_cache, identifier_start, rank, recent_completions
+from .core.document import documents
+from .core.metrics import metrics
+from .core.symbols import absolute_module, package_name, symbol_index
+from .core.viewport import large_file_excerpt
+from .core.warmup import WarmUp
 
-try:
-    ENVIRONMENT = jedi.get_system_environment("3")
-except jedi.api.environment.InvalidPythonEnvironment:
-    ENVIRONMENT = jedi.get_default_environment()
+SETTINGS_FILE = "kamal.sublime-settings"
+
+# jedi is not thread safe, so all inference runs on this one thread. The
+# syntax check parses on another, into a parso tree of its own (ParseState).
+JEDI_WORKER = ThreadPoolExecutor(max_workers=1)
+
+# Fills jedi's caches on the same thread while the user is idle
+WARM_UP = WarmUp(JEDI_WORKER.submit, sublime.set_timeout_async)
+
+
+def get_setting(key, default=None):
+    return sublime.load_settings(SETTINGS_FILE).get(key, default)
+
+
+def apply_settings():
+    # The Script cache needs jedi
+    environment.import_jedi()
+    from .core.script_cache import script_cache
+
+    settings = sublime.load_settings(SETTINGS_FILE)
+    script_cache.resize(settings.get("script_cache_size", 16))
+
+
+# The line before the cursor in the name list of a `from ... import`
+FROM_IMPORT = re.compile(r"^[ \t]*from[ \t]+(\.*)([\w.]*)[ \t]+import[ \t]+\(?[\w \t,]*$")
+
+
+# The lists are cut to completion_limit for the prefix typed so far, so
+# Sublime must ask again as it grows instead of filtering the cut list
+COMPLETION_FLAGS = sublime.DYNAMIC_COMPLETIONS
+
+
+def completion_limit():
+    """Number of completions shown, 0 for all"""
+    return get_setting("completion_limit", 100)
+
+
+def large_file_size():
+    """Size in characters above which jedi only sees the statement being edited, 0 for never"""
+    return get_setting("large_file_size", 1000000)
+
+
+def start_warm_up(window):
+    """Warm the configured modules, or those the window's project imports most"""
+    if window is None or not get_setting("warm_up", True):
+        return
+    modules = get_setting("warm_up_modules", [])
+    view = window.active_view()
+    path = view.file_name() if view else None
+    if modules:
+        WARM_UP.start(get_client, modules, path)
+    else:
+        WARM_UP.start_scan(get_client, window.folders(), get_setting("warm_up_count", 5), path)
+
+
+def load_analysis():
+    get_client()
+    apply_settings()
+    start_warm_up(sublime.active_window())
+
+
+def plugin_loaded():
+    environment.cache_dir = os.path.join(sublime.cache_path(), "kamal")
+    sublime.load_settings(SETTINGS_FILE).add_on_change("kamal.auto_completion", apply_settings)
+    # Import jedi and find the Python environment off the main thread, so
+    # neither Sublime's startup nor the first completion waits for them
+    sublime.set_timeout_async(load_analysis)
+
+
+def plugin_unloaded():
+    WARM_UP.cancel()
+    stop_server()
+
+
+def get_client():
+    """Run analyses in the analysis server if enabled, in process otherwise"""
+    return get_analysis_client(get_setting("analysis_server", False))
+
+
+def index_suggestions(symbols, prefix):
+    """The best completions among (name, annotation) pairs for `prefix`"""
+    keys = [name.lower() for name, _ in symbols]
+    return [
+        [f"{symbols[index][0]}\t{symbols[index][1]}", symbols[index][0]]
+        for index in rank(keys, prefix, completion_limit(), recent_completions.names())
+    ]
+
+
+def from_import_match(code, cursor):
+    """The match of FROM_IMPORT before `cursor`, None outside a `from ... import` name list"""
+    if not get_setting("symbol_index", True):
+        return None
+    return FROM_IMPORT.match(code, code.rfind("\n", 0, cursor) + 1, cursor)
+
+
+def from_import_completions(path, package, code, cursor):
+    """
+    Names to import in `from module import |` from the symbol index, without
+    jedi, for the file at `path` in `package`; None outside such a statement
+    or for modules not indexed. Reads the index, so never on the main thread.
+    """
+    match = from_import_match(code, cursor)
+    if match is None:
+        return None
+    node = ast.ImportFrom(module=match.group(2) or None, names=[], level=len(match.group(1)))
+    module = absolute_module(package, node)
+    symbols = symbol_index.module_symbols(module, path) if module else None
+    if not symbols:
+        return None
+    return index_suggestions(symbols, code[identifier_start(code, cursor):cursor])
+
+
+def project_completions(code, cursor):
+    """
+    Project-level names for the word at `cursor` from the symbol index, for
+    when jedi is late. Reads the index, so never on the main thread.
+    """
+    start = identifier_start(code, cursor)
+    prefix = code[start:cursor]
+    # Attributes are up to jedi
+    if len(prefix) < 2 or code[start - 1:start] == "." or not get_setting("symbol_index", True):
+        return []
+    try:
+        symbols = symbol_index.complete(prefix)
+    except Exception as ex:
+        print(f"kamal: symbol index lookup failed: {ex}")
+        return []
+    return index_suggestions([(name, f"{kind} {module}") for name, kind, module in symbols], prefix)
+
+
+class PendingCompletions:
+    """
+    A CompletionList resolved exactly once, either by the worker with jedi's
+    results or by the time budget running out
+    """
+
+    def __init__(self):
+        self.completion_list = sublime.CompletionList(flags=COMPLETION_FLAGS)
+        self.lock = threading.Lock()
+        self.resolved = False
+
+    def resolve(self, suggestions):
+        with self.lock:
+            if self.resolved:
+                return
+            self.resolved = True
+        self.completion_list.set_completions(suggestions, COMPLETION_FLAGS)
+
+    def expire(self, fallback):
+        """At the end of the time budget, resolve with `fallback()` unless jedi already did"""
+        if not self.resolved:
+            self.resolve(fallback())
 
 
 class JediAutocompleteListener(sublime_plugin.EventListener):
+    def __init__(self):
+        super().__init__()
+        self.executor = JEDI_WORKER
+        self.generations = {}  # view id -> number of the latest request
+        self.packages = {}  # view id -> (file name, its package name)
+
+    def package_name(self, view):
+        """Package of the view's file, found once per file name"""
+        path = view.file_name()
+        cached = self.packages.get(view.id())
+        if cached is None or cached[0] != path:
+            cached = self.packages[view.id()] = (path, package_name(path) if path else "")
+        return cached[1]
+
     def on_query_completions(self, view, prefix, locations):
         if not view.match_selector(locations[0], "source.python"):
             return []
 
+        WARM_UP.interactive()
+        change_count = view.change_count()
+        document = documents.get(view.id(), change_count, lambda: view.substr(sublime.Region(0, view.size())))
+        file_content = document.text
+        cursor_pos = locations[0]
+
+        # Extending the identifier being typed only narrows the last set
+        suggestions = completion_cache.lookup(
+            view.id(), file_content, cursor_pos, completion_limit(), recent_completions.names()
+        )
+        if suggestions is not None:
+            return sublime.CompletionList(suggestions, COMPLETION_FLAGS)
+
+        view_id = view.id()
+        generation = self.generations.get(view_id, 0) + 1
+        self.generations[view_id] = generation
+
+        # Never block typing on jedi or the symbol index: the worker fills
+        # the list when it is done, and past the budget the async thread
+        # shows the project's names from the index. The worker still stores
+        # its results, so the next keystroke is answered from the cache.
+        # The index answers imports of project modules without inference.
+        pending = PendingCompletions()
+        request = (view, generation, change_count, document, cursor_pos, pending)
+        if from_import_match(file_content, cursor_pos):
+            sublime.set_timeout_async(lambda: self.complete_import(*request))
+        else:
+            self.executor.submit(self.complete, *request)
+        sublime.set_timeout_async(
+            lambda: pending.expire(lambda: project_completions(file_content, cursor_pos)),
+            get_setting("completion_time_budget", 100)
+        )
+        return pending.completion_list
+
+    def complete_import(self, view, generation, change_count, document, cursor_pos, pending):
+        """Complete a `from module import` from the index, with jedi for modules not indexed"""
         try:
+            suggestions = from_import_completions(
+                view.file_name(), self.package_name(view), document.text, cursor_pos
+            )
+        except Exception as ex:
+            print(f"kamal: symbol index lookup failed: {ex}")
+            suggestions = None
+        if suggestions is None:
+            self.executor.submit(self.complete, view, generation, change_count, document, cursor_pos, pending)
+        else:
+            pending.resolve(suggestions)
 
-            file_content = view.substr(sublime.Region(0, view.size()))
-            
-            # Get the cursor position (line and column)
-            cursor_pos = locations[0]
-            line, column = view.rowcol(cursor_pos)
+    def complete(self, view, generation, change_count, document, cursor_pos, pending):
+        # Skip requests superseded by a newer one before they got to run
+        if self.generations.get(view.id()) != generation:
+            pending.resolve([])
+            return
+
+        file_content = document.text
+
+        # A request that ran late may have filled the cache for this one
+        limit, recent = completion_limit(), recent_completions.names()
+        suggestions = completion_cache.lookup(view.id(), file_content, cursor_pos, limit, recent)
+        if suggestions is not None:
+            pending.resolve(suggestions)
+            return
+
+        try:
+            # Get the cursor position (line and column) in this snapshot,
+            # the view may have changed since
+            line = file_content.count("\n", 0, cursor_pos)
+            column = cursor_pos - (file_content.rfind("\n", 0, cursor_pos) + 1)
             
             # Jedi uses 1-based line numbering
             line += 1
 
-            script = jedi.Script(
-                code=file_content, 
-                path=view.file_name(), 
-                environment=ENVIRONMENT
-            )
+            # Of large files jedi only gets the top-level statement around
+            # the cursor and the imports, versioned apart in the Script cache
+            code, part = file_content, None
+            excerpt = large_file_excerpt(document, cursor_pos, cursor_pos, large_file_size())
+            if excerpt:
+                code, line, part = excerpt.code, excerpt.to_excerpt(line), excerpt.version
 
-            # Get completions at the specific cursor position
-            completions = script.complete(line=line, column=column)
-            
-            suggestions = []
-            for comp in completions:
-                # Create more informative completion entries
-                trigger = comp.name
-                contents = comp.name
-                
-                # Add type information to the trigger for better display
-                if comp.type:
-                    trigger = f"{comp.name}\t{comp.type}"
-                
-                suggestions.append((trigger, contents))
-
-            return suggestions
+            with metrics.timed("completion.request", view.id(), len(code)):
+                suggestions = get_client().call(
+                    "complete",
+                    view=view.id(),
+                    change_count=change_count,
+                    code=code,
+                    line=line,
+                    column=column,
+                    path=view.file_name(),
+                    part=part,
+                    prefix=file_content[identifier_start(file_content, cursor_pos):cursor_pos],
+                    limit=limit,
+                    recent=recent
+                )
+
+            completion_cache.store(view.id(), file_content, cursor_pos, suggestions)
+            # Only the ranked head is shown, and has types
+            if limit:
+                suggestions = suggestions[:limit]
 
         except Exception as e:
             print(f"Jedi completion error: {e}")
-            return []
+            suggestions = []
+
+        pending.resolve(suggestions)
+
+    def on_post_text_command(self, view, command_name, args):
+        # Accepted completions rank higher in later requests
+        if command_name not in ("commit_completion", "insert_best_completion"):
+            return
+        point = view.sel()[0].b if len(view.sel()) else None
+        if point is None or not view.match_selector(point, "source.python"):
+            return
+        name = view.substr(sublime.Region(view.word(point).begin(), point))
+        if name.isidentifier():
+            recent_completions.add(name)
+
+    def on_close(self, view):
+        self.generations.pop(view.id(), None)
+        self.packages.pop(view.id(), None)
+        completion_cache.evict(view.id())
+        documents.discard(view.id())
+        if view.match_selector(0, "source.python"):
+            close_view(get_setting("analysis_server", False), view.id())
 
     def on_hover(self, view, point, hover_zone):
         """
@@ -70,112 +321,55 @@ class JediAutocompleteListener(sublime_plugin.EventListener):
             
         if hover_zone != sublime.HOVER_TEXT:
             return
-            
+
+        # Queued behind any running completion instead of racing it in jedi
+        WARM_UP.interactive()
+        self.executor.submit(self.show_documentation, view, point)
+
+    def on_load_project_async(self, window):
+        start_warm_up(window)
+
+    def on_pre_close_project(self, window):
+        WARM_UP.cancel()
+
+    def show_documentation(self, view, point):
         try:
             word_region = view.word(point)
             row, col = view.rowcol(point)
             
-            script = jedi.Script(
-                code=view.substr(sublime.Region(0, view.size())),
-                path=view.file_name()
-            )
-            
-            definitions = script.help(row + 1, col) or script.get_signatures(row + 1, col)
+            # Usually copied by the checks of this version already
+            change_count = view.change_count()
+            document = documents.get(view.id(), change_count, lambda: view.substr(sublime.Region(0, view.size())))
+            code, line, part = document.text, row + 1, None
+            excerpt = large_file_excerpt(document, point, point, large_file_size())
+            if excerpt:
+                code, line, part = excerpt.code, excerpt.to_excerpt(line), excerpt.version
+
+            with metrics.timed("hover.request", view.id(), len(document.text)):
+                content = get_client().call(
+                    "hover",
+                    view=view.id(),
+                    change_count=change_count,
+                    code=code,
+                    line=line,
+                    column=col,
+                    path=view.file_name(),
+                    part=part
+                )
             
-            if definitions:
-                def_info = definitions[0]
-                doc = def_info.docstring()
-                if doc:
-                    styles = """
-                        <style>
-                            body { 
-                                font-family: "Consolas", monospace; 
-                                font-size: 1.0em;
-                                padding: 5px;
-                            }
-                            .signature { 
-                                color: #89DDFF; 
-                                margin-bottom: 10px;
-                            }
-                            .example {
-                                color: #89DDFF;
-                                margin: 10px 0;
-                            }
-                            .keyword { color: #F07178; }
-                            .param { color: #A9DC76; }
-                            .param-default { color: #FFB86C; }
-                            .type { color: #78DCE8; }
-                            .string { color: #C3E88D; }
-                            .desc { 
-                                color: #CCCCCC;
-                                margin-top: 10px;
-                                line-height: 1.4;
-                            }
-                            .section { 
-                                color: #F07178;
-                                font-weight: bold;
-                                margin-top: 10px;
-                            }
-                        </style>
-                    """
-                    
-                    # Split the docstring into parts
-                    parts = doc.split("\n\n")
-                    signature = parts[0]
-                    example = parts[1] if len(parts) > 1 else ""
-                    description = parts[2] if len(parts) > 2 else ""
-                    
-                    # Format the signature
-                    signature = signature.replace(" -> ", " <span class='keyword'>-></span> ")
-                    signature = signature.replace("Optional[", "<span class='type'>Optional[</span>")
-                    signature = signature.replace("]", "<span class='type'>]</span>")
-                    signature = signature.replace("None", "<span class='type'>None</span>")
-                    signature = signature.replace("bool", "<span class='type'>bool</span>")
-                    signature = signature.replace("str", "<span class='type'>str</span>")
-                    signature = signature.replace("object", "<span class='type'>object</span>")
-                    
-                    # Add line breaks to signature
-                    signature = signature.replace(", ", ",<br>    ")
-                    
-                    # Format parameters
-                    import re
-                    signature = re.sub(r'(\w+):', r'<span class="param">\1</span>:', signature)
-                    signature = re.sub(r'=\.\.\.', r'=<span class="param-default">...</span>', signature)
-                    
-                    # Format the example
-                    example = example.replace("print", "<span class='keyword'>print</span>")
-                    example = example.replace("value", "<span class='param'>value</span>")
-                    example = example.replace("sys.stdout", "<span class='param'>sys.stdout</span>")
-                    example = example.replace("' '", "<span class='string'>' '</span>")
-                    example = example.replace("'\\n'", "<span class='string'>'\\n'</span>")
-                    example = example.replace("False", "<span class='keyword'>False</span>")
-                    example = example.replace("sep=", "<span class='param'>sep=</span>")
-                    example = example.replace("end=", "<span class='param'>end=</span>")
-                    example = example.replace("file=", "<span class='param'>file=</span>")
-                    example = example.replace("flush=", "<span class='param'>flush=</span>")
-                    
-                    # Format the description
-                    description = description.replace("\n", "<br>")
-                    description = re.sub(
-                        r'Optional keyword arguments:',
-                        r'<span class="section">Optional keyword arguments:</span>',
-                        description
-                    )
-                    
-                    # Build the final HTML content
-                    content = f"""
-                        {styles}
-                        <div class='signature'>{signature}</div>
-                        <div class='example'>{example}</div>
-                        <div class='desc'>{description}</div>
-                    """
-                    
-                    view.show_popup(
-                        content,
-                        flags=sublime.HIDE_ON_MOUSE_MOVE_AWAY | sublime.COOPERATE_WITH_AUTO_COMPLETE,
-                        location=point,
-                        max_width=800
-                    )
+            if content:
+                view.show_popup(
+                    content,
+                    flags=sublime.HIDE_ON_MOUSE_MOVE_AWAY | sublime.COOPERATE_WITH_AUTO_COMPLETE,
+                    location=point,
+                    max_width=800
+                )
                     
         except Exception as e:
-            print(f"Jedi hover error: {str(e)}")
\ No newline at end of file
+            print(f"Jedi hover error: {str(e)}")
+
+class KamalCancelWarmUpCommand(sublime_plugin.ApplicationCommand):
+    """Stop warming up modules until the next project is opened"""
+
+    def run(self):
+        WARM_UP.cancel()
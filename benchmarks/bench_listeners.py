@@ -0,0 +1,271 @@
+"""
+Time the plugins' event listeners on generated buffers.
+
+The listeners run against the stub `sublime` modules in benchmarks/stubs,
+with the real jedi, on valid and broken corpora of every kind and size. For
+each operation the best wall time over the repeats and the peak Python
+memory of one run are reported, followed by the scaling exponent of the wall
+time with the buffer size (1 is linear). Run from the repository root:
+
+    python benchmarks/bench_listeners.py --lines 100 1000 10000 50000
+
+Save the results and compare later runs against them to catch regressions;
+the run exits with status 1 when an operation got slower or bigger than the
+tolerance allows:
+
+    python benchmarks/bench_listeners.py --save baseline.json
+    python benchmarks/bench_listeners.py --baseline baseline.json --tolerance 0.25
+"""
+import argparse
+import contextlib
+import importlib
+import io
+import json
+import math
+import os
+import sys
+import time
+import tracemalloc
+import types
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, "stubs"))
+
+import sublime  # noqa: E402  (the stub)
+
+from corpora import KINDS, make_source  # noqa: E402
+
+PACKAGE_NAME = "kamal"
+PACKAGE_ROOT = os.path.dirname(BENCH_DIR)
+
+
+def load_plugins():
+    """Import the plugin modules as Sublime does, as modules of the package"""
+    package = types.ModuleType(PACKAGE_NAME)
+    package.__path__ = [PACKAGE_ROOT]
+    sys.modules[PACKAGE_NAME] = package
+    return types.SimpleNamespace(
+        syntax=importlib.import_module(PACKAGE_NAME + ".syntax_checker"),
+        completion=importlib.import_module(PACKAGE_NAME + ".auto_completion"),
+        variables=importlib.import_module(PACKAGE_NAME + ".variable_checker"),
+    )
+
+
+class Listeners:
+    """One instance of every listener, as the plugin host creates them"""
+
+    def __init__(self, plugins):
+        self.plugins = plugins
+        self.syntax = plugins.syntax.JediSyntaxErrorHighlighter()
+        self.completion = plugins.completion.JediAutocompleteListener()
+        self.variables = plugins.variables.UndefinedVariablesEventListener()
+
+    def drain(self):
+        """Wait for the completion worker, then run the queued timers"""
+        self.completion.executor.submit(lambda: None).result()
+        sublime.run_timers()
+
+    def close(self, view):
+        for listener in (self.syntax, self.completion, self.variables):
+            listener.on_close(view)
+        self.drain()
+
+
+def edited(code):
+    """The code with a statement inserted at the line boundary nearest the middle"""
+    middle = code.find("\n\n", len(code) // 2) + 1 or len(code)
+    return code[:middle] + "edited = 1\n" + code[middle:]
+
+
+# About a screenful of the generated code
+VIEWPORT = 3000
+
+
+def make_view(code):
+    """A view scrolled to the top, which matters to the large file mode"""
+    view = sublime.View(code, "/bench/module.py")
+    view.viewport = (0, min(len(code), VIEWPORT))
+    return view
+
+
+# Every operation prepares a fresh view, then returns the callable to time
+
+def check_undefined_variables(listeners, code):
+    view = make_view(code)
+    return view, lambda: listeners.plugins.variables.check_undefined_variables(view)
+
+
+def check_undefined_variables_after_edit(listeners, code):
+    view = make_view(code)
+    listeners.plugins.variables.check_undefined_variables(view)
+    view.set_text(edited(code))
+    return view, lambda: listeners.plugins.variables.check_undefined_variables(view)
+
+
+def on_modified_async(listeners, code):
+    view = make_view(code)
+
+    def run():
+        listeners.syntax.on_modified_async(view)
+        sublime.run_timers()
+
+    return view, run
+
+
+def on_query_completions(listeners, code):
+    code += "os.pa"
+    view = make_view(code)
+
+    def run():
+        completions = listeners.completion.on_query_completions(view, "pa", [len(code)])
+        listeners.drain()
+        if not getattr(completions, "completions", completions):
+            raise RuntimeError("no completions")
+
+    return view, run
+
+
+def on_hover(listeners, code):
+    view = make_view(code)
+    point = code.rfind("sum(values)") + 1
+
+    def run():
+        listeners.completion.on_hover(view, point, sublime.HOVER_TEXT)
+        listeners.drain()
+        if not view.popups:
+            raise RuntimeError("no hover popup")
+
+    return view, run
+
+
+OPERATIONS = {
+    "undefined": check_undefined_variables,
+    "undefined-edit": check_undefined_variables_after_edit,
+    "modified": on_modified_async,
+    "complete": on_query_completions,
+    "hover": on_hover,
+}
+
+
+def measure(listeners, operation, code, repeat, memory):
+    """Best wall time in ms over `repeat` runs and peak memory in MB of one more"""
+    timings = []
+    peak = None
+    for attempt in range(repeat + (1 if memory else 0)):
+        view, run = operation(listeners, code)
+        # The plugins print every error they find to the console
+        with contextlib.redirect_stdout(io.StringIO()):
+            if attempt == repeat:
+                tracemalloc.start()
+                run()
+                peak = tracemalloc.get_traced_memory()[1] / 2 ** 20
+                tracemalloc.stop()
+            else:
+                start = time.perf_counter()
+                run()
+                timings.append((time.perf_counter() - start) * 1000)
+            listeners.close(view)
+    return min(timings), peak
+
+
+def scaling(points):
+    """Least squares slope of log(time) against log(lines)"""
+    points = [(math.log(lines), math.log(max(ms, 1e-3))) for lines, ms in points]
+    if len(points) < 2:
+        return None
+    mean_x = sum(x for x, _ in points) / len(points)
+    mean_y = sum(y for _, y in points) / len(points)
+    spread = sum((x - mean_x) ** 2 for x, _ in points)
+    if not spread:
+        return None
+    return sum((x - mean_x) * (y - mean_y) for x, y in points) / spread
+
+
+def result_key(result):
+    buffer = "invalid" if result["broken"] else "valid"
+    return f"{result['kind']}/{buffer}/{result['lines']}/{result['operation']}"
+
+
+def regressions(results, baseline, tolerance, min_ms):
+    """Messages for the results worse than their baseline beyond the tolerance"""
+    previous = {result_key(result): result for result in baseline}
+    found = []
+    for result in results:
+        base = previous.get(result_key(result))
+        if base is None:
+            continue
+        ms, base_ms = result["ms"], base["ms"]
+        # Tiny timings are mostly noise
+        if ms > base_ms * (1 + tolerance) and ms - base_ms > min_ms:
+            found.append(f"{result_key(result)}: {base_ms:.1f}ms -> {ms:.1f}ms")
+        peak, base_peak = result.get("peak_mb"), base.get("peak_mb")
+        if peak is not None and base_peak is not None and peak > base_peak * (1 + tolerance):
+            found.append(f"{result_key(result)}: {base_peak:.1f}MB -> {peak:.1f}MB")
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--lines", type=int, nargs="+", default=[100, 1000, 10000, 50000])
+    parser.add_argument("--kinds", nargs="+", choices=KINDS, default=list(KINDS))
+    parser.add_argument("--operations", nargs="+", choices=list(OPERATIONS), default=list(OPERATIONS))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--no-memory", action="store_true", help="skip the peak memory run")
+    parser.add_argument("--save", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="compare against results saved with --save")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed slowdown over the baseline, as a fraction")
+    parser.add_argument("--min-ms", type=float, default=5.0,
+                        help="ignore slowdowns smaller than this many ms")
+    args = parser.parse_args()
+
+    listeners = Listeners(load_plugins())
+
+    results = []
+    print(f"{'kind':>15} {'buffer':>8} {'lines':>7} {'operation':>15} {'time':>10} {'peak':>9}")
+    for kind in args.kinds:
+        for broken in (False, True):
+            for lines in args.lines:
+                code = make_source(lines, broken, kind)
+                for name in args.operations:
+                    ms, peak = measure(listeners, OPERATIONS[name], code, args.repeat, not args.no_memory)
+                    results.append({
+                        "kind": kind,
+                        "broken": broken,
+                        "lines": lines,
+                        "operation": name,
+                        "ms": ms,
+                        "peak_mb": peak,
+                    })
+                    print(f"{kind:>15} {'invalid' if broken else 'valid':>8} {code.count(chr(10)):>7} "
+                          f"{name:>15} {ms:>8.1f}ms " + (f"{peak:>7.1f}MB" if peak is not None else ""))
+
+    print("\nScaling exponent of the time with the number of lines")
+    for kind in args.kinds:
+        for broken in (False, True):
+            for name in args.operations:
+                exponent = scaling([
+                    (result["lines"], result["ms"]) for result in results
+                    if (result["kind"], result["broken"], result["operation"]) == (kind, broken, name)
+                ])
+                if exponent is not None:
+                    print(f"{kind:>15} {'invalid' if broken else 'valid':>8} {name:>15} {exponent:>6.2f}")
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as file:
+            json.dump({"results": results}, file, indent=1)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as file:
+            baseline = json.load(file)["results"]
+        found = regressions(results, baseline, args.tolerance, args.min_ms)
+        if found:
+            print("\nRegressions:")
+            for message in found:
+                print("  " + message)
+            sys.exit(1)
+        print("\nNo regressions")
+
+
+if __name__ == "__main__":
+    main()
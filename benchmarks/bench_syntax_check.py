@@ -0,0 +1,63 @@
+"""
+Compare the two syntax check paths used by syntax_checker.py.
+
+The fast path is CPython's compile() with PyCF_ONLY_AST; the slow path is
+jedi's error-recovering parse via Script.get_syntax_errors(). Run from the
+repository root:
+
+    python benchmarks/bench_syntax_check.py --lines 1000 10000 50000
+"""
+import argparse
+import ast
+import time
+import warnings
+
+import jedi
+
+from corpora import make_source
+
+
+def fast_path(code):
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            compile(code, "<bench>", "exec", ast.PyCF_ONLY_AST, dont_inherit=True)
+    except SyntaxError:
+        return False
+    return True
+
+
+def slow_path(code):
+    return jedi.Script(code=code).get_syntax_errors()
+
+
+def tiered(code):
+    return [] if fast_path(code) else slow_path(code)
+
+
+def best_of(func, code, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(code)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--lines", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'lines':>8} {'buffer':>8} {'compile':>10} {'jedi':>10} {'tiered':>10}")
+    for lines in args.lines:
+        for broken in (False, True):
+            code = make_source(lines, broken)
+            timings = [best_of(func, code, args.repeat) for func in (fast_path, slow_path, tiered)]
+            print(f"{code.count(chr(10)):>8} {'invalid' if broken else 'valid':>8} " +
+                  " ".join(f"{t * 1000:>8.1f}ms" for t in timings))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Generated Python sources for the benchmarks.
+
+Every corpus starts with `import os` and ends with TAIL, so the completion
+and hover benchmarks have the same targets whatever the kind or size.
+"""
+
+HEADER = "import os\n\n"
+
+TAIL = '''
+def tail(values):
+    total = sum(values)
+    return total
+
+'''
+
+BLOCK = '''
+class Widget{n}:
+    """Generated class number {n}"""
+
+    def __init__(self, size={n}):
+        self.size = size
+        self.items = [i * 2 for i in range(size) if i % 3]
+
+    def total(self, extra=None):
+        result = sum(self.items)
+        if extra is not None:
+            result += extra
+        return {{"size": self.size, "total": result}}
+
+'''
+
+COMPREHENSIONS = '''
+def table{n}(rows):
+    cells = [[(x, y) for x in range(row) if x % 2] for y, row in enumerate(rows)]
+    index = {{key: [v for v in values if v] for key, values in zip(rows, cells)}}
+    flat = {{item for group in index.values() for pair in group for item in pair}}
+    pairs = list((a, b) for a in flat for b in flat if (c := a - b) > {n} and c)
+    return sorted(pairs, key=lambda pair: [p * 2 for p in pair])
+
+'''
+
+BROKEN = "def broken(:\n    pass\n"
+
+# Indentation depth of one nested block, CPython allows at most 100 levels
+NESTING_DEPTH = 20
+
+
+def nested_block(n):
+    lines = [f"def nested{n}(value):"]
+    indent = "    "
+    for depth in range(NESTING_DEPTH):
+        lines.append(f"{indent}level{depth} = value + {depth}")
+        lines.append(f"{indent}if level{depth} > {n}:")
+        indent += "    "
+    lines.append(f"{indent}return [level{depth} for _ in range(level0)]")
+    lines.append("    return None\n\n")
+    return "\n".join(lines)
+
+
+def block_factory(kind):
+    """Function of the block number returning one block of the given kind"""
+    if kind == "flat":
+        return lambda n: BLOCK.format(n=n)
+    if kind == "comprehensions":
+        return lambda n: COMPREHENSIONS.format(n=n)
+    if kind == "nested":
+        return nested_block
+    raise ValueError(f"unknown corpus kind: {kind}")
+
+
+KINDS = ("flat", "nested", "comprehensions")
+
+
+def make_source(lines, broken=False, kind="flat"):
+    """Generate roughly `lines` lines of code, optionally with an error in the middle"""
+    make_block = block_factory(kind)
+    block_lines = make_block(0).count("\n")
+    blocks = [make_block(n) for n in range(max(1, lines // block_lines))]
+    if broken:
+        blocks.insert(len(blocks) // 2, BROKEN)
+    return HEADER + "".join(blocks) + TAIL
@@ -0,0 +1,239 @@
+"""
+Minimal stand-in for Sublime Text's `sublime` module, enough to drive the
+plugins outside the editor. Timers are queued instead of run, the harness
+fires them with `run_timers()` so every measurement is deterministic.
+Time doesn't pass during `run_timers()`: timers queued meanwhile with a
+delay wait for the next call.
+"""
+import os
+import tempfile
+import threading
+
+HOVER_TEXT = 1
+HOVER_GUTTER = 2
+HOVER_MARGIN = 3
+
+DRAW_NO_FILL = 32
+DRAW_NO_OUTLINE = 256
+DRAW_SQUIGGLY_UNDERLINE = 1024
+
+HIDE_ON_MOUSE_MOVE_AWAY = 2
+COOPERATE_WITH_AUTO_COMPLETE = 2
+INHIBIT_WORD_COMPLETIONS = 8
+INHIBIT_EXPLICIT_COMPLETIONS = 16
+DYNAMIC_COMPLETIONS = 32
+
+_timers = []
+_timers_lock = threading.Lock()
+_settings = {}
+
+
+def set_timeout(callback, delay=0):
+    with _timers_lock:
+        _timers.append((callback, delay))
+
+
+set_timeout_async = set_timeout
+
+
+def run_timers():
+    """Run the queued timer callbacks, and those they queue without a delay"""
+    with _timers_lock:
+        due = _timers[:]
+        del _timers[:]
+    while due:
+        callback, _ = due.pop(0)
+        callback()
+        with _timers_lock:
+            due.extend(timer for timer in _timers if not timer[1])
+            _timers[:] = [timer for timer in _timers if timer[1]]
+
+
+def cache_path():
+    return os.path.join(tempfile.gettempdir(), "sublime-cache")
+
+
+def active_window():
+    return None
+
+
+def windows():
+    return []
+
+
+def status_message(message):
+    pass
+
+
+def error_message(message):
+    pass
+
+
+class Settings(dict):
+    def get(self, key, default=None):
+        return dict.get(self, key, default)
+
+    def set(self, key, value):
+        self[key] = value
+
+    def add_on_change(self, tag, callback):
+        pass
+
+    def clear_on_change(self, tag):
+        pass
+
+
+def load_settings(name):
+    return _settings.setdefault(name, Settings())
+
+
+class Region:
+    __slots__ = ("a", "b")
+
+    def __init__(self, a, b=None):
+        self.a = a
+        self.b = a if b is None else b
+
+    def __str__(self):
+        return f"({self.a}, {self.b})"
+
+    def __repr__(self):
+        return f"Region({self.a}, {self.b})"
+
+    def __eq__(self, other):
+        return isinstance(other, Region) and (self.a, self.b) == (other.a, other.b)
+
+    def begin(self):
+        return min(self.a, self.b)
+
+    def end(self):
+        return max(self.a, self.b)
+
+    def size(self):
+        return abs(self.b - self.a)
+
+    def contains(self, point):
+        return self.begin() <= point <= self.end()
+
+
+class CompletionList:
+    def __init__(self, completions=None, flags=0):
+        self.completions = completions
+        self.flags = flags
+        self.resolved = threading.Event()
+        if completions is not None:
+            self.resolved.set()
+
+    def set_completions(self, completions, flags=0):
+        self.completions = completions
+        self.flags = flags
+        self.resolved.set()
+
+
+class View:
+    """A buffer held in memory, with the View methods the plugins use"""
+
+    _next_id = 1
+
+    def __init__(self, text, file_name=None):
+        self._id = View._next_id
+        View._next_id += 1
+        self._file_name = file_name
+        self._change_count = 0
+        self.regions = {}
+        self.status = {}
+        self.popups = []
+        self.viewport = None  # (begin, end) of the visible region, all by default
+        self.set_text(text)
+
+    def set_text(self, text):
+        self.text = text
+        self._change_count += 1
+        # Line start offsets, for rowcol/text_point on large buffers
+        self._starts = [0]
+        position = text.find("\n")
+        while position != -1:
+            self._starts.append(position + 1)
+            position = text.find("\n", position + 1)
+
+    def id(self):
+        return self._id
+
+    def buffer_id(self):
+        return self._id
+
+    def is_valid(self):
+        return True
+
+    def file_name(self):
+        return self._file_name
+
+    def change_count(self):
+        return self._change_count
+
+    def size(self):
+        return len(self.text)
+
+    def match_selector(self, point, selector):
+        return selector.startswith("source.python")
+
+    def substr(self, region):
+        if isinstance(region, int):
+            return self.text[region:region + 1]
+        return self.text[region.begin():region.end()]
+
+    def text_point(self, row, col):
+        row = min(max(row, 0), len(self._starts) - 1)
+        return min(self._starts[row] + col, len(self.text))
+
+    def rowcol(self, point):
+        from bisect import bisect_right
+        row = bisect_right(self._starts, point) - 1
+        return row, point - self._starts[row]
+
+    def line(self, point):
+        if isinstance(point, Region):
+            point = point.begin()
+        start = self.text.rfind("\n", 0, point) + 1
+        end = self.text.find("\n", point)
+        return Region(start, len(self.text) if end == -1 else end)
+
+    def word(self, point):
+        start = end = point
+        while start > 0 and (self.text[start - 1].isalnum() or self.text[start - 1] == "_"):
+            start -= 1
+        while end < len(self.text) and (self.text[end].isalnum() or self.text[end] == "_"):
+            end += 1
+        return Region(start, end)
+
+    def visible_region(self):
+        if self.viewport is None:
+            return Region(0, len(self.text))
+        return Region(*self.viewport)
+
+    def settings(self):
+        return Settings()
+
+    def window(self):
+        return None
+
+    def add_regions(self, key, regions, *args, **kwargs):
+        self.regions[key] = list(regions)
+
+    def get_regions(self, key):
+        return self.regions.get(key, [])
+
+    def erase_regions(self, key):
+        self.regions.pop(key, None)
+
+    def set_status(self, key, value):
+        self.status[key] = value
+
+    def get_status(self, key):
+        return self.status.get(key, "")
+
+    def erase_status(self, key):
+        self.status.pop(key, None)
+
+    def show_popup(self, content, flags=0, location=-1, max_width=320, max_height=240):
+        self.popups.append(content)
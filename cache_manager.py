@@ -0,0 +1,102 @@
+import sublime
+import sublime_plugin
+
+from .core.client import running_server
+from .core.memory import MB, format_sizes, memory_budget
+
+SETTINGS_FILE = "kamal.sublime-settings"
+
+# Milliseconds between checks of the memory budget
+TRIM_INTERVAL = 60000
+
+# Bumped on unload, so the previous trim loop stops
+_generation = 0
+
+
+def get_setting(key, default=None):
+    return sublime.load_settings(SETTINGS_FILE).get(key, default)
+
+
+def budget():
+    """Budget in bytes for the analysis state of each process, 0 for none"""
+    return int(get_setting("memory_budget", 512) * MB)
+
+
+def shown_views():
+    """Ids of the views shown in any window's groups, never evicted"""
+    shown = set()
+    for window in sublime.windows():
+        for group in range(window.num_groups()):
+            view = window.active_view_in_group(group)
+            if view is not None:
+                shown.add(view.id())
+    return shown
+
+
+def trim():
+    """Evict the state of views unused the longest until the caches fit the budget"""
+    limit = budget()
+    if not limit:
+        return
+    keep = list(shown_views())
+    memory_budget.trim(limit, keep)
+
+    # The analysis server keeps caches of its own
+    server = running_server() if get_setting("analysis_server", False) else None
+    if server is not None:
+        server.submit("trim", limit=limit, keep=keep)
+
+
+def trim_periodically(generation):
+    if generation != _generation:
+        return
+    try:
+        trim()
+    except Exception as ex:
+        print(f"kamal: trimming caches failed: {ex}")
+    sublime.set_timeout_async(lambda: trim_periodically(generation), TRIM_INTERVAL)
+
+
+def plugin_loaded():
+    generation = _generation
+    sublime.set_timeout_async(lambda: trim_periodically(generation), TRIM_INTERVAL)
+
+
+def plugin_unloaded():
+    global _generation
+    _generation += 1
+
+
+class KamalCacheSizesCommand(sublime_plugin.WindowCommand):
+    """Show the estimated size of every analysis cache, overall and per view, in a scratch view"""
+
+    def run(self):
+        view_names = {
+            view.id(): view.file_name() or view.name() or "untitled"
+            for window in sublime.windows()
+            for view in window.views()
+        }
+        report = format_sizes(memory_budget.report(budget()), "Plugin host", view_names)
+
+        server = running_server() if get_setting("analysis_server", False) else None
+        if server is not None:
+            try:
+                sizes = server.submit("memory", limit=budget()).result(timeout=2)
+                report += "\n" + format_sizes(sizes, "Analysis server", view_names)
+            except Exception as ex:
+                report += f"\nAnalysis server cache sizes unavailable: {ex}\n"
+
+        view = self.window.new_file()
+        view.set_name("kamal: Cache Sizes")
+        view.set_scratch(True)
+        view.run_command("append", {"characters": report})
+        view.set_read_only(True)
+
+
+class KamalCacheManagerListener(sublime_plugin.EventListener):
+    def on_activated_async(self, view):
+        # Switching to a view counts as using it
+        memory_budget.touch(view.id())
+
+    def on_close(self, view):
+        memory_budget.forget(view.id())
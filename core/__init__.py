@@ -0,0 +1,6 @@
+"""
+Analysis code shared by the kamal plugins.
+
+Nothing in this package imports sublime, so it can be used and measured
+outside the editor.
+"""
@@ -0,0 +1,148 @@
+"""
+The analyses behind the listeners, independent of where they run.
+
+The plugins call an Analyzer in process, the analysis server calls the same
+one in its own process. Arguments and results are plain JSON types so both
+can share one set of methods. In process, `code` may also be a callable
+returning the buffer, so a cache hit doesn't copy it.
+
+Given the view's change count, analyses of one version of a buffer share
+its Document, and with it the copy of the text and its parses. `part` tells
+the excerpts of a large buffer apart, see core.viewport.
+"""
+from .completion import rank
+from .document import Document, documents
+from .hover import hover_cache
+from .memory import memory_budget
+from .metrics import metrics
+from .parsing import parse_states
+from .script_cache import script_cache
+from .syntax import find_syntax_errors
+from .undefined import find_undefined, undefined_checkers
+
+
+class Analyzer:
+    def __init__(self, environment):
+        self.environment = environment
+        self.grammar = environment.get_grammar()
+
+    def document(self, view, change_count, code, part=None):
+        """The shared Document of this version of the view, or a private one"""
+        if view is None or change_count is None:
+            return Document(code() if callable(code) else code)
+        return documents.get(view, change_count, code, part)
+
+    def get_script(self, view, change_count, code, path, part=None):
+        version = change_count if part is None else f"{change_count}:{part}"
+        read_code = lambda: self.document(view, change_count, code, part).text
+        return script_cache.get(view, version, read_code, path, self.environment)
+
+    def syntax(self, view, code, path=None, change_count=None, part=None):
+        """List of {line, column, message} for the syntax errors in `code`"""
+        document = self.document(view, change_count, code, part)
+        state = parse_states.get(view, path, self.grammar)
+        with metrics.timed("analysis.parse", view, len(document.text)):
+            return find_syntax_errors(state, document)
+
+    def undefined(self, code, view=None, defined=(), change_count=None, part=None, engine=None):
+        """
+        List of [name, line, column, end column] for undefined names, raises
+        SyntaxError. With a view, only statements changed since its last
+        check are analysed again. Names in `defined` are bound elsewhere,
+        e.g. outside a large file's excerpt. `engine` names one of
+        core.undefined.ENGINES.
+        """
+        if view is None:
+            return [list(item) for item in find_undefined(code, engine or "symtable")]
+        document = self.document(view, change_count, code, part)
+        with metrics.timed("analysis.undefined", view, len(document.text)):
+            return [
+                list(item)
+                for item in undefined_checkers.check(view, document.text, defined, document.ast, engine)
+            ]
+
+    def complete(self, view, change_count, code, line, column, path=None, part=None,
+                 prefix="", limit=None, recent=()):
+        """
+        List of [trigger, contents] completions at 1-based `line` fuzzy
+        matching the identifier `prefix` before the cursor. The best `limit`
+        come first, ranked by core.completion.rank with `recent` names
+        boosted, and only they get their type in the trigger; the rest
+        follow as jedi found them, for narrowing as the prefix grows.
+        """
+        from jedi import settings
+
+        script = self.get_script(view, change_count, code, path, part)
+
+        # Get completions at the specific cursor position
+        with metrics.timed("analysis.complete", view) as timing:
+            completions = script.complete(line=line, column=column, fuzzy=True)
+            timing.cause = f"{len(completions)} completions at {line}:{column}"
+
+        names = [comp.name for comp in completions]
+        case_insensitive = settings.case_insensitive_completion
+        keys = [name.lower() for name in names] if case_insensitive else names
+        shown = rank(keys, prefix, limit, recent, case_insensitive)
+
+        suggestions = []
+        for index in shown:
+            name = names[index]
+            # The type can take inference, so only shown entries get it
+            kind = completions[index].type
+            suggestions.append([f"{name}\t{kind}" if kind else name, name])
+        if len(shown) < len(names):
+            # The rest unranked, for the completion cache to narrow
+            shown = set(shown)
+            suggestions.extend([name, name] for index, name in enumerate(names) if index not in shown)
+        return suggestions
+
+    def hover(self, view, change_count, code, line, column, path=None, part=None):
+        """Popup HTML for the name at 1-based `line`, or None"""
+        script = self.get_script(view, change_count, code, path, part)
+        with metrics.timed("analysis.hover", view) as timing:
+            definitions = script.help(line, column) or script.get_signatures(line, column)
+            if not definitions:
+                return None
+            timing.cause = f"help for {definitions[0].name}"
+            # Rendered once per definition and module version
+            return hover_cache.get(definitions[0], path, (view, change_count, part))
+
+    def warm_up(self, module, path=None):
+        """
+        Complete on `module.` once, so jedi has parsed and cached the module
+        before the first real request needs it. `path` is a file in the
+        project whose sys.path to use.
+        """
+        import jedi
+
+        if not all(part.isidentifier() for part in module.split(".")):
+            raise ValueError(f"not a module name: {module!r}")
+        code = f"import {module}\n{module}."
+        with metrics.timed("analysis.warm_up") as timing:
+            timing.cause = module
+            script = jedi.Script(code=code, environment=self.environment, project=script_cache.project(path))
+            script.complete(2, len(module) + 1)
+
+    def metrics(self):
+        """Latency summaries of the analyses run by this analyzer's process"""
+        return metrics.snapshot()
+
+    def memory(self, limit=None):
+        """Estimated sizes of this process's caches, see core.memory"""
+        return memory_budget.report(limit)
+
+    def trim(self, limit, keep=()):
+        """Shrink this process's caches to `limit` bytes, sparing the views in `keep`"""
+        with metrics.timed("analysis.trim") as timing:
+            evicted = memory_budget.trim(limit, keep)
+            timing.cause = f"{len(evicted)} views evicted"
+        return evicted
+
+    def close(self, view):
+        """Forget everything kept for `view`"""
+        script_cache.evict(view)
+        documents.discard(view)
+        parse_states.discard(view)
+        undefined_checkers.discard(view)
+        metrics.forget(view)
+        memory_budget.forget(view)
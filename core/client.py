@@ -0,0 +1,255 @@
+"""
+Clients for the Analyzer methods, in process or through the analysis server.
+
+Both return Request objects from `submit`, so callers don't care where the
+analysis runs.
+"""
+import itertools
+import json
+import os
+import subprocess
+import threading
+from concurrent.futures import Future, TimeoutError
+
+from .environment import get_environment
+
+PACKAGE_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The server runs core/, which needs end positions in the AST, str.isascii
+# and the symtable flags of Python 3.8
+SERVER_MIN_VERSION = (3, 8)
+
+# Seconds a call waits for the server before giving up on the request, so
+# a hung server can't block the jedi worker for good
+CALL_TIMEOUT = 30
+
+
+class AnalysisError(Exception):
+    """An analysis failed inside the server"""
+
+
+class Request:
+    __slots__ = ("id", "future")
+
+    def __init__(self, request_id, future):
+        self.id = request_id
+        self.future = future
+
+    def result(self, timeout=None):
+        """Wait for the result; raises CancelledError if it was cancelled"""
+        return self.future.result(timeout)
+
+
+class LocalClient:
+    """Runs the analyses in the calling thread"""
+
+    def __init__(self, analyzer):
+        self.analyzer = analyzer
+
+    def submit(self, method, **params):
+        future = Future()
+        try:
+            future.set_result(getattr(self.analyzer, method)(**params))
+        except Exception as ex:
+            future.set_exception(ex)
+        return Request(None, future)
+
+    def cancel(self, request):
+        # Already finished by the time submit returned
+        pass
+
+    def call(self, method, timeout=None, **params):
+        return self.submit(method, **params).result()
+
+
+class ServerClient:
+    """Talks JSON lines to an analysis server process, see core.server"""
+
+    def __init__(self, command, env=None, cwd=None):
+        self.process = subprocess.Popen(
+            command,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            env=env,
+            cwd=cwd,
+            universal_newlines=True,
+            encoding="utf-8",
+            # Don't flash a console window on Windows
+            creationflags=getattr(subprocess, "CREATE_NO_WINDOW", 0),
+        )
+        self.ids = itertools.count(1)
+        self.futures = {}  # request id -> Future
+        self.lock = threading.Lock()
+        threading.Thread(target=self._read, daemon=True).start()
+        threading.Thread(target=self._log, daemon=True).start()
+
+    def is_alive(self):
+        return self.process.poll() is None
+
+    def submit(self, method, **params):
+        request = Request(next(self.ids), Future())
+        with self.lock:
+            self.futures[request.id] = request.future
+            self._send({"id": request.id, "method": method, "params": params})
+        return request
+
+    def cancel(self, request):
+        """Drop the request; the server skips it or discards its result"""
+        if request.future.cancel():
+            with self.lock:
+                # Its response, if any, finds nothing to resolve
+                self.futures.pop(request.id, None)
+                self._send({"method": "cancel", "params": {"id": request.id}})
+
+    def call(self, method, timeout=CALL_TIMEOUT, **params):
+        """The result of `method`; raises AnalysisError if it takes over `timeout` seconds"""
+        request = self.submit(method, **params)
+        try:
+            return request.result(timeout)
+        except TimeoutError:
+            self.cancel(request)
+            raise AnalysisError(f"{method} took over {timeout} s in the analysis server")
+
+    def close(self):
+        with self.lock:
+            self._send({"method": "shutdown"})
+        try:
+            self.process.stdin.close()
+            self.process.wait(timeout=2)
+        except Exception:
+            self.process.kill()
+
+    def _send(self, message):
+        try:
+            self.process.stdin.write(json.dumps(message) + "\n")
+            self.process.stdin.flush()
+        except (OSError, ValueError):
+            # The server is gone, _read fails the pending requests
+            pass
+
+    def _read(self):
+        for line in self.process.stdout:
+            try:
+                message = json.loads(line)
+            except ValueError:
+                print(f"kamal: unexpected output of the analysis server: {line.rstrip()}")
+                continue
+            with self.lock:
+                future = self.futures.pop(message.get("id"), None)
+            if future is None or future.done():
+                continue
+            if "error" in message:
+                future.set_exception(make_error(message["error"]))
+            elif message.get("cancelled"):
+                future.cancel()
+            else:
+                future.set_result(message.get("result"))
+
+        with self.lock:
+            futures, self.futures = self.futures, {}
+        for future in futures.values():
+            if not future.done():
+                future.set_exception(AnalysisError("analysis server exited"))
+
+    def _log(self):
+        # Tracebacks and warnings, e.g. the server failing to start
+        for line in self.process.stderr:
+            print(f"kamal: analysis server: {line.rstrip()}")
+
+
+def make_error(error):
+    if error.get("type") == "SyntaxError":
+        return SyntaxError(error.get("message"))
+    return AnalysisError(f"{error.get('type')}: {error.get('message')}")
+
+
+_local_client = None
+_local_client_lock = threading.Lock()
+
+
+def get_local_client():
+    """Return the in-process client, created on first use"""
+    global _local_client
+    with _local_client_lock:
+        if _local_client is None:
+            # Resolving the environment makes jedi importable for the Analyzer
+            environment = get_environment()
+            from .analysis import Analyzer
+            _local_client = LocalClient(Analyzer(environment))
+        return _local_client
+
+
+def get_client(use_server):
+    """
+    The analysis server's client if `use_server` and the environment's
+    Python can run it, the in-process one otherwise
+    """
+    if use_server:
+        environment = get_environment()
+        if tuple(environment.version_info[:2]) >= SERVER_MIN_VERSION:
+            return get_server(environment.executable)
+        _warn_old_python(environment)
+    return get_local_client()
+
+
+_warned = set()
+
+
+def _warn_old_python(environment):
+    if environment.executable not in _warned:
+        _warned.add(environment.executable)
+        minimum = ".".join(map(str, SERVER_MIN_VERSION))
+        version = ".".join(map(str, environment.version_info[:3]))
+        print(
+            f"kamal: the analysis server needs Python {minimum}+, {environment.executable} "
+            f"is {version}; analysing in the plugin host instead"
+        )
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def get_server(executable):
+    """Return the analysis server, starting it with `executable` if needed"""
+    global _server
+    with _server_lock:
+        if _server is None or not _server.is_alive():
+            # The server needs this package and the jedi the plugins use
+            import jedi
+            import parso
+            paths = [PACKAGE_ROOT]
+            for module in (jedi, parso):
+                path = os.path.dirname(os.path.dirname(module.__file__))
+                if path not in paths:
+                    paths.append(path)
+            env = dict(os.environ, PYTHONPATH=os.pathsep.join(paths))
+            _server = ServerClient([executable, "-m", "core.server"], env=env)
+        return _server
+
+
+def running_server():
+    """Return the analysis server if one is running, without starting it"""
+    with _server_lock:
+        if _server is not None and _server.is_alive():
+            return _server
+    return None
+
+
+def close_view(use_server, view_id):
+    """
+    Have the analyses forget `view_id`. Neither the server nor jedi is
+    started for it: if they aren't running they hold nothing of the view.
+    """
+    client = running_server() if use_server else _local_client
+    if client is not None:
+        client.submit("close", view=view_id)
+
+
+def stop_server():
+    global _server
+    with _server_lock:
+        server, _server = _server, None
+    if server is not None:
+        server.close()
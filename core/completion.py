@@ -0,0 +1,190 @@
+"""
+Completion helpers that don't depend on sublime.
+"""
+import heapq
+import threading
+from collections import OrderedDict
+
+from .memory import memory_budget
+
+# Rough bytes held per stored completion
+ITEM_BYTES = 200
+
+# Terms of fuzzy_score and rank
+PREFIX_BONUS = 1000  # the name starts with the query
+BOUNDARY_BONUS = 30  # per query letter matched at the start of a word of the name
+PRIVATE_PENALTY = 200  # a name starting with "_" unless the query does
+RECENT_BONUS = 500  # a name accepted lately, plus its position among them
+
+# Accepted completions remembered for the boost
+RECENT_SIZE = 50
+
+
+def identifier_start(code, point):
+    """Return the offset where the identifier ending at `point` begins"""
+    start = point
+    while start > 0 and (code[start - 1].isalnum() or code[start - 1] == "_"):
+        start -= 1
+    return start
+
+
+def fuzzy_score(query, name):
+    """
+    How well `name` matches `query`, None unless the query's letters appear
+    in the name in order. Prefixes score highest, then matches on the starts
+    of words and with short gaps; shorter names break ties.
+    """
+    if name.startswith(query):
+        return PREFIX_BONUS - len(name)
+    score = -len(name)
+    position = 0
+    for char in query:
+        found = name.find(char, position)
+        if found == -1:
+            return None
+        if found == 0 or name[found - 1] == "_":
+            score += BOUNDARY_BONUS
+        score -= found - position
+        position = found + 1
+    return score
+
+
+def rank(keys, query, limit=None, recent=(), case_insensitive=True):
+    """
+    Indices of the best `limit` names in `keys` for `query`, best first.
+    `keys` are the names as matched, so lowercase if `case_insensitive`;
+    names in `recent`, oldest first, are boosted. Ties keep the order of
+    `keys`, and only the kept entries are sorted.
+    """
+    if case_insensitive:
+        query = query.lower()
+        recent = [name.lower() for name in recent]
+    boosts = {name: RECENT_BONUS + position for position, name in enumerate(recent)}
+    private = query.startswith("_")
+    scored = []
+    for index, key in enumerate(keys):
+        score = fuzzy_score(query, key)
+        if score is None:
+            continue
+        if not private and key.startswith("_"):
+            score -= PRIVATE_PENALTY
+        if boosts:
+            score += boosts.get(key, 0)
+        scored.append((score, -index))
+    if limit and len(scored) > limit:
+        best = heapq.nlargest(limit, scored)
+    else:
+        best = sorted(scored, reverse=True)
+    return [-negated for _, negated in best]
+
+
+class RecentCompletions:
+    """Names of the completions accepted lately, oldest first"""
+
+    def __init__(self, size=RECENT_SIZE):
+        self.size = size
+        self.accepted = OrderedDict()  # name -> None
+        self.lock = threading.Lock()
+
+    def add(self, name):
+        with self.lock:
+            self.accepted[name] = None
+            self.accepted.move_to_end(name)
+            while len(self.accepted) > self.size:
+                self.accepted.popitem(last=False)
+
+    def names(self):
+        with self.lock:
+            return list(self.accepted)
+
+
+class _Entry:
+    __slots__ = ("anchor", "prefix", "before", "after", "keys", "items", "case_insensitive")
+
+    def __init__(self, anchor, prefix, before, after, keys, items, case_insensitive):
+        self.anchor = anchor
+        self.prefix = prefix
+        self.before = before
+        self.after = after
+        self.keys = keys
+        self.items = items
+        self.case_insensitive = case_insensitive
+
+
+class CompletionCache:
+    """
+    Last completion set of each view, narrowed in memory while typing.
+
+    Completions are stored together with the identifier prefix they were
+    computed for and the text around it. A later request at the same anchor
+    whose prefix only extends the stored one, with the rest of the buffer
+    untouched, is answered by ranking the stored set again instead of asking
+    jedi: jedi's fuzzy matches of the longer prefix are among those of the
+    shorter one. Any other edit makes the entry miss.
+    """
+
+    def __init__(self):
+        self.entries = {}  # view id -> _Entry
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def lookup(self, view_id, code, cursor, limit=None, recent=()):
+        """
+        Return the best `limit` completions for the longer prefix, or None
+        if jedi has to be asked. `recent` is as for rank.
+        """
+        anchor = identifier_start(code, cursor)
+        with self.lock:
+            entry = self.entries.get(view_id)
+        prefix = code[anchor:cursor]
+        if (entry is None or entry.anchor != anchor or
+                not prefix.startswith(entry.prefix) or
+                code[cursor:] != entry.after or
+                code[:anchor] != entry.before):
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        if prefix == entry.prefix:
+            return entry.items[:limit] if limit else list(entry.items)
+        order = rank(entry.keys, prefix, limit, recent, entry.case_insensitive)
+        return [entry.items[index] for index in order]
+
+    def store(self, view_id, code, cursor, suggestions):
+        """
+        Remember `suggestions`, a list of (trigger, contents) pairs ranked
+        for the prefix at `cursor`
+        """
+        # Only stored after jedi ran, so importing it here costs nothing
+        from jedi import settings
+
+        anchor = identifier_start(code, cursor)
+        case_insensitive = settings.case_insensitive_completion
+        items = [(trigger, contents) for trigger, contents in suggestions]
+        keys = [contents.lower() if case_insensitive else contents for _, contents in items]
+        entry = _Entry(
+            anchor, code[anchor:cursor], code[:anchor], code[cursor:], keys, items, case_insensitive
+        )
+        with self.lock:
+            self.entries[view_id] = entry
+
+    def evict(self, view_id):
+        with self.lock:
+            self.entries.pop(view_id, None)
+
+    def sizes(self):
+        with self.lock:
+            return {
+                view_id: len(entry.before) + len(entry.after) + ITEM_BYTES * len(entry.items)
+                for view_id, entry in self.entries.items()
+            }
+
+    def stats(self):
+        return {"views": len(self.entries), "hits": self.hits, "misses": self.misses}
+
+
+completion_cache = CompletionCache()
+memory_budget.register("completions", completion_cache.sizes, completion_cache.evict)
+
+recent_completions = RecentCompletions()
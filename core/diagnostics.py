@@ -0,0 +1,160 @@
+"""
+Diagnostics painted by the checkers, indexed per view for hover lookups,
+and painted on the views without repainting what didn't change.
+"""
+import threading
+import time
+from bisect import bisect_right
+
+
+class IntervalIndex:
+    """
+    (begin, end, message) intervals sorted by begin, looked up by point with
+    a bisect. Bounds are inclusive, like sublime.Region.contains.
+    """
+
+    __slots__ = ("begins", "ends", "reach", "messages")
+
+    def __init__(self, entries):
+        entries = sorted(entries, key=lambda entry: (entry[0], entry[1]))
+        self.begins = [begin for begin, _, _ in entries]
+        self.ends = [end for _, end, _ in entries]
+        self.messages = [message for _, _, message in entries]
+        # Furthest end among the intervals up to each one, so a lookup stops
+        # walking back as soon as nothing earlier can reach the point
+        self.reach = []
+        furthest = -1
+        for end in self.ends:
+            furthest = max(furthest, end)
+            self.reach.append(furthest)
+
+    def __len__(self):
+        return len(self.begins)
+
+    def at(self, point):
+        """Messages of the intervals containing `point`, in order"""
+        found = []
+        index = bisect_right(self.begins, point) - 1
+        while index >= 0 and self.reach[index] >= point:
+            if self.ends[index] >= point:
+                found.append(self.messages[index])
+            index -= 1
+        found.reverse()
+        return found
+
+
+class DiagnosticsStore:
+    """
+    The latest diagnostics of each view, one IntervalIndex per source
+    ("syntax", "undefined"), replaced whenever that source checks the view.
+    """
+
+    def __init__(self):
+        self.views = {}  # view id -> {source: IntervalIndex}
+        self.lock = threading.Lock()
+
+    def set(self, view_id, source, entries):
+        """Replace the view's diagnostics from `source` with (begin, end, message) entries"""
+        index = IntervalIndex(entries)
+        with self.lock:
+            self.views.setdefault(view_id, {})[source] = index
+
+    def at(self, view_id, point, source=None):
+        """Messages at `point`, from one source or all of them"""
+        with self.lock:
+            indexes = self.views.get(view_id)
+            if not indexes:
+                return []
+            if source is not None:
+                indexes = [indexes[source]] if source in indexes else []
+            else:
+                indexes = list(indexes.values())
+        return [message for index in indexes for message in index.at(point)]
+
+    def discard(self, view_id, source=None):
+        """Forget the view's diagnostics from `source`, or all of them"""
+        with self.lock:
+            if source is None:
+                self.views.pop(view_id, None)
+                return
+            indexes = self.views.get(view_id)
+            if indexes is not None:
+                indexes.pop(source, None)
+                if not indexes:
+                    del self.views[view_id]
+
+
+diagnostics = DiagnosticsStore()
+
+
+class DiagnosticsPublisher:
+    """
+    Paints one checker's regions and status on views, touching only what
+    changed.
+
+    The new regions and status are compared with what the view shows rather
+    than with the last results, since Sublime moves painted regions along
+    with edits; an unchanged result costs two lookups instead of a repaint.
+    Messages are printed to the console only when they are new for the
+    view, at most `log_limit` per view every `log_interval` seconds, with
+    the rest counted in a summary line.
+    """
+
+    def __init__(self, key, scope, icon, flags, status_key=None, log_interval=10):
+        self.key = key
+        self.scope = scope
+        self.icon = icon
+        self.flags = flags
+        self.status_key = status_key
+        self.log_interval = log_interval
+        self.logged = {}  # view id -> [messages last logged, window start, printed, suppressed]
+        self.lock = threading.Lock()
+
+    def publish(self, view, regions, status=None, messages=(), log_limit=10):
+        """
+        Show `regions` and `status` on `view` and log `messages`. Returns
+        whether the regions changed.
+        """
+        painted = sorted({(region.begin(), region.end()) for region in view.get_regions(self.key)})
+        wanted = sorted({(region.begin(), region.end()) for region in regions})
+        changed = painted != wanted
+        if changed:
+            if regions:
+                # Replaces the regions under the same key
+                view.add_regions(self.key, regions, self.scope, self.icon, self.flags)
+            else:
+                view.erase_regions(self.key)
+
+        if self.status_key is not None:
+            if status:
+                if view.get_status(self.status_key) != status:
+                    view.set_status(self.status_key, status)
+            elif view.get_status(self.status_key):
+                view.erase_status(self.status_key)
+
+        self.log(view.id(), messages, log_limit)
+        return changed
+
+    def log(self, view_id, messages, log_limit):
+        now = time.monotonic()
+        with self.lock:
+            entry = self.logged.get(view_id)
+            if entry is None:
+                entry = self.logged[view_id] = [set(), now, 0, 0]
+            new = [message for message in messages if message not in entry[0]]
+            entry[0] = set(messages)
+            if now - entry[1] >= self.log_interval:
+                entry[1], entry[2] = now, 0
+            allowed = max(0, min(len(new), log_limit - entry[2]))
+            entry[2] += allowed
+            suppressed = entry[3] + len(new) - allowed
+            # Reported along with the next messages printed
+            entry[3] = suppressed if not allowed else 0
+        for message in new[:allowed]:
+            print(message)
+        if allowed and suppressed:
+            print(f"kamal: {suppressed} more diagnostics not printed")
+
+    def forget(self, view_id):
+        with self.lock:
+            self.logged.pop(view_id, None)
@@ -0,0 +1,121 @@
+"""
+One snapshot of each view's buffer, shared by every analysis of it.
+
+A save or an edit used to have each plugin copy the buffer out of the view
+and parse it on its own. A Document holds the text of one version of the
+view, identified by its change count, and makes each parse at most once:
+CPython's AST, which the syntax check's fast path and the undefined name
+check both use. parso's tree is kept per view rather than per version, by
+the view's ParseState, since the diff parser updates it in place; jedi
+keeps a tree of its own, see ParseState. Analyses of one version therefore
+also report on the same text.
+"""
+import threading
+
+from .memory import AST_BYTES, memory_budget
+from .syntax import parse_module
+from .viewport import Excerpt
+
+
+class Document:
+    """
+    The text of one version of a buffer, or of an excerpt of it, and the
+    parses made of it so far
+    """
+
+    def __init__(self, text):
+        self.text = text
+        self.lock = threading.Lock()
+        self._ast = None
+        self._ast_error = None
+        self._excerpts = {}  # (begin, end) -> Excerpt
+
+    @property
+    def ast(self):
+        """CPython's AST of the text, parsed on first use; raises its SyntaxError"""
+        with self.lock:
+            if self._ast is None and self._ast_error is None:
+                try:
+                    self._ast = parse_module(self.text)
+                except Exception as ex:
+                    # SyntaxError, but also ValueError for null bytes and
+                    # RecursionError for pathologically nested code
+                    self._ast_error = ex
+            if self._ast_error is not None:
+                raise self._ast_error
+            return self._ast
+
+    def size(self):
+        """Estimated bytes held, see core.memory"""
+        return len(self.text) * (1 + (AST_BYTES if self._ast is not None else 0))
+
+    @property
+    def compiles(self):
+        """Whether CPython parses the text"""
+        try:
+            self.ast
+        except Exception:
+            return False
+        return True
+
+    def excerpt(self, begin, end):
+        """The Excerpt around [begin, end), shared by the checks of one viewport"""
+        with self.lock:
+            excerpt = self._excerpts.get((begin, end))
+            if excerpt is None:
+                excerpt = self._excerpts[begin, end] = Excerpt(self.text, begin, end)
+            return excerpt
+
+
+class Documents:
+    """
+    The latest Document of each view, keyed by view id and change count.
+
+    Excerpts of large files are Documents of their own, told apart by their
+    `part`, the Excerpt's version. A new change count drops the previous
+    version's documents.
+    """
+
+    def __init__(self):
+        self.views = {}  # view id -> (change count, {part: Document})
+        self.lock = threading.Lock()
+
+    def get(self, view_id, change_count, text, part=None):
+        """
+        The Document of this version of the view. `text` is the buffer or a
+        callable returning it, only called if the version is new.
+        """
+        memory_budget.touch(view_id)
+        with self.lock:
+            entry = self.views.get(view_id)
+            if entry is not None and entry[0] == change_count:
+                document = entry[1].get(part)
+                if document is not None:
+                    return document
+
+        document = Document(text() if callable(text) else text)
+        with self.lock:
+            entry = self.views.get(view_id)
+            if entry is None or entry[0] < change_count:
+                entry = self.views[view_id] = (change_count, {})
+            elif entry[0] > change_count:
+                # A late request for a version already replaced
+                return document
+            # Another thread may have read the same version meanwhile
+            return entry[1].setdefault(part, document)
+
+    def discard(self, view_id):
+        with self.lock:
+            self.views.pop(view_id, None)
+
+    def sizes(self):
+        with self.lock:
+            views = list(self.views.items())
+        return {
+            view_id: sum(document.size() for document in parts.values())
+            for view_id, (_, parts) in views
+        }
+
+
+documents = Documents()
+memory_budget.register("documents", documents.sizes, documents.discard)
@@ -0,0 +1,132 @@
+"""
+jedi and the Python environment it analyses, resolved once and shared by the
+plugins.
+
+Nothing here runs at import time: the plugins load without importing jedi
+and resolve the environment on first use, or ahead of it on a background
+thread. Discovering the environment starts the interpreter in a subprocess,
+so the result is cached on disk and reused until `python3` on the PATH or
+the interpreter itself changes.
+"""
+import json
+import os
+import shutil
+import sys
+import threading
+
+PACKAGE_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+JEDI_LIB_PATH = os.path.join(PACKAGE_ROOT, "jedi_lib")
+
+CACHE_FILE = "environment.json"
+
+_lock = threading.Lock()
+_environment = None
+cache_dir = None  # directory of the environment cache, set by the plugins
+
+
+def import_jedi():
+    """The jedi module, from the package's jedi_lib folder if it isn't installed"""
+    try:
+        import jedi
+    except ImportError:
+        if JEDI_LIB_PATH not in sys.path:
+            sys.path.append(JEDI_LIB_PATH)
+        import jedi
+    return jedi
+
+
+def executable_stamp(executable):
+    """Changes when the interpreter is replaced or upgraded in place"""
+    stat = os.stat(executable)
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def get_environment():
+    """The jedi Environment for the system's Python 3, resolved once"""
+    global _environment
+    with _lock:
+        if _environment is None:
+            _environment = _resolve()
+        return _environment
+
+
+def _resolve():
+    jedi = import_jedi()
+    from jedi.api.environment import InvalidPythonEnvironment
+
+    python = shutil.which("python3")
+    environment = _load_cached(jedi, python)
+    if environment is not None:
+        return environment
+
+    try:
+        environment = jedi.get_system_environment("3")
+    except InvalidPythonEnvironment:
+        return jedi.get_default_environment()
+    _save_cached(jedi, python, environment)
+    return environment
+
+
+def _cache_path():
+    return os.path.join(cache_dir, CACHE_FILE) if cache_dir else None
+
+
+def _load_cached(jedi, python):
+    path = _cache_path()
+    if path is None or python is None:
+        return None
+    try:
+        with open(path, encoding="utf-8") as file:
+            cached = json.load(file)
+        if (cached["jedi"] != jedi.__version__ or cached["python"] != python or
+                cached["stamp"] != executable_stamp(cached["executable"])):
+            return None
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+    try:
+        return _restore(cached["executable"], cached["path"], cached["version_info"])
+    except (ImportError, AttributeError, TypeError) as ex:
+        # A jedi whose Environment changed shape: build it the public way
+        print(f"kamal: can't restore the cached Python environment: {ex}")
+        try:
+            return jedi.create_environment(cached["executable"], safe=False)
+        except Exception:
+            return None
+
+
+def _save_cached(jedi, python, environment):
+    path = _cache_path()
+    if path is None:
+        return
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump({
+                "jedi": jedi.__version__,
+                "python": python,
+                "executable": environment.executable,
+                "path": environment.path,
+                "version_info": list(environment.version_info),
+                "stamp": executable_stamp(environment.executable),
+            }, file)
+    except OSError as ex:
+        print(f"kamal: can't cache the Python environment: {ex}")
+
+
+def _restore(executable, path, version_info):
+    """
+    An Environment from the cache. Unlike a new one, it starts its
+    subprocess when jedi first needs it instead of right away. This sets
+    jedi's private attributes, as of jedi 0.19.2; the cache is only used
+    with the jedi version that wrote it, and a failure here falls back to
+    `jedi.create_environment`.
+    """
+    from jedi.api.environment import Environment, _VersionInfo
+
+    environment = Environment.__new__(Environment)
+    environment._start_executable = executable
+    environment._env_vars = None
+    environment.executable = executable
+    environment.path = path
+    environment.version_info = _VersionInfo(*version_info)
+    return environment
@@ -0,0 +1,175 @@
+"""
+Docstring to popup HTML rendering for hovers.
+"""
+import html
+import os
+import re
+import threading
+from collections import OrderedDict
+
+STYLES = """
+    <style>
+        body {
+            font-family: "Consolas", monospace;
+            font-size: 1.0em;
+            padding: 5px;
+        }
+        .signature {
+            color: #89DDFF;
+            margin-bottom: 10px;
+        }
+        .example {
+            color: #89DDFF;
+            margin: 10px 0;
+        }
+        .keyword { color: #F07178; }
+        .param { color: #A9DC76; }
+        .param-default { color: #FFB86C; }
+        .type { color: #78DCE8; }
+        .string { color: #C3E88D; }
+        .desc {
+            color: #CCCCCC;
+            margin-top: 10px;
+            line-height: 1.4;
+        }
+        .section {
+            color: #F07178;
+            font-weight: bold;
+            margin-top: 10px;
+        }
+    </style>
+"""
+
+SIGNATURE_TOKENS = re.compile(r"""
+    (?P<arrow>\s->\s)
+  | (?P<param>\b\w+(?=:))
+  | (?P<default>=\.\.\.)
+  | (?P<type>\b(?:Optional|Union|None|bool|str|bytes|int|float|object)\b|[\[\]])
+  | (?P<separator>,\ )
+""", re.VERBOSE)
+
+EXAMPLE_TOKENS = re.compile(r"""
+    (?P<string>'[^'\n]*'|"[^"\n]*")
+  | (?P<param>\b\w+=)
+  | (?P<keyword>\b(?:print|True|False|None)\b)
+  | (?P<name>\b(?:value|sys\.stdout)\b)
+""", re.VERBOSE)
+
+DESCRIPTION_TOKENS = re.compile(r"""
+    (?P<section>^[A-Z][\w ]*:$)
+  | (?P<newline>\n)
+""", re.VERBOSE | re.MULTILINE)
+
+
+def span(css_class):
+    return lambda text: f"<span class='{css_class}'>{html.escape(text, quote=False)}</span>"
+
+
+SIGNATURE_HANDLERS = {
+    "arrow": lambda text: " <span class='keyword'>-&gt;</span> ",
+    "param": span("param"),
+    "default": lambda text: "=<span class='param-default'>...</span>",
+    "type": span("type"),
+    "separator": lambda text: ",<br>    ",
+}
+
+EXAMPLE_HANDLERS = {
+    "string": span("string"),
+    "param": span("param"),
+    "keyword": span("keyword"),
+    "name": span("param"),
+}
+
+DESCRIPTION_HANDLERS = {
+    "section": span("section"),
+    "newline": lambda text: "<br>",
+}
+
+
+def highlight(pattern, handlers, text):
+    """Escape `text` and wrap the tokens `pattern` finds, in a single pass"""
+    parts = []
+    position = 0
+    for match in pattern.finditer(text):
+        parts.append(html.escape(text[position:match.start()], quote=False))
+        parts.append(handlers[match.lastgroup](match.group()))
+        position = match.end()
+    parts.append(html.escape(text[position:], quote=False))
+    return "".join(parts)
+
+
+def render_docstring(doc):
+    """Render a jedi docstring (signature, example, description) as popup HTML"""
+    parts = doc.split("\n\n")
+    signature = parts[0]
+    example = parts[1] if len(parts) > 1 else ""
+    description = parts[2] if len(parts) > 2 else ""
+
+    return f"""
+        {STYLES}
+        <div class='signature'>{highlight(SIGNATURE_TOKENS, SIGNATURE_HANDLERS, signature)}</div>
+        <div class='example'>{highlight(EXAMPLE_TOKENS, EXAMPLE_HANDLERS, example)}</div>
+        <div class='desc'>{highlight(DESCRIPTION_TOKENS, DESCRIPTION_HANDLERS, description)}</div>
+    """
+
+
+def cache_key(definition, buffer_path, buffer_version):
+    """
+    Key a definition's rendered docs by its full name and the version of the
+    module defining it, or return None if it should not be cached.
+
+    Definitions from the buffer being edited use `buffer_version`, anything
+    else the modification time of its module.
+    """
+    full_name = definition.full_name
+    if not full_name:
+        return None
+    module_path = definition.module_path
+    if module_path is None:
+        if definition.in_builtin_module():
+            return (full_name, None, None)
+        # Defined in an untitled buffer
+        return (full_name, None, buffer_version)
+    module_path = str(module_path)
+    if module_path == buffer_path:
+        return (full_name, module_path, buffer_version)
+    try:
+        return (full_name, module_path, os.path.getmtime(module_path))
+    except OSError:
+        return None
+
+
+class HoverCache:
+    """LRU of rendered hover popups"""
+
+    def __init__(self, max_size=256):
+        self.max_size = max_size
+        self.popups = OrderedDict()  # cache key -> HTML or None
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, definition, buffer_path, buffer_version):
+        """Return the popup HTML for `definition`, or None if it has no docs"""
+        key = cache_key(definition, buffer_path, buffer_version)
+        with self.lock:
+            if key is not None and key in self.popups:
+                self.hits += 1
+                self.popups.move_to_end(key)
+                return self.popups[key]
+            self.misses += 1
+
+        doc = definition.docstring()
+        content = render_docstring(doc) if doc else None
+        if key is not None:
+            with self.lock:
+                self.popups[key] = content
+                while len(self.popups) > self.max_size:
+                    self.popups.popitem(last=False)
+        return content
+
+    def stats(self):
+        return {"popups": len(self.popups), "hits": self.hits, "misses": self.misses}
+
+
+hover_cache = HoverCache()
@@ -0,0 +1,201 @@
+"""
+Command line undefined variable check for whole trees.
+
+Runs the same checker as the Sublime plugin over every Python file under the
+given paths, in a process pool. Results are cached on disk by file content,
+so unchanged files are not checked again. Run from the package root:
+
+    python -m core.lint src tests --format sarif > kamal.sarif
+
+Exits with 1 if anything was reported, 0 otherwise.
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from importlib.util import decode_source
+
+from . import undefined
+from .undefined import find_undefined
+
+SKIP_DIRS = {"__pycache__", "node_modules", "site-packages", "venv", "env"}
+
+CACHE_FILE = "lint.json"
+CACHE_LIMIT = 200000  # entries kept on disk
+
+
+def checker_version():
+    """Hash of the checker's source, so editing it invalidates the cache"""
+    digest = hashlib.sha1()
+    for path in (undefined.__file__, __file__):
+        with open(path, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def iter_python_files(paths):
+    for path in paths:
+        if os.path.isfile(path):
+            yield path
+            continue
+        for root, dirs, files in os.walk(path):
+            # Hidden directories cover .git, .tox, .venv and the like
+            dirs[:] = sorted(d for d in dirs if not d.startswith(".") and d not in SKIP_DIRS)
+            for name in sorted(files):
+                if name.endswith(".py"):
+                    yield os.path.join(root, name)
+
+
+def check_source(source):
+    """Check one file's source; runs in the worker processes"""
+    try:
+        return {"undefined": [list(item) for item in find_undefined(source)]}
+    except SyntaxError as ex:
+        return {"syntax_error": {"line": ex.lineno or 1, "column": max((ex.offset or 1) - 1, 0), "message": ex.msg}}
+
+
+class ResultCache:
+    """Check results on disk, keyed by the hash of a file's content"""
+
+    def __init__(self, directory):
+        self.path = os.path.join(directory, CACHE_FILE) if directory else None
+        self.version = checker_version()
+        self.results = {}
+        if self.path and os.path.exists(self.path):
+            try:
+                with open(self.path, encoding="utf-8") as f:
+                    data = json.load(f)
+                if data.get("version") == self.version:
+                    self.results = data["results"]
+            except (OSError, ValueError, KeyError):
+                pass
+
+    def get(self, key):
+        result = self.results.pop(key, None)
+        if result is not None:
+            # Reinsert so the dict stays ordered by last use
+            self.results[key] = result
+        return result
+
+    def put(self, key, result):
+        self.results[key] = result
+
+    def save(self):
+        if not self.path:
+            return
+        keys = list(self.results)
+        for key in keys[:max(0, len(keys) - CACHE_LIMIT)]:
+            del self.results[key]
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": self.version, "results": self.results}, f)
+        os.replace(temp_path, self.path)
+
+
+def lint(paths, jobs=None, cache_dir=None):
+    """Return {path: result} for every Python file under `paths`"""
+    cache = ResultCache(cache_dir)
+    results = {}
+    todo = []  # (path, key, source)
+    for path in iter_python_files(paths):
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError:
+            continue
+        key = hashlib.sha1(data).hexdigest()
+        result = cache.get(key)
+        if result is not None:
+            results[path] = result
+            continue
+        try:
+            source = decode_source(data)
+        except (SyntaxError, UnicodeDecodeError) as ex:
+            results[path] = {"syntax_error": {"line": 1, "column": 0, "message": str(ex)}}
+            continue
+        todo.append((path, key, source))
+
+    if len(todo) > 1 and jobs != 1:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            checked = executor.map(check_source, [source for _, _, source in todo], chunksize=8)
+            checked = list(checked)
+    else:
+        checked = [check_source(source) for _, _, source in todo]
+
+    for (path, key, _), result in zip(todo, checked):
+        cache.put(key, result)
+        results[path] = result
+    cache.save()
+    return results
+
+
+def iter_findings(results):
+    """Yield (path, line, column, rule, message) for each problem found, column 0-based"""
+    for path in sorted(results):
+        result = results[path]
+        if "syntax_error" in result:
+            error = result["syntax_error"]
+            yield path, error["line"], error["column"], "syntax-error", error["message"]
+        for name, line, column, _ in result.get("undefined", ()):
+            yield path, line, column, "undefined-variable", f"Undefined variable '{name}'"
+
+
+def format_json(findings):
+    return json.dumps([
+        {"path": path, "line": line, "column": column + 1, "rule": rule, "message": message}
+        for path, line, column, rule, message in findings
+    ], indent=2)
+
+
+def format_sarif(findings):
+    return json.dumps({
+        "version": "2.1.0",
+        "runs": [{
+            "tool": {"driver": {"name": "kamal"}},
+            "results": [
+                {
+                    "ruleId": rule,
+                    "level": "error",
+                    "message": {"text": message},
+                    "locations": [{
+                        "physicalLocation": {
+                            "artifactLocation": {"uri": path.replace(os.sep, "/")},
+                            "region": {"startLine": line, "startColumn": column + 1},
+                        }
+                    }],
+                }
+                for path, line, column, rule, message in findings
+            ],
+        }],
+    }, indent=2)
+
+
+def format_text(findings):
+    return "\n".join(f"{path}:{line}:{column + 1}: {message}" for path, line, column, rule, message in findings)
+
+
+FORMATS = {"text": format_text, "json": format_json, "sarif": format_sarif}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m core.lint", description="Check Python files for undefined variables.")
+    parser.add_argument("paths", nargs="*", default=["."], help="files or directories to check")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="worker processes (default: one per CPU)")
+    parser.add_argument("-f", "--format", choices=sorted(FORMATS), default="text")
+    parser.add_argument("--cache-dir", default=".kamal_cache", help="where results are cached (default: .kamal_cache)")
+    parser.add_argument("--no-cache", action="store_true", help="check every file and don't write the cache")
+    args = parser.parse_args(argv)
+
+    results = lint(args.paths, jobs=args.jobs, cache_dir=None if args.no_cache else args.cache_dir)
+    findings = list(iter_findings(results))
+    output = FORMATS[args.format](findings)
+    if output:
+        print(output)
+    return 1 if findings else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,152 @@
+"""
+A memory budget for the analysis state kept over long editor sessions.
+
+Every cache of per-view state registers an estimate of what it holds for
+each view, derived from the size of the source it keeps. `trim` brings the
+total under the budget: first by dropping the parso trees of library
+modules jedi loaded and no view used lately, which jedi reloads from parso's
+pickle cache on disk, then by dropping every cache's state of the views used
+least recently, as if they had been closed. Evicted state is rebuilt on the
+view's next analysis.
+"""
+import threading
+from collections import OrderedDict
+
+# Rough bytes held per character of source, measured with tracemalloc on
+# generated modules and stdlib packages
+AST_BYTES = 40  # CPython's AST
+PARSO_BYTES = 60  # a parso tree with its lines
+SUMMARY_BYTES = 4  # undefined name summaries
+SCRIPT_BYTES = 512 * 1024  # inference state of a jedi Script, besides the trees
+
+MB = 2 ** 20
+
+
+class MemoryBudget:
+    """
+    Registry of the caches holding analysis state, with the order in which
+    views were last used
+    """
+
+    def __init__(self):
+        self.caches = {}  # name -> (sizes, evict)
+        self.shared = {}  # name -> (size, trim)
+        self.recent = OrderedDict()  # view id -> None, least recently used first
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def register(self, name, sizes, evict):
+        """
+        Add a per-view cache: `sizes()` returns {view id: estimated bytes},
+        `evict(view_id)` drops a view's state
+        """
+        self.caches[name] = (sizes, evict)
+
+    def register_shared(self, name, size, trim):
+        """
+        Add a cache not tied to views: `size()` returns estimated bytes,
+        `trim(target)` shrinks it towards `target` bytes and returns the new
+        estimate
+        """
+        self.shared[name] = (size, trim)
+
+    def touch(self, view_id):
+        """Note that `view_id` was analysed or shown"""
+        with self.lock:
+            self.recent[view_id] = None
+            self.recent.move_to_end(view_id)
+
+    def forget(self, view_id):
+        with self.lock:
+            self.recent.pop(view_id, None)
+
+    def sizes(self):
+        """{cache name: {view id: bytes}} and {shared cache name: bytes}"""
+        return (
+            {name: sizes() for name, (sizes, _) in list(self.caches.items())},
+            {name: size() for name, (size, _) in list(self.shared.items())},
+        )
+
+    def trim(self, limit, keep=()):
+        """
+        Shrink the caches to an estimated `limit` bytes, never evicting the
+        views in `keep`. Returns the ids of the evicted views.
+        """
+        per_cache, shared = self.sizes()
+        per_view = {}
+        for sizes in per_cache.values():
+            for view_id, size in sizes.items():
+                per_view[view_id] = per_view.get(view_id, 0) + size
+        excess = sum(per_view.values()) + sum(shared.values()) - limit
+        if excess <= 0:
+            return []
+
+        for name, (_, trim) in list(self.shared.items()):
+            excess -= shared[name] - trim(max(0, shared[name] - excess))
+            if excess <= 0:
+                return []
+
+        with self.lock:
+            recent = list(self.recent)
+        # Views never touched, e.g. analysed before a reload, go first
+        order = [view_id for view_id in per_view if view_id not in self.recent] + recent
+        keep = set(keep)
+        evicted = []
+        for view_id in order:
+            if excess <= 0:
+                break
+            if view_id in keep or view_id not in per_view:
+                continue
+            for _, evict in list(self.caches.values()):
+                evict(view_id)
+            self.forget(view_id)
+            excess -= per_view[view_id]
+            evicted.append(view_id)
+        self.evictions += len(evicted)
+        return evicted
+
+    def report(self, limit=None):
+        """Estimated sizes as JSON types, for format_sizes"""
+        per_cache, shared = self.sizes()
+        views = {}
+        for sizes in per_cache.values():
+            for view_id, size in sizes.items():
+                views[str(view_id)] = views.get(str(view_id), 0) + size
+        return {
+            "limit": limit,
+            "caches": {
+                name: {"views": len(sizes), "bytes": sum(sizes.values())}
+                for name, sizes in per_cache.items()
+            },
+            "shared": shared,
+            "views": views,
+            "evictions": self.evictions,
+        }
+
+
+def format_sizes(report, title, view_names=None):
+    """Plain text table of a report, `view_names` maps view ids to names"""
+    view_names = view_names or {}
+    lines = [title, "=" * len(title), ""]
+    lines.append(f"{'cache':<24} {'views':>7} {'estimate':>12}")
+    total = 0
+    for name, cache in sorted(report["caches"].items()):
+        total += cache["bytes"]
+        lines.append(f"{name:<24} {cache['views']:>7} {cache['bytes'] / MB:>10.1f}MB")
+    for name, size in sorted(report["shared"].items()):
+        total += size
+        lines.append(f"{name:<24} {'':>7} {size / MB:>10.1f}MB")
+    lines.append(f"{'total':<24} {'':>7} {total / MB:>10.1f}MB")
+    if report.get("limit"):
+        lines.append(f"{'budget':<24} {'':>7} {report['limit'] / MB:>10.1f}MB")
+    lines.append(f"Views evicted so far: {report['evictions']}")
+
+    if report["views"]:
+        lines.append("")
+        for view, size in sorted(report["views"].items(), key=lambda item: -item[1]):
+            name = view_names.get(int(view), "closed or untitled")
+            lines.append(f"View {view}: {size / MB:.1f}MB  {name}")
+    return "\n".join(lines) + "\n"
+
+
+memory_budget = MemoryBudget()
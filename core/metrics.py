@@ -0,0 +1,215 @@
+"""
+Latency histograms for the plugins' operations, over the last few minutes.
+
+Recording costs two perf_counter calls, a bisect and a few integer updates,
+cheap enough to stay on all the time. `metrics.snapshot()` returns plain JSON
+types so the analysis server can report its own.
+"""
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+
+# Upper bounds in ms of the histogram buckets, 10% apart from 0.1 ms to ~100 s
+BOUNDS = [0.1 * 1.1 ** k for k in range(146)]
+
+# Seconds of history in the percentiles, kept in SLOTS slices that are
+# dropped whole as they age out, so a slowdown shows after days of uptime
+WINDOW = 600
+SLOTS = 10
+
+
+class Slot:
+    """The durations recorded in one slice of a Histogram's window"""
+
+    __slots__ = ("number", "counts", "count", "total", "maximum")
+
+    def __init__(self, number):
+        self.number = number
+        self.counts = {}  # bucket index -> count
+        self.count = 0
+        self.total = 0.0
+        self.maximum = 0.0
+
+
+class Histogram:
+    """
+    Counts of durations per bucket over the last `window` seconds,
+    percentiles are bucket upper bounds
+    """
+
+    __slots__ = ("slot_seconds", "slots", "clock")
+
+    def __init__(self, window=WINDOW, slots=SLOTS, clock=time.monotonic):
+        self.slot_seconds = window / slots
+        self.slots = deque(maxlen=slots)  # oldest first
+        self.clock = clock
+
+    def record(self, ms):
+        number = int(self.clock() // self.slot_seconds)
+        if not self.slots or self.slots[-1].number != number:
+            self.slots.append(Slot(number))
+        slot = self.slots[-1]
+        bucket = bisect_left(BOUNDS, ms)
+        slot.counts[bucket] = slot.counts.get(bucket, 0) + 1
+        slot.count += 1
+        slot.total += ms
+        if ms > slot.maximum:
+            slot.maximum = ms
+
+    def live_slots(self):
+        """The slots still in the window"""
+        oldest = int(self.clock() // self.slot_seconds) - self.slots.maxlen + 1
+        return [slot for slot in self.slots if slot.number >= oldest]
+
+    def summary(self):
+        slots = self.live_slots()
+        counts = {}
+        for slot in slots:
+            for bucket, count in slot.counts.items():
+                counts[bucket] = counts.get(bucket, 0) + count
+        count = sum(slot.count for slot in slots)
+        maximum = max((slot.maximum for slot in slots), default=0.0)
+        return {
+            "count": count,
+            "mean": sum(slot.total for slot in slots) / count if count else 0.0,
+            "p50": percentile(counts, count, maximum, 0.50),
+            "p95": percentile(counts, count, maximum, 0.95),
+            "p99": percentile(counts, count, maximum, 0.99),
+            "max": maximum,
+        }
+
+
+def percentile(counts, count, maximum, fraction):
+    """Upper bound of the bucket holding the `fraction` percentile of `count` durations"""
+    rank = fraction * count
+    seen = 0
+    index = len(BOUNDS)
+    for index in sorted(counts):
+        seen += counts[index]
+        if seen >= rank:
+            break
+    # The maximum is exact and tighter than the last bucket's bound
+    return min(BOUNDS[index], maximum) if index < len(BOUNDS) else maximum
+
+
+class Timing:
+    """Yielded by Metrics.timed, set `cause` to explain a slow operation"""
+
+    __slots__ = ("cause",)
+
+    def __init__(self):
+        self.cause = None
+
+
+class Metrics:
+    """
+    Rolling latency histograms per operation, overall and per view, over
+    the last WINDOW seconds.
+
+    With `slow_threshold` set, operations taking at least that many ms are
+    printed to the console with the view, the buffer size and the cause.
+    """
+
+    def __init__(self):
+        self.operations = {}  # operation -> Histogram
+        self.views = {}  # view id -> {operation: Histogram}
+        self.slow_threshold = None  # ms, None disables the slow operation log
+        self.lock = threading.Lock()
+
+    def record(self, operation, ms, view=None, size=None, cause=None):
+        with self.lock:
+            histogram = self.operations.get(operation)
+            if histogram is None:
+                histogram = self.operations[operation] = Histogram()
+            histogram.record(ms)
+            if view is not None:
+                per_view = self.views.setdefault(view, {})
+                histogram = per_view.get(operation)
+                if histogram is None:
+                    histogram = per_view[operation] = Histogram()
+                histogram.record(ms)
+
+        threshold = self.slow_threshold
+        if threshold is not None and ms >= threshold:
+            details = [f"view {view}"] if view is not None else []
+            if size is not None:
+                details.append(f"{size} chars")
+            if cause:
+                details.append(cause)
+            print(f"kamal: slow {operation} took {ms:.0f} ms ({', '.join(details)})")
+
+    @contextmanager
+    def timed(self, operation, view=None, size=None):
+        """Record the duration of the with block"""
+        timing = Timing()
+        start = time.perf_counter()
+        try:
+            yield timing
+        finally:
+            self.record(operation, (time.perf_counter() - start) * 1000, view, size, timing.cause)
+
+    def forget(self, view):
+        with self.lock:
+            self.views.pop(view, None)
+
+    def reset(self):
+        with self.lock:
+            self.operations.clear()
+            self.views.clear()
+
+    def snapshot(self):
+        """Summaries per operation and per view, as JSON types, of the operations run in the window"""
+        with self.lock:
+            operations = summaries(self.operations)
+            views = {str(view): summaries(per_view) for view, per_view in self.views.items()}
+        return {
+            "window": WINDOW,
+            "operations": operations,
+            "views": {view: per_view for view, per_view in views.items() if per_view},
+        }
+
+
+def summaries(histograms):
+    """Summary per operation of those recorded in the window"""
+    found = {}
+    for operation, histogram in histograms.items():
+        summary = histogram.summary()
+        if summary["count"]:
+            found[operation] = summary
+    return found
+
+
+def format_table(summaries, indent=""):
+    lines = [f"{indent}{'operation':<24} {'count':>7} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9}"]
+    for operation in sorted(summaries):
+        summary = summaries[operation]
+        lines.append(
+            f"{indent}{operation:<24} {summary['count']:>7} " +
+            " ".join(f"{summary[key]:>7.1f}ms" for key in ("p50", "p95", "p99", "max"))
+        )
+    return lines
+
+
+def format_report(snapshot, title, view_names=None):
+    """Plain text report of a snapshot, `view_names` maps view ids to names"""
+    view_names = view_names or {}
+    lines = [title, "=" * len(title), ""]
+    minutes = snapshot.get("window", WINDOW) / 60
+    if not snapshot["operations"]:
+        lines.append(f"Nothing recorded in the last {minutes:g} minutes")
+        return "\n".join(lines) + "\n"
+
+    lines.append(f"Last {minutes:g} minutes")
+    lines.append("")
+
+    lines.extend(format_table(snapshot["operations"]))
+    for view, summaries in sorted(snapshot["views"].items(), key=lambda item: int(item[0])):
+        lines.append("")
+        lines.append(f"View {view}: {view_names.get(int(view), 'closed or untitled')}")
+        lines.extend(format_table(summaries, "  "))
+    return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
@@ -0,0 +1,187 @@
+"""
+Incremental parso parsing keyed per view.
+"""
+import os
+import threading
+from pathlib import Path
+
+from jedi.api.errors import SyntaxError as JediSyntaxError
+from jedi.cache import clear_time_caches
+from parso.cache import parser_cache
+from parso.utils import split_lines
+
+from .memory import PARSO_BYTES, memory_budget
+
+
+class _ShiftedIssue:
+    """A cached parso issue moved to the current position of its statement"""
+    __slots__ = ("code", "message", "start_pos", "end_pos")
+
+    def __init__(self, issue, line_delta):
+        self.code = issue.code
+        self.message = issue.message
+        self.start_pos = (issue.start_pos[0] + line_delta, issue.start_pos[1])
+        self.end_pos = (issue.end_pos[0] + line_delta, issue.end_pos[1])
+
+
+class ParseState:
+    """
+    Last parse of one view, updated through parso's diff parser.
+
+    parso keeps the diff parser's cache keyed by grammar and path, and the
+    diff parser rewrites the cached module in place. jedi's Scripts use the
+    entry of the view's file name, read on the jedi worker, while syntax
+    checks run on Sublime's async thread. So the state parses under a
+    synthetic path of its own, and the two never walk a tree the other is
+    rewriting; each still gets incremental reparses of its own tree.
+
+    Syntax errors are collected per top-level statement and cached by the
+    statement's source, so only the statements touched by an edit are walked
+    again.
+    """
+
+    def __init__(self, grammar, path, file_path=None):
+        self.grammar = grammar
+        self.path = path  # this state's key in parso's cache
+        self.file_path = file_path  # the view's file, jedi's key
+        self.code = None
+        self.module = None
+        self.lines = []
+        self.lock = threading.RLock()  # Serializes diff parses of this path
+        self._errors = {}  # (node type, statement source) -> [issue]
+
+    def update(self, code):
+        """Bring the module in line with `code`, reparsing only what changed"""
+        with self.lock:
+            self.module = self.grammar.parse(code, path=self.path, diff_cache=True)
+            if code != self.code:
+                self.code = code
+                self.lines = split_lines(code, keepends=True)
+            return self.module
+
+    def syntax_errors(self, code):
+        """Return jedi SyntaxError objects for `code`"""
+        with self.lock:
+            module = self.update(code)
+            errors = {}
+            seen = {}
+            for child in module.children:
+                for issue in self._child_errors(child, seen):
+                    # parso reports at most one error per line
+                    errors.setdefault(issue.start_pos[0], issue)
+            # Forget statements that no longer exist
+            self._errors = seen
+            return [JediSyntaxError(issue) for issue in errors.values()]
+
+    def _child_errors(self, child, seen):
+        start_line = child.start_pos[0]
+        end_line = child.end_pos[0]
+        source = "".join(self.lines[start_line - 1:end_line])
+        # Whether a __future__ import is valid depends on what precedes it
+        if child.type == "endmarker" or "__future__" in source:
+            return self.grammar.iter_errors(child)
+
+        key = (child.type, child.start_pos[1], source)
+        cached = self._errors.get(key)
+        if cached is None:
+            cached = (start_line, self.grammar.iter_errors(child))
+        seen[key] = cached
+        line, issues = cached
+        if line == start_line:
+            return issues
+        return [_ShiftedIssue(issue, start_line - line) for issue in issues]
+
+    def discard(self):
+        """Drop this state's module and jedi's module of the view from parso's cache"""
+        with self.lock:
+            items = parser_cache.get(self.grammar._hashed, {})
+            items.pop(Path(self.path), None)
+            if self.file_path:
+                items.pop(Path(self.file_path), None)
+            self._errors.clear()
+            self.module = None
+            self.code = None
+            self.lines = []
+
+
+class ParseStates:
+    """Registry of ParseState objects keyed by view id"""
+
+    def __init__(self):
+        self.states = {}
+        self.lock = threading.Lock()
+
+    def get(self, view_id, file_path, grammar):
+        path = os.path.join("<kamal>", str(view_id), os.path.basename(file_path or "untitled.py"))
+        with self.lock:
+            state = self.states.get(view_id)
+            # The view was saved under a new name or the environment changed
+            if state is None or state.file_path != file_path or state.grammar is not grammar:
+                if state is not None:
+                    state.discard()
+                state = self.states[view_id] = ParseState(grammar, path, file_path)
+            return state
+
+    def discard(self, view_id):
+        with self.lock:
+            state = self.states.pop(view_id, None)
+        if state is not None:
+            state.discard()
+
+    def sizes(self):
+        """Estimated bytes of each view's trees, the syntax check's and jedi's"""
+        with self.lock:
+            states = list(self.states.items())
+        sizes = {}
+        for view_id, state in states:
+            items = parser_cache.get(state.grammar._hashed, {})
+            size = sum(len(line) for line in state.lines)
+            item = items.get(Path(state.file_path)) if state.file_path else None
+            if item is not None:
+                size += sum(len(line) for line in item.lines)
+            sizes[view_id] = size * PARSO_BYTES
+        return sizes
+
+    def paths(self):
+        """Paths of the views' modules in parso's cache, both keys of each"""
+        with self.lock:
+            states = list(self.states.values())
+        return {Path(path) for state in states for path in (state.path, state.file_path) if path}
+
+
+parse_states = ParseStates()
+
+
+def library_modules():
+    """(last used, grammar hash, path, estimated bytes) of the modules jedi loaded for imports"""
+    views = parse_states.paths()
+    modules = []
+    for hashed, items in list(parser_cache.items()):
+        for path, item in list(items.items()):
+            if path not in views:
+                size = sum(len(line) for line in item.lines) * PARSO_BYTES
+                modules.append((item.last_used, hashed, path, size))
+    return modules
+
+
+def library_size():
+    return sum(size for _, _, _, size in library_modules())
+
+
+def trim_library_modules(target):
+    """Drop the modules used least recently until about `target` bytes remain"""
+    modules = sorted(library_modules(), key=lambda module: module[0])
+    size = sum(module[3] for module in modules)
+    for _, hashed, path, module_size in modules:
+        if size <= target:
+            break
+        parser_cache.get(hashed, {}).pop(path, None)
+        size -= module_size
+    # Expired memoized call signatures and the like; delete_all would also
+    # clear parso's whole cache, the views' trees included
+    clear_time_caches()
+    return size
+
+
+memory_budget.register("parso trees", parse_states.sizes, parse_states.discard)
+memory_budget.register_shared("library modules", library_size, trim_library_modules)
@@ -0,0 +1,62 @@
+"""
+Per-view debouncing of analyses.
+"""
+import threading
+
+
+class AnalysisScheduler:
+    """
+    Debounce analysis requests per view.
+
+    Every request re-arms the view's idle timer, so a burst of edits results
+    in a single run once the user pauses. At most one run is in flight per
+    view; a request that comes due while one is running is deferred until it
+    finishes.
+    """
+
+    def __init__(self, callback, set_timeout):
+        self.callback = callback
+        self.set_timeout = set_timeout  # sublime.set_timeout_async in the plugins
+        self.pending = {}  # view id -> change count of the latest request
+        self.running = set()  # view ids with an analysis in flight
+        self.deferred = set()  # view ids whose timer expired during a run
+        self.lock = threading.Lock()
+
+    def schedule(self, view, delay):
+        """Run the callback with `view` once it has been idle for `delay` ms"""
+        view_id = view.id()
+        change_count = view.change_count()
+        with self.lock:
+            self.pending[view_id] = change_count
+        self.set_timeout(lambda: self._fire(view, change_count), delay)
+
+    def forget(self, view):
+        view_id = view.id()
+        with self.lock:
+            self.pending.pop(view_id, None)
+            self.deferred.discard(view_id)
+
+    def _fire(self, view, change_count):
+        view_id = view.id()
+        with self.lock:
+            # A newer request re-armed the timer, let that one run instead
+            if self.pending.get(view_id) != change_count:
+                return
+            if view_id in self.running:
+                self.deferred.add(view_id)
+                return
+            del self.pending[view_id]
+            self.running.add(view_id)
+
+        try:
+            # Drop work for closed views and buffers that moved on
+            if view.is_valid() and view.change_count() == change_count:
+                self.callback(view, change_count)
+        finally:
+            with self.lock:
+                self.running.discard(view_id)
+                rerun = view_id in self.deferred
+                self.deferred.discard(view_id)
+                next_count = self.pending.get(view_id)
+            if rerun and next_count is not None:
+                self.set_timeout(lambda: self._fire(view, next_count), 0)
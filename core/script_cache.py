@@ -0,0 +1,102 @@
+"""
+Cache of jedi Script and Project objects.
+"""
+import os
+import threading
+from collections import OrderedDict
+
+import jedi
+
+from .memory import SCRIPT_BYTES, memory_budget
+from .metrics import metrics
+from .parsing import parse_states
+
+
+class ScriptCache:
+    """
+    LRU of jedi Scripts keyed by view id and change count.
+
+    A Script holds the parsed module and jedi's inference state for one
+    version of a buffer, so completion and hover on an unchanged buffer share
+    one of them. Only the latest version of each view is kept. Projects are
+    looked up once per directory instead of on every Script.
+
+    `stats()` reports hits and misses, e.g. from the Sublime console.
+    """
+
+    def __init__(self, max_size=16):
+        self.max_size = max_size
+        self.scripts = OrderedDict()  # view id -> (change count, Script, code size)
+        self.projects = {}  # directory -> jedi.Project
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, view_id, change_count, read_code, path, environment):
+        """
+        Return the Script for this version of the view. `read_code` is only
+        called on a miss, so hits don't copy the buffer.
+        """
+        memory_budget.touch(view_id)
+        with self.lock:
+            entry = self.scripts.get(view_id)
+            if entry is not None and entry[0] == change_count:
+                self.hits += 1
+                self.scripts.move_to_end(view_id)
+                return entry[1]
+            self.misses += 1
+
+        code = read_code()
+        with metrics.timed("analysis.script", view_id, len(code)) as timing:
+            timing.cause = "buffer edited" if entry is not None else "new or evicted buffer"
+            script = self._create(view_id, code, path, environment)
+
+        with self.lock:
+            self.scripts[view_id] = (change_count, script, len(code))
+            self.scripts.move_to_end(view_id)
+            while len(self.scripts) > self.max_size:
+                self.scripts.popitem(last=False)
+        return script
+
+    def project(self, path):
+        """The jedi Project for a file at `path`, looked up once per directory"""
+        directory = os.path.dirname(path) if path else None
+        project = self.projects.get(directory)
+        if project is None:
+            project = self.projects[directory] = jedi.get_default_project(directory)
+        return project
+
+    def _create(self, view_id, code, path, environment):
+        project = self.project(path)
+        # Registers the view's file with the parse states, which count and
+        # discard jedi's tree of it with their own
+        parse_states.get(view_id, path, environment.get_grammar())
+        return jedi.Script(code=code, path=path, environment=environment, project=project)
+
+    def evict(self, view_id):
+        with self.lock:
+            self.scripts.pop(view_id, None)
+
+    def resize(self, max_size):
+        with self.lock:
+            self.max_size = max_size
+            while len(self.scripts) > self.max_size:
+                self.scripts.popitem(last=False)
+
+    def sizes(self):
+        """Estimated bytes per view; the trees are counted with the parse states"""
+        with self.lock:
+            return {view_id: SCRIPT_BYTES + 2 * entry[2] for view_id, entry in self.scripts.items()}
+
+    def stats(self):
+        with self.lock:
+            return {
+                "scripts": len(self.scripts),
+                "projects": len(self.projects),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+script_cache = ScriptCache()
+memory_budget.register("jedi scripts", script_cache.sizes, script_cache.evict)
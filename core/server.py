@@ -0,0 +1,115 @@
+"""
+Analysis server: runs the Analyzer in a separate, long-lived process, so
+jedi's caches stay warm and a slow inference can't hold up Sublime's plugin
+host. Start it from the package root:
+
+    python -m core.server
+
+It reads one JSON request per line on stdin and writes one response per
+line on stdout, in the order requests finish:
+
+    {"id": 1, "method": "complete", "params": {"view": 1, ...}}
+    {"id": 1, "result": [["path\\tmodule", "path"]]}
+    {"id": 2, "error": {"type": "SyntaxError", "message": "..."}}
+    {"id": 3, "cancelled": true}
+
+Methods are those of core.analysis.Analyzer. Two control messages have no
+id and no response: {"method": "cancel", "params": {"id": 3}} drops a
+pending request or the result of a running one, and {"method": "shutdown"}
+stops the server.
+"""
+import json
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+METHODS = {"syntax", "undefined", "complete", "hover", "warm_up", "metrics", "memory", "trim", "close"}
+
+
+class AnalysisServer:
+    def __init__(self, analyzer, output):
+        self.analyzer = analyzer
+        self.output = output
+        # jedi is not thread safe, so requests run one at a time
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.active = set()  # ids of queued and running requests
+        self.cancelled = set()
+        self.lock = threading.Lock()
+
+    def serve(self, lines):
+        """Handle requests from `lines` until shutdown or end of input"""
+        for line in lines:
+            if not line.strip():
+                continue
+            try:
+                message = json.loads(line)
+            except ValueError as ex:
+                self.reply({"id": None, "error": {"type": "ValueError", "message": str(ex)}})
+                continue
+
+            method = message.get("method")
+            if method == "shutdown":
+                break
+            if method == "cancel":
+                self.cancel(message.get("params", {}).get("id"))
+                continue
+
+            with self.lock:
+                self.active.add(message.get("id"))
+            self.executor.submit(self.handle, message)
+
+        self.executor.shutdown(wait=True)
+
+    def cancel(self, request_id):
+        with self.lock:
+            if request_id in self.active:
+                self.cancelled.add(request_id)
+
+    def handle(self, message):
+        request_id = message.get("id")
+        method = message.get("method")
+        try:
+            if self.is_cancelled(request_id):
+                return
+            if method not in METHODS:
+                raise ValueError(f"unknown method {method!r}")
+            result = getattr(self.analyzer, method)(**message.get("params", {}))
+            if self.is_cancelled(request_id):
+                return
+            self.reply({"id": request_id, "result": result})
+        except Exception as ex:
+            self.reply({"id": request_id, "error": {"type": type(ex).__name__, "message": str(ex)}})
+        finally:
+            with self.lock:
+                self.active.discard(request_id)
+                if request_id in self.cancelled:
+                    self.cancelled.discard(request_id)
+                    self.reply({"id": request_id, "cancelled": True})
+
+    def is_cancelled(self, request_id):
+        with self.lock:
+            return request_id in self.cancelled
+
+    def reply(self, message):
+        self.output.write(json.dumps(message) + "\n")
+        self.output.flush()
+
+
+def main():
+    if sys.version_info < (3, 8):
+        sys.exit(f"the analysis server needs Python 3.8+, {sys.executable} is {sys.version.split()[0]}")
+
+    import jedi
+
+    from .analysis import Analyzer
+
+    # stdout carries the protocol, keep stray prints off it
+    output, sys.stdout = sys.stdout, sys.stderr
+
+    # The server runs on the interpreter the plugins picked for jedi
+    environment = jedi.create_environment(sys.executable, safe=False)
+    AnalysisServer(Analyzer(environment), output).serve(sys.stdin)
+
+
+if __name__ == "__main__":
+    main()
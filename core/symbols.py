@@ -0,0 +1,493 @@
+"""
+Persistent index of the names each project module defines at top level.
+
+jedi has to parse and infer a module before it can list its names, and the
+undefined name check, which never runs jedi, can't know what `from x import
+*` brings in. The index keeps, for every Python file of the open projects,
+its top-level definitions, imports and `__all__`, in SQLite in the package's
+cache directory. Files are indexed again only when their mtime or size
+changed and their content hash with them, so reopening a project costs a
+stat per file. Module names come from the file's package, found by walking
+up the directories with an `__init__.py`. A module resolves only from the
+directory it would be imported from, its root: a project folder or the root
+of the importing file, so `scripts/json.py` doesn't stand in for `json`.
+"""
+import ast
+import hashlib
+import os
+import threading
+from importlib.util import decode_source
+
+try:
+    import sqlite3
+except ImportError:  # Python builds without it; the index is then empty
+    sqlite3 = None
+
+from .lint import iter_python_files
+
+INDEX_FILE = "symbols.sqlite3"
+
+# Bumped when the tables or what is extracted change
+SCHEMA_VERSION = 2
+
+MAX_FILE_SIZE = 1024 * 1024  # larger files are generated or data, not indexed
+MAX_STAR_DEPTH = 8  # star imports followed through other star imports
+
+SCHEMA = """
+CREATE TABLE modules (
+    path TEXT PRIMARY KEY,
+    module TEXT NOT NULL,
+    root TEXT NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    hash TEXT NOT NULL,
+    has_all INTEGER NOT NULL
+);
+CREATE INDEX modules_module ON modules (module);
+CREATE TABLE symbols (
+    path TEXT NOT NULL,
+    name TEXT NOT NULL,
+    kind TEXT NOT NULL
+);
+CREATE INDEX symbols_path ON symbols (path);
+CREATE INDEX symbols_name ON symbols (name COLLATE NOCASE);
+"""
+
+# Kinds of the symbols table besides definitions: a name listed in
+# `__all__`, and the absolute name of a module star imported
+ALL = "__all__"
+STAR = "*"
+
+
+def module_name(path, packages=None):
+    """
+    Dotted name of the module at `path`, from the enclosing packages.
+    `packages` caches whether a directory is one across calls.
+    """
+    packages = {} if packages is None else packages
+    directory, file_name = os.path.split(os.path.abspath(path))
+    stem = os.path.splitext(file_name)[0]
+    parts = [] if stem == "__init__" else [stem]
+    while True:
+        is_package = packages.get(directory)
+        if is_package is None:
+            is_package = packages[directory] = os.path.isfile(os.path.join(directory, "__init__.py"))
+        if not is_package:
+            break
+        directory, package = os.path.split(directory)
+        parts.append(package)
+        if not package:
+            break
+    return ".".join(reversed(parts))
+
+
+def module_root(path, module):
+    """Directory the `module` at `path` is imported from, its sys.path entry"""
+    directory = os.path.dirname(os.path.abspath(path))
+    for _ in range(module.count(".") + (os.path.basename(path) == "__init__.py")):
+        directory = os.path.dirname(directory)
+    return directory
+
+
+def package_name(path, packages=None):
+    """Dotted name of the package the module at `path` is in, "" for none"""
+    module = module_name(path, packages)
+    if os.path.basename(path) == "__init__.py":
+        return module
+    return module.rpartition(".")[0]
+
+
+def absolute_module(package, node):
+    """
+    Absolute name of the module a `from ... import` names, in a module of
+    `package`; None for a relative import going above the top package
+    """
+    if not node.level:
+        return node.module
+    parts = package.split(".") if package else []
+    if node.level - 1 >= len(parts):
+        return None
+    base = parts[:len(parts) - (node.level - 1)]
+    return ".".join(base + ([node.module] if node.module else []))
+
+
+def module_statements(tree):
+    """
+    The statements run at module level, including those in if, try and with
+    blocks, so conditional definitions like imports in try/except count
+    """
+    statements = list(tree.body)
+    while statements:
+        statement = statements.pop(0)
+        yield statement
+        if isinstance(statement, (ast.If, ast.Try, ast.With, ast.AsyncWith)):
+            for field in ("body", "orelse", "finalbody"):
+                statements.extend(getattr(statement, field, ()))
+            for handler in getattr(statement, "handlers", ()):
+                statements.extend(handler.body)
+
+
+def star_imports(tree, package=""):
+    """Absolute names of the modules `tree` star imports, in a module of `package`"""
+    found = []
+    for statement in module_statements(tree):
+        if isinstance(statement, ast.ImportFrom) and any(alias.name == "*" for alias in statement.names):
+            target = absolute_module(package, statement)
+            if target:
+                found.append(target)
+    return found
+
+
+def module_symbols(source, package=""):
+    """
+    (name, kind) of the top-level names in `source` and whether it sets
+    `__all__`. Kinds are "class", "function", "variable" and "import", ALL
+    for the names in `__all__` and STAR for star imported modules, whose
+    relative names are resolved in `package`. Raises SyntaxError.
+    """
+    tree = ast.parse(source)
+    symbols = []
+    has_all = False
+
+    def add_targets(target):
+        if isinstance(target, ast.Name):
+            symbols.append((target.id, "variable"))
+        elif isinstance(target, (ast.Tuple, ast.List)):
+            for element in target.elts:
+                add_targets(element)
+        elif isinstance(target, ast.Starred):
+            add_targets(target.value)
+
+    def add_all(value):
+        if isinstance(value, (ast.List, ast.Tuple)):
+            for element in value.elts:
+                if isinstance(element, ast.Constant) and isinstance(element.value, str):
+                    symbols.append((element.value, ALL))
+
+    for statement in module_statements(tree):
+        if isinstance(statement, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            symbols.append((statement.name, "function"))
+        elif isinstance(statement, ast.ClassDef):
+            symbols.append((statement.name, "class"))
+        elif isinstance(statement, (ast.Assign, ast.AnnAssign, ast.AugAssign)):
+            targets = statement.targets if isinstance(statement, ast.Assign) else [statement.target]
+            for target in targets:
+                if isinstance(target, ast.Name) and target.id == "__all__":
+                    has_all = True
+                    add_all(statement.value)
+                else:
+                    add_targets(target)
+        elif isinstance(statement, ast.Import):
+            for alias in statement.names:
+                symbols.append((alias.asname or alias.name.split(".")[0], "import"))
+        elif isinstance(statement, ast.ImportFrom):
+            for alias in statement.names:
+                if alias.name == "*":
+                    target = absolute_module(package, statement)
+                    if target:
+                        symbols.append((target, STAR))
+                else:
+                    symbols.append((alias.asname or alias.name, "import"))
+        elif isinstance(statement, ast.Expr) and isinstance(statement.value, ast.Call):
+            # __all__.extend([...]) and __all__.append("...")
+            func = statement.value.func
+            if (isinstance(func, ast.Attribute) and isinstance(func.value, ast.Name) and
+                    func.value.id == "__all__" and statement.value.args):
+                argument = statement.value.args[0]
+                if func.attr == "extend":
+                    add_all(argument)
+                elif func.attr == "append":
+                    add_all(ast.List(elts=[argument]))
+    return symbols, has_all
+
+
+class SymbolIndex:
+    """
+    The index in the SQLite database at `path`, in memory without one.
+    Safe to use from several threads. Without sqlite3 it stays empty.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.connection = None
+        self.folders = set()  # project folders, set by SymbolIndexer.start
+        self.lock = threading.Lock()
+
+    def _connect(self):
+        """The connection, opened and migrated on first use; call with the lock held"""
+        if self.connection is not None or sqlite3 is None:
+            return self.connection
+        location = self.path or ":memory:"
+        if self.path:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        try:
+            self.connection = self._open(location)
+        except sqlite3.DatabaseError as ex:
+            # A damaged file is only a cache, start over
+            print(f"kamal: rebuilding the symbol index: {ex}")
+            os.remove(self.path)
+            self.connection = self._open(location)
+        return self.connection
+
+    @staticmethod
+    def _open(location):
+        connection = sqlite3.connect(location, check_same_thread=False)
+        version = connection.execute("PRAGMA user_version").fetchone()[0]
+        if version != SCHEMA_VERSION:
+            connection.executescript("DROP TABLE IF EXISTS modules; DROP TABLE IF EXISTS symbols;")
+            connection.executescript(SCHEMA)
+            connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            connection.commit()
+        return connection
+
+    def close(self):
+        with self.lock:
+            if self.connection is not None:
+                self.connection.close()
+                self.connection = None
+
+    def index_file(self, path, packages=None, commit=True):
+        """
+        Bring the entry of the file at `path` up to date. Returns whether
+        its symbols were extracted again.
+        """
+        try:
+            stat = os.stat(path)
+        except OSError:
+            self.forget([path])
+            return False
+        with self.lock:
+            connection = self._connect()
+            if connection is None:
+                return False
+            row = connection.execute("SELECT mtime_ns, size, hash FROM modules WHERE path = ?", (path,)).fetchone()
+        if row is not None and row[:2] == (stat.st_mtime_ns, stat.st_size):
+            return False
+        if stat.st_size > MAX_FILE_SIZE:
+            self.forget([path])
+            return False
+
+        try:
+            with open(path, "rb") as file:
+                data = file.read()
+        except OSError:
+            return False
+        digest = hashlib.sha1(data).hexdigest()
+        packages = {} if packages is None else packages
+        module = module_name(path, packages)
+        if row is not None and row[2] == digest:
+            # Touched but not changed
+            with self.lock:
+                connection.execute(
+                    "UPDATE modules SET mtime_ns = ?, size = ?, module = ?, root = ? WHERE path = ?",
+                    (stat.st_mtime_ns, stat.st_size, module, module_root(path, module), path)
+                )
+                if commit:
+                    connection.commit()
+            return False
+
+        try:
+            symbols, has_all = module_symbols(decode_source(data), package_name(path, packages))
+        except (SyntaxError, ValueError, UnicodeDecodeError, RecursionError):
+            # Keep the last good symbols of a file being edited
+            if row is not None:
+                return False
+            symbols, has_all = [], False
+        with self.lock:
+            connection.execute("DELETE FROM symbols WHERE path = ?", (path,))
+            connection.execute(
+                "INSERT OR REPLACE INTO modules VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (path, module, module_root(path, module), stat.st_mtime_ns, stat.st_size, digest, int(has_all))
+            )
+            connection.executemany(
+                "INSERT INTO symbols VALUES (?, ?, ?)", [(path, name, kind) for name, kind in symbols]
+            )
+            if commit:
+                connection.commit()
+        return True
+
+    def forget(self, paths):
+        with self.lock:
+            connection = self._connect()
+            if connection is None:
+                return
+            for path in paths:
+                connection.execute("DELETE FROM symbols WHERE path = ?", (path,))
+                connection.execute("DELETE FROM modules WHERE path = ?", (path,))
+            connection.commit()
+
+    def forget_missing(self, folders, seen):
+        """Drop the files under `folders` that weren't `seen` by the last walk of them"""
+        folders = [os.path.join(os.path.abspath(folder), "") for folder in folders]
+        with self.lock:
+            connection = self._connect()
+            if connection is None:
+                return
+            paths = [path for path, in connection.execute("SELECT path FROM modules")]
+        self.forget([
+            path for path in paths
+            if path not in seen and any(path.startswith(folder) for folder in folders)
+        ])
+
+    def commit(self):
+        with self.lock:
+            if self.connection is not None:
+                self.connection.commit()
+
+    def _module_path(self, connection, module, near=None):
+        """
+        Path of the indexed `module` importable from a project folder or the
+        root of `near`, preferring one in the same tree as `near`
+        """
+        roots = set(self.folders)
+        if near:
+            row = connection.execute("SELECT root FROM modules WHERE path = ?", (near,)).fetchone()
+            roots.add(row[0] if row else module_root(near, module_name(near)))
+        paths = [
+            path for path, root in connection.execute("SELECT path, root FROM modules WHERE module = ?", (module,))
+            if root in roots
+        ]
+        if not paths:
+            return None
+        if near and len(paths) > 1:
+            # The candidate sharing the longest directory prefix with `near`
+            return max(paths, key=lambda path: len(os.path.commonprefix([path, near])))
+        return paths[0]
+
+    def exports(self, module, near=None):
+        """
+        Names `from module import *` binds, None if the module isn't
+        indexed or star imports one that isn't. `near` is the importing
+        file, which picks among modules of the same name in several projects.
+        """
+        with self.lock:
+            connection = self._connect()
+            if connection is None:
+                return None
+            return self._exports(connection, module, near, set())
+
+    def _exports(self, connection, module, near, visiting):
+        if module in visiting or len(visiting) >= MAX_STAR_DEPTH:
+            return set()
+        visiting.add(module)
+        path = self._module_path(connection, module, near)
+        if path is None:
+            return None
+        has_all = connection.execute("SELECT has_all FROM modules WHERE path = ?", (path,)).fetchone()[0]
+        rows = connection.execute("SELECT name, kind FROM symbols WHERE path = ?", (path,)).fetchall()
+        if has_all:
+            return {name for name, kind in rows if kind == ALL}
+        names = {name for name, kind in rows if kind not in (ALL, STAR) and not name.startswith("_")}
+        for name, kind in rows:
+            if kind == STAR:
+                star = self._exports(connection, name, path, visiting)
+                if star is None:
+                    return None
+                names |= star
+        return names
+
+    def module_symbols(self, module, near=None):
+        """(name, kind) of the names `from module import` offers, None if it isn't indexed"""
+        with self.lock:
+            connection = self._connect()
+            if connection is None:
+                return None
+            path = self._module_path(connection, module, near)
+            if path is None:
+                return None
+            rows = connection.execute(
+                "SELECT DISTINCT name, kind FROM symbols WHERE path = ? AND kind NOT IN (?, ?) ORDER BY name",
+                (path, ALL, STAR)
+            ).fetchall()
+            # Submodules of a package can be imported from it too
+            prefix = module + "."
+            submodules = connection.execute(
+                "SELECT module FROM modules WHERE module LIKE ? ESCAPE '\\'",
+                (prefix.replace("_", "\\_") + "%",)
+            ).fetchall()
+        rows.extend(
+            (name[len(prefix):], "module") for name, in submodules if "." not in name[len(prefix):]
+        )
+        return rows
+
+    def complete(self, prefix, limit=50):
+        """(name, kind, module) of public definitions whose name starts with `prefix`, any case"""
+        if not prefix:
+            return []
+        with self.lock:
+            connection = self._connect()
+            if connection is None:
+                return []
+            return connection.execute(
+                "SELECT DISTINCT symbols.name, symbols.kind, modules.module FROM symbols "
+                "JOIN modules ON modules.path = symbols.path "
+                "WHERE symbols.name LIKE ? ESCAPE '\\' AND symbols.kind IN ('class', 'function', 'variable') "
+                "AND symbols.name NOT LIKE '\\_%' ESCAPE '\\' ORDER BY length(symbols.name) LIMIT ?",
+                (prefix.replace("\\", "\\\\").replace("_", "\\_").replace("%", "\\%") + "%", limit)
+            ).fetchall()
+
+    def stats(self):
+        with self.lock:
+            connection = self._connect()
+            if connection is None:
+                return {"modules": 0, "symbols": 0}
+            return {
+                "modules": connection.execute("SELECT count(*) FROM modules").fetchone()[0],
+                "symbols": connection.execute("SELECT count(*) FROM symbols").fetchone()[0],
+            }
+
+
+class SymbolIndexer:
+    """
+    Index the files of a project in the background, `batch` files at a
+    time every `interval` ms, so reading them never holds up the plugin
+    host for long. `start` replaces the folders being indexed.
+    """
+
+    def __init__(self, index, set_timeout, batch=20, interval=20):
+        self.index = index
+        self.set_timeout = set_timeout  # sublime.set_timeout_async in the plugins
+        self.batch = batch
+        self.interval = interval
+        self.generation = 0
+        self.lock = threading.Lock()
+
+    def start(self, folders, done=None):
+        """Index `folders`, then call `done(changed files)` if given"""
+        with self.lock:
+            self.generation += 1
+            generation = self.generation
+        self.index.folders = {os.path.abspath(folder) for folder in folders}
+        files = iter_python_files(folders)
+        state = {"seen": set(), "changed": 0, "packages": {}}
+        self.set_timeout(lambda: self._next(generation, folders, files, state, done), 0)
+
+    def cancel(self):
+        with self.lock:
+            self.generation += 1
+
+    def _next(self, generation, folders, files, state, done):
+        with self.lock:
+            if generation != self.generation:
+                return
+        try:
+            for _ in range(self.batch):
+                path = next(files, None)
+                if path is None:
+                    self.index.commit()
+                    self.index.forget_missing(folders, state["seen"])
+                    if done is not None:
+                        done(state["changed"])
+                    return
+                path = os.path.abspath(path)
+                state["seen"].add(path)
+                if self.index.index_file(path, state["packages"], commit=False):
+                    state["changed"] += 1
+            self.index.commit()
+        except Exception as ex:
+            print(f"kamal: indexing symbols failed: {ex}")
+            return
+        self.set_timeout(lambda: self._next(generation, folders, files, state, done), self.interval)
+
+
+symbol_index = SymbolIndex()
@@ -0,0 +1,43 @@
+"""
+Tiered syntax checking.
+"""
+import ast
+import warnings
+
+
+def parse_module(code, file_path=None):
+    """CPython's AST of `code`; raises SyntaxError if it doesn't parse"""
+    with warnings.catch_warnings():
+        # Invalid escape sequences and the like are not syntax errors
+        warnings.simplefilter("ignore")
+        return compile(code, file_path or "<string>", "exec", ast.PyCF_ONLY_AST, dont_inherit=True)
+
+
+def compiles(code, file_path=None):
+    """
+    Check whether the code parses with CPython's own parser.
+
+    This is much cheaper than jedi's error-recovering parse, so it is used as
+    a fast path: only code that fails here needs the full error list.
+    """
+    try:
+        parse_module(code, file_path)
+    except Exception:
+        # SyntaxError, but also ValueError for null bytes and RecursionError
+        # for pathologically nested code; let jedi report on those
+        return False
+    return True
+
+
+def find_syntax_errors(state, document):
+    """
+    Return the syntax errors in `document` (a Document) as dicts with line,
+    column and message, using `state` (a ParseState) only when CPython
+    can't parse it
+    """
+    if document.compiles:
+        return []
+    return [
+        {"line": error.line, "column": error.column, "message": error.get_message()}
+        for error in state.syntax_errors(document.text)
+    ]
@@ -0,0 +1,30 @@
+"""
+Helpers for mapping line/column positions to buffer offsets.
+"""
+
+
+def line_starts(code, line_numbers):
+    """
+    Return {line: offset of the line's first character} for the given
+    1-based line numbers, with a single forward scan over `code`
+    """
+    starts = {}
+    line = 1
+    offset = 0
+    for wanted in sorted(set(line_numbers)):
+        while line < wanted:
+            newline = code.find("\n", offset)
+            if newline == -1:
+                # Past the end, clamp to the last line like view.text_point
+                break
+            offset = newline + 1
+            line += 1
+        starts[wanted] = offset
+    return starts
+
+
+def utf8_to_char_column(line_text, byte_column):
+    """Convert a UTF-8 byte offset within `line_text`, as ast reports it, to characters"""
+    if line_text.isascii():
+        return byte_column
+    return len(line_text.encode("utf-8")[:byte_column].decode("utf-8", errors="ignore"))
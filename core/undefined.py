@@ -0,0 +1,757 @@
+"""
+Undefined variable detection on Python source, without sublime.
+
+Two engines find the same kind of names. The visitor resolves every name
+through its own model of Python's scoping rules and also reports module and
+class level names used before they are bound. The symtable engine takes the
+scopes CPython's compiler computes and reports the names bound neither at
+module level nor in builtins.
+"""
+import _symtable
+import ast
+import builtins
+import sys
+import threading
+from collections import deque
+
+from .memory import SUMMARY_BYTES, memory_budget
+from .text import utf8_to_char_column
+
+COMPREHENSIONS = (ast.ListComp, ast.SetComp, ast.DictComp, ast.GeneratorExp)
+FUNCTIONS = (ast.FunctionDef, ast.AsyncFunctionDef, ast.Lambda)
+
+# Special Python variables, always treated as defined
+SPECIAL_VARS = {
+    '__name__',
+    '__file__',
+    '__doc__',
+    '__package__',
+    '__cached__',
+    '__spec__',
+    '__annotations__',
+    '__builtins__',
+    '__loader__',
+    '__path__',
+    '__dict__',
+    '__module__',
+    '__class__',
+    '__bases__',
+    '__mro__',
+    '__subclasses__',
+    '__init__',
+    '__new__',
+    '__del__',
+    '__repr__',
+    '__str__',
+    '__format__',
+    '__len__',
+    '__getitem__',
+    '__setitem__',
+    '__delitem__',
+    '__iter__',
+    '__next__',
+    '__contains__',
+    '__call__',
+    '__enter__',
+    '__exit__',
+    '__get__',
+    '__set__',
+    '__delete__',
+    '__slots__',
+    '__metaclass__',
+    '__qualname__',
+    '__all__',
+    'self',
+    'cls',
+}
+BUILTIN_NAMES = set(dir(builtins)) | SPECIAL_VARS
+
+
+class Scope:
+    """Names bound in one module, class, function, lambda or comprehension"""
+    __slots__ = ("kind", "parent", "names", "globals", "nonlocals")
+
+    def __init__(self, kind, parent=None):
+        self.kind = kind
+        self.parent = parent
+        self.names = set()
+        self.globals = set()
+        self.nonlocals = set()
+
+
+class UndefinedVariableChecker(ast.NodeVisitor):
+    """
+    Resolve every loaded name through a chain of scopes.
+
+    Module and class bodies run top to bottom, so their names must be bound
+    before they are used. Function and lambda bodies run later: they are
+    visited once the whole module is done, after collecting every name the
+    function binds, so they see later module-level definitions and their own
+    locals regardless of order. Class scopes are only visible from their own
+    body, as in Python.
+    """
+
+    special_vars = SPECIAL_VARS
+    builtin_names = BUILTIN_NAMES
+
+    def __init__(self):
+        self.undefined_vars = set()  # (name, line, col_offset, end_col_offset)
+        self.module = Scope("module")
+        self.scope = self.module
+        self.deferred = deque()  # (scope, node) run after the module body
+        self.postponed_annotations = False
+        # What the module body did before function bodies were visited
+        self.immediate_names = set()
+        self.immediate_undefined = set()
+
+    def is_special_var(self, var_name):
+        """Check if a variable name is a special Python variable"""
+        # Check if it's in our predefined special vars
+        if var_name in self.special_vars:
+            return True
+            
+        # Check if it follows dunder pattern (__x__)
+        if (len(var_name) > 4 and 
+            var_name.startswith('__') and 
+            var_name.endswith('__')):
+            return True
+            
+        return False
+
+    def is_defined(self, name):
+        """Walk the scope chain from the current scope, stopping at the first hit"""
+        scope = self.module if name in self.scope.globals else self.scope
+        start = scope
+        while scope is not None:
+            # Class bodies are not enclosing scopes for what is nested in them
+            if name in scope.names and (scope is start or scope.kind != "class"):
+                return True
+            scope = scope.parent
+        return name in self.builtin_names or self.is_special_var(name)
+
+    def bind(self, name):
+        if name in self.scope.globals:
+            self.module.names.add(name)
+        else:
+            self.scope.names.add(name)
+
+    def visit_Name(self, node):
+        if isinstance(node.ctx, ast.Store):
+            self.bind(node.id)
+        elif isinstance(node.ctx, ast.Load) and not self.is_defined(node.id):
+            self.undefined_vars.add((node.id, node.lineno, node.col_offset, node.end_col_offset))
+
+    def visit_Module(self, node):
+        self.generic_visit(node)
+        self.immediate_names = set(self.module.names)
+        self.immediate_undefined = set(self.undefined_vars)
+        # Function bodies see the module as it is once fully executed
+        while self.deferred:
+            scope, deferred = self.deferred.popleft()
+            self.scope = scope
+            if isinstance(deferred, FUNCTIONS):
+                self.visit_function_body(deferred)
+            else:
+                self.visit(deferred)
+        self.scope = self.module
+
+    def visit_annotation(self, node):
+        if node is None:
+            return
+        # With `from __future__ import annotations` they are never evaluated
+        # at definition time, so forward references are fine
+        if self.postponed_annotations:
+            self.deferred.append((self.scope, node))
+        else:
+            self.visit(node)
+
+    def visit_arguments(self, args):
+        """Visit defaults and annotations, which run in the enclosing scope"""
+        for default in args.defaults + args.kw_defaults:
+            if default is not None:
+                self.visit(default)
+        for arg in args.posonlyargs + args.args + args.kwonlyargs + [args.vararg, args.kwarg]:
+            if arg is not None:
+                self.visit_annotation(arg.annotation)
+
+    def visit_FunctionDef(self, node):
+        for decorator in node.decorator_list:
+            self.visit(decorator)
+        self.visit_arguments(node.args)
+        self.visit_annotation(node.returns)
+        self.bind(node.name)
+        self.deferred.append((Scope("function", self.scope), node))
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+    def visit_Lambda(self, node):
+        self.visit_arguments(node.args)
+        self.deferred.append((Scope("lambda", self.scope), node))
+
+    def visit_function_body(self, node):
+        scope = self.scope
+        args = node.args
+        for arg in args.posonlyargs + args.args + args.kwonlyargs + [args.vararg, args.kwarg]:
+            if arg is not None:
+                scope.names.add(arg.arg)
+
+        body = [node.body] if isinstance(node, ast.Lambda) else node.body
+        self.collect_bindings(body, scope)
+        for statement in body:
+            self.visit(statement)
+
+    def collect_bindings(self, nodes, scope):
+        """
+        Add every name bound in `nodes` to `scope`, without descending into
+        nested scopes. Python makes a name local to a function if it is bound
+        anywhere in it.
+        """
+        stack = list(nodes)
+        while stack:
+            node = stack.pop()
+            if isinstance(node, ast.Name):
+                if isinstance(node.ctx, ast.Store):
+                    scope.names.add(node.id)
+                continue
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                scope.names.add(node.name)
+                continue
+            if isinstance(node, (ast.Lambda,) + COMPREHENSIONS):
+                # Only walrus targets inside comprehensions bind out here
+                stack.extend(n.target for n in ast.walk(node) if isinstance(n, ast.NamedExpr))
+                continue
+            if isinstance(node, ast.Global):
+                scope.globals.update(node.names)
+            elif isinstance(node, ast.Nonlocal):
+                scope.nonlocals.update(node.names)
+            elif isinstance(node, (ast.Import, ast.ImportFrom)):
+                scope.names.update(self.imported_names(node))
+            elif isinstance(node, ast.ExceptHandler) and node.name:
+                scope.names.add(node.name)
+            elif getattr(node, "name", None) and type(node).__name__ in ("MatchAs", "MatchStar"):
+                scope.names.add(node.name)
+            elif getattr(node, "rest", None) and type(node).__name__ == "MatchMapping":
+                scope.names.add(node.rest)
+            stack.extend(ast.iter_child_nodes(node))
+
+        # Globals are bound in the module, nonlocals in an enclosing function
+        for name in scope.globals & scope.names:
+            self.module.names.add(name)
+        scope.names -= scope.globals | scope.nonlocals
+
+    def visit_ClassDef(self, node):
+        for decorator in node.decorator_list:
+            self.visit(decorator)
+        for base in node.bases:
+            self.visit(base)
+        for keyword in node.keywords:
+            self.visit(keyword)
+
+        # The class body runs right away, in its own scope
+        outer = self.scope
+        self.scope = Scope("class", outer)
+        for statement in node.body:
+            self.visit(statement)
+        self.scope = outer
+        self.bind(node.name)
+
+    def visit_comprehension_scope(self, node, *results):
+        generators = node.generators
+        # The first iterable is evaluated in the enclosing scope
+        self.visit(generators[0].iter)
+
+        outer = self.scope
+        self.scope = Scope("comprehension", outer)
+        for index, generator in enumerate(generators):
+            if index:
+                self.visit(generator.iter)
+            self.visit(generator.target)
+            for condition in generator.ifs:
+                self.visit(condition)
+        for result in results:
+            self.visit(result)
+        self.scope = outer
+
+    def visit_ListComp(self, node):
+        self.visit_comprehension_scope(node, node.elt)
+
+    visit_SetComp = visit_ListComp
+    visit_GeneratorExp = visit_ListComp
+
+    def visit_DictComp(self, node):
+        self.visit_comprehension_scope(node, node.key, node.value)
+
+    def visit_NamedExpr(self, node):
+        self.visit(node.value)
+        # Walrus targets bind in the nearest scope that isn't a comprehension
+        scope = self.scope
+        while scope.kind == "comprehension":
+            scope = scope.parent
+        if node.target.id in scope.globals:
+            scope = self.module
+        scope.names.add(node.target.id)
+
+    def visit_AnnAssign(self, node):
+        self.visit_annotation(node.annotation)
+        if node.value is not None:
+            self.visit(node.value)
+        self.visit(node.target)
+
+    def visit_ExceptHandler(self, node):
+        if node.type is not None:
+            self.visit(node.type)
+        if node.name:  # This is the 'e' in 'except Exception as e'
+            self.bind(node.name)
+        for statement in node.body:
+            self.visit(statement)
+
+    def visit_Global(self, node):
+        self.scope.globals.update(node.names)
+
+    def visit_Nonlocal(self, node):
+        self.scope.nonlocals.update(node.names)
+
+    def imported_names(self, node):
+        for alias in node.names:
+            if alias.name == "*":
+                continue
+            if alias.asname:
+                yield alias.asname
+            elif isinstance(node, ast.Import):
+                yield alias.name.split('.')[0]
+            else:
+                yield alias.name
+
+    def visit_Import(self, node):
+        for name in self.imported_names(node):
+            self.bind(name)
+
+    def visit_ImportFrom(self, node):
+        if node.module == "__future__" and any(alias.name == "annotations" for alias in node.names):
+            self.postponed_annotations = True
+        for name in self.imported_names(node):
+            self.bind(name)
+
+    # Capture patterns of match statements (Python 3.10+)
+    def visit_MatchAs(self, node):
+        if getattr(node, "pattern", None) is not None:
+            self.visit(node.pattern)
+        if node.name:
+            self.bind(node.name)
+
+    visit_MatchStar = visit_MatchAs
+
+    def visit_MatchMapping(self, node):
+        self.generic_visit(node)
+        if node.rest:
+            self.bind(node.rest)
+
+
+class StatementSummary:
+    """
+    What one top-level statement binds and uses at module level.
+
+    `immediate` holds loads that run when the statement does and found
+    nothing inside it, so an earlier statement must bind them; `deferred`
+    holds those in function bodies, which any statement may bind. Lines are
+    relative to the statement's first line.
+    """
+    __slots__ = ("binds", "late_binds", "immediate", "deferred")
+
+    def __init__(self, statement, first_line, postponed_annotations):
+        checker = UndefinedVariableChecker()
+        checker.postponed_annotations = postponed_annotations
+        checker.visit(ast.Module(body=[statement], type_ignores=[]))
+
+        self.binds = checker.immediate_names
+        # Bound through `global` inside a function body
+        self.late_binds = checker.module.names - checker.immediate_names
+        self.immediate = self.relative(checker.immediate_undefined, first_line)
+        self.deferred = self.relative(checker.undefined_vars - checker.immediate_undefined, first_line)
+
+    @staticmethod
+    def relative(loads, first_line):
+        return [(name, line - first_line, col, end_col) for name, line, col, end_col in loads]
+
+
+class IncrementalChecker:
+    """
+    Undefined names of a buffer that is checked over and over.
+
+    The module is summarized per top-level statement, and summaries are
+    cached by the statement's source, so after an edit only the statements
+    it touched are visited again. Resolution across statements only looks at
+    the summaries.
+    """
+
+    def __init__(self):
+        self.summaries = {}  # statement key -> StatementSummary
+        self.size = 0  # of the code last checked
+
+    def check(self, code, defined=(), tree=None):
+        """
+        Same result as find_undefined, raises SyntaxError the same way.
+        Names in `defined` count as bound before the first statement.
+        `tree` is the AST of `code` if it was already parsed.
+        """
+        if tree is None:
+            tree = ast.parse(code)
+        lines = code.split("\n")
+        postponed = any(
+            isinstance(statement, ast.ImportFrom) and statement.module == "__future__" and
+            any(alias.name == "annotations" for alias in statement.names)
+            for statement in tree.body
+        )
+
+        seen = {}
+        statements = []
+        for statement in tree.body:
+            # Decorators come before the def line
+            first_line = min([statement.lineno] + [d.lineno for d in getattr(statement, "decorator_list", ())])
+            source = "\n".join(lines[first_line - 1:statement.end_lineno])
+            # Several statements can share a line, the columns tell them apart
+            key = (postponed, statement.col_offset, statement.end_col_offset, source)
+            summary = seen.get(key) or self.summaries.get(key)
+            if summary is None:
+                summary = StatementSummary(statement, first_line, postponed)
+            seen[key] = summary
+            statements.append((first_line, summary))
+        # Forget statements that no longer exist
+        self.summaries = seen
+        self.size = len(code)
+
+        undefined = []
+        bound = set(defined)
+        for first_line, summary in statements:
+            undefined.extend(
+                (name, first_line + line, col, end_col)
+                for name, line, col, end_col in summary.immediate if name not in bound
+            )
+            bound |= summary.binds
+        for first_line, summary in statements:
+            bound |= summary.late_binds
+        for first_line, summary in statements:
+            undefined.extend(
+                (name, first_line + line, col, end_col)
+                for name, line, col, end_col in summary.deferred if name not in bound
+            )
+
+        undefined.sort(key=lambda item: (item[1], item[2]))
+        if code.isascii():
+            return undefined
+
+        # ast reports columns in UTF-8 bytes
+        return [
+            (name, line, utf8_to_char_column(lines[line - 1], col), utf8_to_char_column(lines[line - 1], end_col))
+            for name, line, col, end_col in undefined
+        ]
+
+
+def is_special_name(name):
+    """Names always treated as defined, like UndefinedVariableChecker.is_special_var"""
+    return name in BUILTIN_NAMES or (len(name) > 4 and name.startswith("__") and name.endswith("__"))
+
+
+# Raw symbol flags from CPython's compiler. The symtable module wraps them,
+# but in Python 3.8 it takes any function named "top" for the module.
+SCOPE_OFF = _symtable.SCOPE_OFF
+SCOPE_MASK = _symtable.SCOPE_MASK
+GLOBAL_SCOPES = (_symtable.GLOBAL_IMPLICIT, _symtable.GLOBAL_EXPLICIT)
+BINDING = _symtable.DEF_LOCAL | _symtable.DEF_IMPORT
+USE = _symtable.USE
+# Not exported: set on names bound by a comprehension's `for` targets
+DEF_COMP_ITER = _symtable.DEF_ANNOT << 1
+
+# From Python 3.12 list, set and dict comprehensions have no table of their
+# own: their names are merged into the enclosing scope's, where those only
+# the comprehension binds carry DEF_COMP_ITER (PEP 709)
+INLINED = (ast.ListComp, ast.SetComp, ast.DictComp) if sys.version_info >= (3, 12) else ()
+
+# symtable's name for the blocks of each kind of scope node
+SCOPE_NAMES = {
+    ast.Lambda: "lambda",
+    ast.ListComp: "listcomp",
+    ast.SetComp: "setcomp",
+    ast.DictComp: "dictcomp",
+    ast.GeneratorExp: "genexpr",
+}
+
+
+class ScopeMismatch(Exception):
+    """The symbol tables don't line up with the AST, e.g. on a newer Python"""
+
+
+class SymtableSummary:
+    """
+    What a run of top-level statements means to the module, from CPython's
+    symbol tables: the module-level names it binds and the names its scopes
+    look up in the module's globals.
+
+    The run is whole lines of the buffer, so statements sharing a line stay
+    together. Where the lookups are is only found, by walking the AST, once
+    a name they look up turns out to be undefined.
+    """
+
+    def __init__(self, source):
+        try:
+            self.top = _symtable.symtable(source, "<string>", "exec")
+        except SyntaxError as ex:
+            # e.g. a `global` after a use, which CPython's parser accepts
+            raise ScopeMismatch(str(ex))
+        # Walrus targets of inlined comprehensions are only DEF_GLOBAL here
+        self.binds = {
+            name for name, flags in self.top.symbols.items()
+            if flags & (BINDING | _symtable.DEF_GLOBAL) and not flags & DEF_COMP_ITER
+        }
+        self.lookups = {}  # table id -> names looked up in the module's globals
+        tables = [self.top]
+        index = 0
+        while index < len(tables):
+            table = tables[index]
+            index += 1
+            tables.extend(table.children)
+            names = set()
+            for name, flags in table.symbols.items():
+                if flags & DEF_COMP_ITER:
+                    continue
+                if table is not self.top and (flags >> SCOPE_OFF) & SCOPE_MASK not in GLOBAL_SCOPES:
+                    continue
+                # `global` declarations and walrus targets in comprehensions
+                if table is not self.top and flags & BINDING:
+                    self.binds.add(name)
+                if flags & USE and not is_special_name(name):
+                    names.add(name)
+            if names:
+                self.lookups[table.id] = names
+        self.uses = set().union(*self.lookups.values())
+        self.loads = None  # (name, line in the run, column, end column)
+        # Checks share summaries of unchanged runs, and the first to need
+        # the loads finds them and drops the tables
+        self.lock = threading.Lock()
+
+    def find_loads(self, statements, first_line):
+        """The lookups' Name nodes in `statements`, the run's current AST"""
+        with self.lock:
+            if self.loads is None:
+                loads = []
+                children = {}  # table id -> {(name, line): [child tables not matched yet]}
+                for statement in statements:
+                    self._find_loads(statement, self.top, first_line - 1, children, loads)
+                # The tables are only needed for the walk
+                self.loads = [(name, line - first_line, col, end_col) for name, line, col, end_col in loads]
+                self.top = None
+            return self.loads
+
+    def _find_loads(self, statement, top, offset, children, loads):
+        """Add the loads in `statement` of the names looked up in the module, whose table is `top`"""
+        # The names an inlined comprehension binds hide the table's
+        stack = [(statement, top, frozenset())]
+        while stack:
+            node, table, hidden = stack.pop()
+            if isinstance(node, ast.Name):
+                if (isinstance(node.ctx, ast.Load) and node.id in self.lookups.get(table.id, ()) and
+                        node.id not in hidden):
+                    loads.append((node.id, node.lineno, node.col_offset, node.end_col_offset))
+                continue
+
+            # Parts of a scope node evaluated in the enclosing scope come
+            # first, in the order CPython's symtable visits them, so scopes
+            # sharing a name and a line are matched in order
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.Lambda)):
+                inner = self._child(children, table, node, offset)
+                args = node.args
+                parts = [
+                    (default, table, hidden) for default in args.defaults + args.kw_defaults if default is not None
+                ]
+                for arg in args.posonlyargs + args.args + args.kwonlyargs + [args.vararg, args.kwarg]:
+                    if arg is not None and arg.annotation is not None:
+                        parts.append((arg.annotation, table, hidden))
+                if getattr(node, "returns", None) is not None:
+                    parts.append((node.returns, table, hidden))
+                parts.extend((decorator, table, hidden) for decorator in getattr(node, "decorator_list", ()))
+                body = [node.body] if isinstance(node, ast.Lambda) else node.body
+                parts.extend((child, inner, hidden) for child in body)
+            elif isinstance(node, ast.ClassDef):
+                inner = self._child(children, table, node, offset)
+                parts = [(child, table, hidden) for child in node.bases + node.keywords + node.decorator_list]
+                parts.extend((child, inner, hidden) for child in node.body)
+            elif isinstance(node, INLINED):
+                targets = hidden.union(
+                    target.id
+                    for generator in node.generators
+                    for target in ast.walk(generator.target)
+                    if isinstance(target, ast.Name)
+                )
+                parts = [(node.generators[0].iter, table, hidden)]
+                for position, generator in enumerate(node.generators):
+                    if position:
+                        parts.append((generator.iter, table, targets))
+                    parts.extend((condition, table, targets) for condition in generator.ifs)
+                results = [node.value, node.key] if isinstance(node, ast.DictComp) else [node.elt]
+                parts.extend((result, table, targets) for result in results)
+            elif isinstance(node, COMPREHENSIONS):
+                inner = self._child(children, table, node, offset)
+                # The first iterable is evaluated in the enclosing scope
+                parts = [(node.generators[0].iter, table, hidden)]
+                for position, generator in enumerate(node.generators):
+                    if position:
+                        parts.append((generator.iter, inner, hidden))
+                    parts.append((generator.target, inner, hidden))
+                    parts.extend((condition, inner, hidden) for condition in generator.ifs)
+                results = [node.value, node.key] if isinstance(node, ast.DictComp) else [node.elt]
+                parts.extend((result, inner, hidden) for result in results)
+            else:
+                parts = [(child, table, hidden) for child in ast.iter_child_nodes(node)]
+            stack.extend(reversed(parts))
+
+    @staticmethod
+    def _child(children, table, node, offset):
+        """
+        The symbol table of the scope `node` opens inside `table`, whose
+        lines are `offset` lines before the AST's
+        """
+        blocks = children.get(table.id)
+        if blocks is None:
+            blocks = children[table.id] = {}
+            for child in table.children:
+                blocks.setdefault((child.name, child.lineno), []).append(child)
+        name = SCOPE_NAMES.get(type(node)) or node.name
+        candidates = blocks.get((name, node.lineno - offset))
+        if not candidates:
+            raise ScopeMismatch(f"no symbol table for {name} on line {node.lineno}")
+        # Several on one line come in source order, as the walk takes them
+        return candidates.pop(0)
+
+class SymtableChecker:
+    """
+    Undefined names from CPython's symbol tables.
+
+    symtable classifies every name of every scope in C. A name is undefined
+    if some scope looks it up in the module's globals and nothing binds it
+    there: no module-level assignment, import or definition, no `global`
+    declaration that assigns it, and it isn't a builtin. Unlike the visitor,
+    a module-level name used above its definition is not reported.
+
+    As with the visitor, summaries are cached by the source of the
+    statements, so after an edit only the changed ones get a new symbol
+    table. Statements are only walked when they look up an undefined name.
+    When the tables can't be matched to the AST, the visitor checks the
+    code instead.
+    """
+
+    def __init__(self):
+        self.summaries = {}  # source -> SymtableSummary
+        self.fallback = None  # IncrementalChecker, once needed
+        self.size = 0  # of the code last checked
+
+    def check(self, code, defined=(), tree=None):
+        """Same result format as IncrementalChecker.check, raises SyntaxError the same way"""
+        if tree is None:
+            tree = ast.parse(code)
+        self.size = len(code)
+        try:
+            return self._check(code, defined, tree)
+        except ScopeMismatch:
+            self.summaries = {}
+            if self.fallback is None:
+                self.fallback = IncrementalChecker()
+            return self.fallback.check(code, defined, tree)
+
+    def _check(self, code, defined, tree):
+        lines = code.split("\n")
+
+        # Runs of statements sharing lines
+        runs = []  # [first line, last line, statements]
+        for statement in tree.body:
+            first = min([statement.lineno] + [d.lineno for d in getattr(statement, "decorator_list", ())])
+            if runs and first <= runs[-1][1]:
+                runs[-1][1] = max(runs[-1][1], statement.end_lineno)
+                runs[-1][2].append(statement)
+            else:
+                runs.append([first, statement.end_lineno, [statement]])
+
+        seen = {}
+        summaries = []
+        for first, last, statements in runs:
+            key = "\n".join(lines[first - 1:last])
+            summary = seen.get(key) or self.summaries.get(key)
+            if summary is None:
+                summary = SymtableSummary(key)
+            seen[key] = summary
+            summaries.append((first, statements, summary))
+        # Forget statements that no longer exist
+        self.summaries = seen
+
+        bound = set(defined)
+        for _, _, summary in summaries:
+            bound |= summary.binds
+
+        undefined = []
+        for first, statements, summary in summaries:
+            if summary.uses <= bound:
+                continue
+            undefined.extend(
+                (name, first + line, col, end_col)
+                for name, line, col, end_col in summary.find_loads(statements, first) if name not in bound
+            )
+
+        undefined.sort(key=lambda item: (item[1], item[2]))
+        if code.isascii():
+            return undefined
+
+        # ast reports columns in UTF-8 bytes
+        return [
+            (name, line, utf8_to_char_column(lines[line - 1], col), utf8_to_char_column(lines[line - 1], end_col))
+            for name, line, col, end_col in undefined
+        ]
+
+
+ENGINES = {"symtable": SymtableChecker, "visitor": IncrementalChecker}
+
+
+class IncrementalCheckers:
+    """
+    A checker per view, of the engine named by `engine` unless a check
+    names another. Checkers keep state between checks, so the checks of a
+    view run one at a time: saving runs one on the main thread while the
+    debounced check of the last edit may be running on the async thread.
+    """
+
+    def __init__(self, engine="symtable"):
+        self.engine = engine
+        self.checkers = {}
+        self.view_locks = {}  # view id -> lock held for the whole check
+        self.lock = threading.Lock()
+
+    def check(self, view_id, code, defined=(), tree=None, engine=None):
+        engine = ENGINES.get(engine or self.engine, SymtableChecker)
+        with self.lock:
+            view_lock = self.view_locks.setdefault(view_id, threading.Lock())
+        with view_lock:
+            with self.lock:
+                checker = self.checkers.get(view_id)
+                if type(checker) is not engine:
+                    checker = self.checkers[view_id] = engine()
+            return checker.check(code, defined, tree)
+
+    def discard(self, view_id):
+        with self.lock:
+            self.checkers.pop(view_id, None)
+            self.view_locks.pop(view_id, None)
+
+    def sizes(self):
+        with self.lock:
+            return {view_id: checker.size * SUMMARY_BYTES for view_id, checker in self.checkers.items()}
+
+
+undefined_checkers = IncrementalCheckers()
+memory_budget.register("undefined summaries", undefined_checkers.sizes, undefined_checkers.discard)
+
+
+def find_undefined(code, engine="symtable"):
+    """
+    Return the undefined names in `code` as sorted (name, line, column,
+    end column) tuples, with character columns on the 1-based line.
+    Raises SyntaxError if the code does not parse.
+    """
+    return ENGINES[engine]().check(code)
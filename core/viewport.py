@@ -0,0 +1,253 @@
+"""
+Analysis of large buffers limited to what the user is looking at.
+
+An Excerpt holds the top-level statements around the visible region, after
+the module's imports, so the checks and jedi see every definition enclosing
+the visible code. Statement boundaries are found from indentation, without
+parsing the buffer: a line starting in column 0 begins a statement unless it
+continues the previous one. Column 0 lines inside brackets or strings can
+fool that, so an excerpt that doesn't compile is widened a few statements at
+a time first; one that compiles by chance, like code in a string, is
+analysed as it is.
+"""
+import re
+import threading
+from bisect import bisect_right
+
+from .syntax import compiles
+
+# Column 0 lines that continue a statement instead of starting one
+CONTINUATION = re.compile(r"(?:else|elif|except|finally)\b|[)\]}]")
+
+# Candidate statement starts: the position after a newline followed by code
+LINE_WITH_CODE = re.compile(r"\n(?=[^ \t\r\n#])")
+
+# Times an excerpt that doesn't compile is widened by a statement each way
+MAX_WIDENING = 8
+
+IMPORT = re.compile(r"^(?:from[ \t]+[\w.]+[ \t]+)?import[ \t]", re.M)
+
+DEFINITION = re.compile(
+    r"^(?:(?:async[ \t]+)?def|class)[ \t]+(\w+)|"
+    r"^for[ \t]+([\w \t,]+?)[ \t]+in[ \t]|"
+    r"^([A-Za-z_][\w \t,]*?)[ \t]*(?::[^=\n]*)?=(?!=)",
+    re.M
+)
+
+
+def starts_statement(code, position):
+    """Whether the line starting at `position` begins a top-level statement"""
+    char = code[position:position + 1]
+    if not char or char in " \t\r\n#":
+        return False
+    if CONTINUATION.match(code, position):
+        return False
+    # The previous line continues onto this one
+    return not code.endswith("\\\n", 0, position) and not code.endswith("\\\r\n", 0, position)
+
+
+def statement_start(code, position):
+    """Start of the top-level statement containing `position`, decorators included"""
+    start = code.rfind("\n", 0, position) + 1
+    while start > 0 and not starts_statement(code, start):
+        start = code.rfind("\n", 0, start - 1) + 1
+    while start > 0:
+        previous = code.rfind("\n", 0, start - 1) + 1
+        if not code.startswith("@", previous):
+            break
+        start = previous
+    return start
+
+
+def statement_end(code, position):
+    """End of the top-level statement containing `position`"""
+    for match in LINE_WITH_CODE.finditer(code, position):
+        if starts_statement(code, match.end()):
+            return match.end()
+    return len(code)
+
+
+def import_end(code, start):
+    """End of the import statement at `start`, over brackets and backslashes"""
+    end = code.find("\n", start)
+    end = len(code) if end == -1 else end + 1
+    line = code[start:end]
+    if "(" in line and ")" not in line:
+        close = code.find(")", end)
+        if close != -1:
+            end = code.find("\n", close)
+            end = len(code) if end == -1 else end + 1
+    while code.endswith("\\\n", 0, end) and end < len(code):
+        next_end = code.find("\n", end)
+        end = len(code) if next_end == -1 else next_end + 1
+    return end
+
+
+class Excerpt:
+    """
+    The top-level statements of `code` overlapping [begin, end), after the
+    module's other top-level imports.
+
+    `code` is the excerpt's source, `first_line` and `last_line` the 1-based
+    lines of the buffer it covers besides the imports. `defined` holds the
+    module-level names bound outside the excerpt, which the undefined name
+    check must treat as defined.
+    """
+
+    def __init__(self, code, begin, end):
+        self.start = statement_start(code, begin)
+        self.end = statement_end(code, max(begin, end))
+        body = code[self.start:self.end]
+        for _ in range(MAX_WIDENING):
+            # Either the boundaries are wrong or the code has an error the
+            # checks will report; widening is only wasted on the latter
+            if compiles(body) or (self.start == 0 and self.end == len(code)):
+                break
+            if self.start > 0:
+                self.start = statement_start(code, self.start - 1)
+            if self.end < len(code):
+                self.end = statement_end(code, self.end)
+            body = code[self.start:self.end]
+        if not body.endswith("\n"):
+            body += "\n"
+        self.first_line = code.count("\n", 0, self.start) + 1
+        self.last_line = self.first_line + body.count("\n") - 1
+
+        parts = []  # (line in the buffer, source)
+        line, counted = 1, 0
+        for match in IMPORT.finditer(code):
+            position = match.start()
+            if self.start <= position < self.end:
+                continue
+            line += code.count("\n", counted, position)
+            counted = position
+            text = code[position:import_end(code, position)]
+            parts.append((line, text if text.endswith("\n") else text + "\n"))
+        parts.append((self.first_line, body))
+
+        self.code = "".join(text for _, text in parts)
+        self.excerpt_lines = []  # first excerpt line of each part
+        self.buffer_lines = []  # matching line in the buffer
+        excerpt_line = 1
+        for buffer_line, text in parts:
+            self.excerpt_lines.append(excerpt_line)
+            self.buffer_lines.append(buffer_line)
+            excerpt_line += text.count("\n")
+        self.body_line = self.excerpt_lines[-1]
+        self.buffer = code
+        self._defined = None
+
+    @property
+    def defined(self):
+        """Module-level names bound outside the excerpt, found on first use"""
+        if self._defined is None:
+            self._defined = set()
+            for match in DEFINITION.finditer(self.buffer):
+                if self.start <= match.start() < self.end:
+                    continue
+                for group in match.groups():
+                    if group:
+                        self._defined.update(
+                            name.strip() for name in group.split(",") if name.strip().isidentifier()
+                        )
+        return self._defined
+
+    @property
+    def version(self):
+        """Tells excerpts of one buffer version apart, for the Script cache"""
+        return f"{self.first_line}-{self.last_line}"
+
+    def to_buffer(self, line):
+        """Buffer line of 1-based excerpt `line`"""
+        index = max(bisect_right(self.excerpt_lines, line) - 1, 0)
+        return self.buffer_lines[index] + line - self.excerpt_lines[index]
+
+    def to_excerpt(self, line):
+        """Excerpt line of 1-based buffer `line`, None outside the excerpt's body"""
+        if self.first_line <= line <= self.last_line:
+            return self.body_line + line - self.first_line
+        return None
+
+
+def large_file_excerpt(document, begin, end, size_limit):
+    """
+    The Excerpt of `document` (a core.document.Document) around [begin, end)
+    if it is over `size_limit` characters
+    """
+    if not size_limit or len(document.text) <= size_limit:
+        return None
+    return document.excerpt(begin, end)
+
+
+class ViewportResults:
+    """
+    Results of the excerpts analysed in one version of each large buffer.
+    Scrolling adds excerpts to what is shown; an edit starts over.
+    """
+
+    def __init__(self):
+        self.views = {}  # view id -> [change count, [(first, last line)], results]
+        self.lock = threading.Lock()
+
+    def covers(self, view_id, change_count, first_line, last_line):
+        """Whether the lines were all analysed in this version of the view"""
+        with self.lock:
+            entry = self.views.get(view_id)
+            if entry is None or entry[0] != change_count:
+                return False
+            return any(first <= first_line and last_line <= last for first, last in entry[1])
+
+    def add(self, view_id, change_count, excerpt, results, line_of):
+        """
+        Record `results` of `excerpt`, whose buffer line is `line_of(result)`,
+        and return every result known for this version of the view
+        """
+        with self.lock:
+            entry = self.views.get(view_id)
+            if entry is None or entry[0] != change_count:
+                entry = self.views[view_id] = [change_count, [], []]
+            first, last = excerpt.first_line, excerpt.last_line
+            # The new excerpt's results replace older ones for its lines
+            kept = [result for result in entry[2] if not first <= line_of(result) <= last]
+            entry[1].append((first, last))
+            entry[2] = kept + list(results)
+            return list(entry[2])
+
+    def discard(self, view_id):
+        with self.lock:
+            self.views.pop(view_id, None)
+
+
+class ViewportWatcher:
+    """
+    Call `callback(view)` every `interval` ms for each watched view, so
+    analyses can follow scrolling, which raises no event. Views stop being
+    watched when they close or `callback` returns False.
+    """
+
+    def __init__(self, callback, set_timeout, interval=500):
+        self.callback = callback
+        self.set_timeout = set_timeout  # sublime.set_timeout_async in the plugins
+        self.interval = interval
+        self.watched = set()  # view ids
+        self.lock = threading.Lock()
+
+    def watch(self, view):
+        with self.lock:
+            if view.id() in self.watched:
+                return
+            self.watched.add(view.id())
+        self.set_timeout(lambda: self._tick(view), self.interval)
+
+    def forget(self, view):
+        with self.lock:
+            self.watched.discard(view.id())
+
+    def _tick(self, view):
+        with self.lock:
+            if view.id() not in self.watched:
+                return
+        if not view.is_valid() or self.callback(view) is False:
+            self.forget(view)
+            return
+        self.set_timeout(lambda: self._tick(view), self.interval)
@@ -0,0 +1,149 @@
+"""
+Background warm-up of jedi's caches for the modules a project uses most.
+
+The first completion on `numpy.` has jedi parse and infer the whole package.
+Warming it up front, while the user is idle, moves that cost out of the
+first interactive request.
+"""
+import itertools
+import math
+import re
+import threading
+import time
+from collections import Counter, deque
+
+from .lint import iter_python_files
+
+IMPORT = re.compile(r"^[ \t]*(?:from[ \t]+([A-Za-z_]\w*)[\w.]*[ \t]+import|import[ \t]+([A-Za-z_][\w., \t]*))", re.M)
+
+MAX_FILES = 2000  # files scanned for imports per project
+MAX_FILE_SIZE = 256 * 1024
+
+
+def imported_modules(path):
+    """Top-level modules the file at `path` imports"""
+    try:
+        with open(path, encoding="utf-8", errors="replace") as file:
+            source = file.read(MAX_FILE_SIZE)
+    except OSError:
+        return set()
+    modules = set()
+    for from_module, import_list in IMPORT.findall(source):
+        if from_module:
+            modules.add(from_module)
+            continue
+        for name in import_list.split(","):
+            words = name.split()
+            if words:
+                modules.add(words[0].split(".")[0])
+    modules.discard("__future__")
+    return modules
+
+
+class WarmUp:
+    """
+    Warm modules one at a time on the worker that runs the interactive jedi
+    requests, so the two never run together.
+
+    Each module waits until no interactive request came in for `idle` ms and
+    is queued behind any request already waiting; a request arriving while a
+    module is being warmed waits for that one module only. `start` and
+    `start_scan` replace the previous list, `cancel` drops it.
+
+    The project's imports are counted `batch` files at a time every
+    `interval` ms, so the scan never holds up the thread it shares with the
+    other plugins for long.
+    """
+
+    def __init__(self, submit, set_timeout, idle=1000, batch=20, interval=20):
+        self.submit = submit  # runs a function on the jedi worker
+        self.set_timeout = set_timeout  # sublime.set_timeout_async in the plugins
+        self.idle = idle
+        self.batch = batch
+        self.interval = interval
+        self.generation = 0
+        self.queue = deque()
+        self.last_request = 0.0
+        self.lock = threading.Lock()
+
+    def start(self, get_client, modules, path=None):
+        """Warm `modules` through the client returned by `get_client`"""
+        with self.lock:
+            self.generation += 1
+            generation = self.generation
+        self._warm_modules(generation, get_client, modules, path)
+
+    def start_scan(self, get_client, folders, count, path=None, max_files=MAX_FILES):
+        """Warm the `count` modules imported by the most files under `folders`"""
+        with self.lock:
+            self.generation += 1
+            generation = self.generation
+            self.queue = deque()
+        files = itertools.islice(iter_python_files(folders), max_files)
+        state = (generation, get_client, files, Counter(), count, path)
+        self.set_timeout(lambda: self._scan(*state), 0)
+
+    def _scan(self, generation, get_client, files, counts, count, path):
+        with self.lock:
+            if generation != self.generation:
+                return
+        scanned = 0
+        try:
+            for file_path in itertools.islice(files, self.batch):
+                counts.update(imported_modules(file_path))
+                scanned += 1
+        except Exception as ex:
+            print(f"kamal: scanning imports for the warm-up failed: {ex}")
+            return
+        if scanned < self.batch:
+            modules = [module for module, _ in counts.most_common(count)]
+            self._warm_modules(generation, get_client, modules, path)
+            return
+        self.set_timeout(lambda: self._scan(generation, get_client, files, counts, count, path), self.interval)
+
+    def _warm_modules(self, generation, get_client, modules, path):
+        with self.lock:
+            if generation != self.generation:
+                return
+            self.queue = deque(modules)
+        self.set_timeout(lambda: self._next(generation, get_client, path), self.idle)
+
+    def cancel(self):
+        with self.lock:
+            self.generation += 1
+            self.queue.clear()
+
+    def interactive(self):
+        """Note an interactive request, warming waits until the user is idle again"""
+        self.last_request = time.monotonic()
+
+    def _idle_for(self):
+        """Milliseconds to wait before the user counts as idle"""
+        return max(0, math.ceil(self.idle - (time.monotonic() - self.last_request) * 1000))
+
+    def _next(self, generation, get_client, path):
+        with self.lock:
+            if generation != self.generation or not self.queue:
+                return
+            wait = self._idle_for()
+            if not wait:
+                module = self.queue.popleft()
+        if wait:
+            self.set_timeout(lambda: self._next(generation, get_client, path), wait)
+            return
+        self.submit(self._warm, generation, get_client, module, path)
+
+    def _warm(self, generation, get_client, module, path):
+        with self.lock:
+            if generation != self.generation:
+                return
+            # A request came in while this one was queued, let it go first
+            if self._idle_for():
+                self.queue.appendleft(module)
+                module = None
+        if module is not None:
+            try:
+                get_client().call("warm_up", module=module, path=path)
+            except Exception as ex:
+                print(f"kamal: warming up {module} failed: {ex}")
+        self.set_timeout(lambda: self._next(generation, get_client, path), 0)
@@ -0,0 +1,62 @@
+import sublime
+import sublime_plugin
+
+from .core.client import running_server
+from .core.metrics import format_report, metrics
+
+SETTINGS_FILE = "kamal.sublime-settings"
+
+
+def get_setting(key, default=None):
+    return sublime.load_settings(SETTINGS_FILE).get(key, default)
+
+
+def apply_settings():
+    if get_setting("slow_operation_log", False):
+        metrics.slow_threshold = get_setting("slow_operation_threshold", 200)
+    else:
+        metrics.slow_threshold = None
+
+
+def plugin_loaded():
+    sublime.load_settings(SETTINGS_FILE).add_on_change("kamal.performance_report", apply_settings)
+    apply_settings()
+
+
+def plugin_unloaded():
+    sublime.load_settings(SETTINGS_FILE).clear_on_change("kamal.performance_report")
+
+
+class KamalPerformanceReportCommand(sublime_plugin.WindowCommand):
+    """
+    Show latency percentiles of every instrumented operation, overall and
+    per open view, in a scratch view
+    """
+
+    def run(self):
+        view_names = {
+            view.id(): view.file_name() or view.name() or "untitled"
+            for window in sublime.windows()
+            for view in window.views()
+        }
+        report = format_report(metrics.snapshot(), "Plugin host", view_names)
+
+        # Analyses run there when the server is enabled
+        server = running_server() if get_setting("analysis_server", False) else None
+        if server is not None:
+            try:
+                snapshot = server.submit("metrics").result(timeout=2)
+                report += "\n" + format_report(snapshot, "Analysis server", view_names)
+            except Exception as ex:
+                report += f"\nAnalysis server metrics unavailable: {ex}\n"
+
+        view = self.window.new_file()
+        view.set_name("kamal: Performance Report")
+        view.set_scratch(True)
+        view.run_command("append", {"characters": report})
+        view.set_read_only(True)
+
+
+class KamalPerformanceReportListener(sublime_plugin.EventListener):
+    def on_close(self, view):
+        metrics.forget(view.id())
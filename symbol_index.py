@@ -0,0 +1,69 @@
+import os
+import sublime
+import sublime_plugin
+
+from .core.symbols import INDEX_FILE, SymbolIndexer, symbol_index
+
+SETTINGS_FILE = "kamal.sublime-settings"
+
+# Milliseconds after startup before the first indexing, so it doesn't
+# compete with loading the other plugins
+START_DELAY = 3000
+
+INDEXER = SymbolIndexer(symbol_index, sublime.set_timeout_async)
+
+
+def get_setting(key, default=None):
+    return sublime.load_settings(SETTINGS_FILE).get(key, default)
+
+
+def project_folders():
+    return sorted({folder for window in sublime.windows() for folder in window.folders()})
+
+
+def index_projects(done=None):
+    """Bring the index up to date with the folders of every window"""
+    if not get_setting("symbol_index", True):
+        return
+    folders = project_folders()
+    if folders:
+        INDEXER.start(folders, done)
+
+
+def plugin_loaded():
+    # Opened on first use, so never on the main thread at startup
+    symbol_index.close()
+    symbol_index.path = os.path.join(sublime.cache_path(), "kamal", INDEX_FILE)
+    sublime.set_timeout_async(index_projects, START_DELAY)
+
+
+def plugin_unloaded():
+    INDEXER.cancel()
+    symbol_index.close()
+
+
+class KamalUpdateSymbolIndexCommand(sublime_plugin.ApplicationCommand):
+    """Index the projects' files changed outside Sublime, e.g. by a checkout"""
+
+    def run(self):
+        def done(changed):
+            stats = symbol_index.stats()
+            sublime.status_message(
+                f"kamal: {changed} files indexed again, {stats['modules']} modules and "
+                f"{stats['symbols']} symbols in the index"
+            )
+
+        index_projects(done)
+
+
+class KamalSymbolIndexListener(sublime_plugin.EventListener):
+    def on_load_project_async(self, window):
+        index_projects()
+
+    def on_post_save_async(self, view):
+        path = view.file_name()
+        if path and path.endswith(".py") and get_setting("symbol_index", True):
+            try:
+                symbol_index.index_file(os.path.abspath(path))
+            except Exception as ex:
+                print(f"kamal: indexing {path} failed: {ex}")
@@ -1,87 +1,192 @@
 import sublime
 import sublime_plugin
+import html
 import os
-import sys
+import time
 
-try:
-    import jedi
-except ImportError:
-    PLUGIN_DIR = os.path.dirname(__file__)
-    JEDI_LIB_PATH = os.path.join(PLUGIN_DIR, "jedi_lib")
-    if JEDI_LIB_PATH not in sys.path:
-        sys.path.append(JEDI_LIB_PATH)
-    import jedi
+from .core import environment
+from .core.client import close_view, get_client as get_analysis_client, stop_server
+from .core.diagnostics import DiagnosticsPublisher, diagnostics
+from .core.document import documents
+from .core.metrics import metrics
+from .core.scheduler import AnalysisScheduler
+from .core.viewport import ViewportResults, ViewportWatcher, large_file_excerpt
 
-try:
-    ENVIRONMENT = jedi.get_system_environment("3")
-except jedi.api.environment.InvalidPythonEnvironment:
-    ENVIRONMENT = jedi.get_default_environment()
+SETTINGS_FILE = "kamal.sublime-settings"
+
+
+def get_setting(key, default=None):
+    return sublime.load_settings(SETTINGS_FILE).get(key, default)
+
+
+def get_client():
+    """Run analyses in the analysis server if enabled, in process otherwise"""
+    return get_analysis_client(get_setting("analysis_server", False))
+
+
+def large_file_size():
+    """Size in characters above which only the visible part is checked, 0 for never"""
+    return get_setting("large_file_size", 1000000)
+
+
+def visible_lines(view):
+    """First and last 1-based lines of the visible region"""
+    visible = view.visible_region()
+    return view.rowcol(visible.begin())[0] + 1, view.rowcol(visible.end())[0] + 1
+
+
+def plugin_loaded():
+    environment.cache_dir = os.path.join(sublime.cache_path(), "kamal")
+    # Import jedi and find the Python environment off the main thread, so
+    # neither Sublime's startup nor the first check waits for them
+    sublime.set_timeout_async(get_client)
+
+
+def plugin_unloaded():
+    stop_server()
 
 
 class JediSyntaxErrorHighlighter(sublime_plugin.EventListener):
     def __init__(self):
         super().__init__()
-        self.error_messages = {}  # Store error messages with regions as keys
+        self.scheduler = AnalysisScheduler(self.check_syntax, sublime.set_timeout_async)
+        self.requests = {}  # view id -> (client, request) of the running check
+        # Large files are checked piecewise, following the viewport
+        self.viewport_results = ViewportResults()
+        self.watcher = ViewportWatcher(self.follow_viewport, sublime.set_timeout_async)
+        # Repaints only when the errors moved or changed
+        self.publisher = DiagnosticsPublisher(
+            "jedi_syntax_errors", "invalid", "dot", sublime.DRAW_NO_FILL, status_key="jedi_syntax_error"
+        )
 
     def on_modified_async(self, view):
     # def on_post_save_async(self, view):
         if not view.match_selector(0, "source.python"):
             return
 
-        file_content = view.substr(sublime.Region(0, view.size()))
+        # The running check is for an outdated buffer
+        running = self.requests.get(view.id())
+        if running:
+            running[0].cancel(running[1])
+
+        if large_file_size() and view.size() > large_file_size():
+            self.watcher.watch(view)
+        self.scheduler.schedule(view, get_setting("syntax_check_delay", 300))
+
+    def follow_viewport(self, view):
+        """Check the part of a large file scrolled into view, if it is new"""
+        if not large_file_size() or view.size() <= large_file_size():
+            return False
+        first, last = visible_lines(view)
+        if not self.viewport_results.covers(view.id(), view.change_count(), first, last):
+            self.scheduler.schedule(view, 0)
+
+    def on_close(self, view):
+        self.scheduler.forget(view)
+        self.watcher.forget(view)
+        self.viewport_results.discard(view.id())
+        diagnostics.discard(view.id(), "syntax")
+        self.publisher.forget(view.id())
+        documents.discard(view.id())
+        if view.match_selector(0, "source.python"):
+            close_view(get_setting("analysis_server", False), view.id())
+
+    def check_syntax(self, view, change_count):
+        # The snapshot of this version the other checks share
+        document = documents.get(view.id(), change_count, lambda: view.substr(sublime.Region(0, view.size())))
         file_path = view.file_name()
 
-        # Clear existing highlights and status
-        view.erase_regions("jedi_syntax_errors")
-        view.erase_status("jedi_syntax_error")
+        # Only the visible part of large files, with its definitions and imports
+        visible = view.visible_region()
+        excerpt = large_file_excerpt(document, visible.begin(), visible.end(), large_file_size())
+        code = excerpt.code if excerpt else document.text
 
-        self.error_messages = {}
+        try:
+            client = get_client()
+            started = time.perf_counter()
+            request = client.submit(
+                "syntax",
+                view=view.id(),
+                code=code,
+                path=file_path,
+                change_count=change_count,
+                part=excerpt.version if excerpt else None
+            )
+        except Exception as ex:
+            print(f"Error in Jedi analysis: {ex}")
+            return
+
+        # Painted when the result comes in, so this thread is free to take
+        # the next edit, which cancels the request if it is still running
+        self.requests[view.id()] = (client, request)
+        request.future.add_done_callback(lambda future: sublime.set_timeout_async(
+            lambda: self.show_errors(view, change_count, excerpt, request, started, len(code))
+        ))
+
+    def show_errors(self, view, change_count, excerpt, request, started, size):
+        """Paint the result of a finished check"""
+        if self.requests.get(view.id(), (None, None))[1] is request:
+            del self.requests[view.id()]
+        if request.future.cancelled():
+            return
+        cause = f"visible part, lines {excerpt.first_line}-{excerpt.last_line}" if excerpt else None
+        metrics.record("syntax.check", (time.perf_counter() - started) * 1000, view.id(), size, cause)
 
         try:
-            script = jedi.Script(code=file_content, path=file_path, environment=ENVIRONMENT)
-            syntax_errors = script.get_syntax_errors()
-
-            error_regions = []
-            messages = []
-            for error in syntax_errors:
-                error_line = error.line
-                error_column = error.column
-                error_message = error.get_message()
-
-                # Create a region for the invalid code
-                # error_region = sublime.Region(
-                #     view.text_point(error_line - 1, max(error_column - 1, 0)),
-                #     view.text_point(error_line - 1,  max(error_column, 0))
-                # )
-                error_start = view.text_point(error_line - 1, 0)  # Start of the line
-                error_end = view.line(error_start).end()
-                error_region = sublime.Region(error_start, error_end)
-
-                # Store the error message for later use
-                self.error_messages[str(error_region)] = error_message
-
-                # Highlight the error
-                error_region = view.line(view.text_point(error_line - 1, 0))
-                error_regions.append(error_region)
-                messages.append(f"Line {error_line}: {error_message}")
-
-            if error_regions:
-                # Add highlight
-                view.add_regions(
-                    "jedi_syntax_errors",
+            syntax_errors = request.future.result()
+
+            # The buffer was edited while jedi was running, the check
+            # scheduled for that edit will paint instead
+            if not view.is_valid() or view.change_count() != change_count:
+                return
+
+            if excerpt:
+                for error in syntax_errors:
+                    error["line"] = excerpt.to_buffer(error["line"])
+                # Errors found in the parts of this version seen before stay
+                syntax_errors = self.viewport_results.add(
+                    view.id(), change_count, excerpt, syntax_errors, lambda error: error["line"]
+                )
+                view.set_status("kamal_large_file", "kamal: checking the visible part")
+            else:
+                self.viewport_results.discard(view.id())
+                view.erase_status("kamal_large_file")
+
+            with metrics.timed("syntax.paint", view.id()):
+                error_regions = []
+                messages = []
+                entries = []
+                for error in syntax_errors:
+                    error_line = error["line"]
+                    error_column = error["column"]
+                    error_message = error["message"]
+
+                    # Create a region for the invalid code
+                    # error_region = sublime.Region(
+                    #     view.text_point(error_line - 1, max(error_column - 1, 0)),
+                    #     view.text_point(error_line - 1,  max(error_column, 0))
+                    # )
+
+                    # Highlight the whole line of the error
+                    error_region = view.line(view.text_point(error_line - 1, 0))
+                    error_regions.append(error_region)
+                    messages.append(f"Line {error_line}: {error_message}")
+
+                    # Store the error message for hover
+                    entries.append((error_region.begin(), error_region.end(), error_message))
+
+                diagnostics.set(view.id(), "syntax", entries)
+
+                # Highlight the errors and show the first one in the status
+                # bar; new errors are logged to the console
+                self.publisher.publish(
+                    view,
                     error_regions,
-                    scope="invalid",
-                    icon="dot",
-                    flags=sublime.DRAW_NO_FILL
+                    status=messages[0] if messages else None,
+                    messages=messages,
+                    log_limit=get_setting("diagnostics_log_limit", 10)
                 )
 
-                # Show the first error in the status bar
-                view.set_status("jedi_syntax_error", messages[0])
-
-            # Log all errors to the console
-            for message in messages:
-                print(message)
-
         except Exception as ex:
             print(f"Error in Jedi analysis: {ex}")
 
@@ -92,15 +197,12 @@ class JediSyntaxErrorHighlighter(sublime_plugin.EventListener):
         if hover_zone != sublime.HOVER_TEXT:
             return
 
-        # Check if the hover point is within any error region
-        for region_key, error_message in self.error_messages.items():
-            error_region = sublime.Region(*map(int, region_key.strip("Region()").split(", ")))
-            if error_region.contains(point):
-                # Show the error message as a popup
-                view.show_popup(
-                    content=error_message,
-                    location=point,
-                    flags=sublime.HIDE_ON_MOUSE_MOVE_AWAY,
-                    max_width=600
-                )
-                break
\ No newline at end of file
+        # Show the errors of the underlined line as a popup
+        messages = diagnostics.at(view.id(), point, "syntax")
+        if messages:
+            view.show_popup(
+                content="<br>".join(html.escape(message) for message in messages),
+                location=point,
+                flags=sublime.HIDE_ON_MOUSE_MOVE_AWAY,
+                max_width=600
+            )
@@ -0,0 +1,138 @@
+"""
+Completion narrowing and ranking, without Sublime. Run from the repository
+root:
+
+    python -m unittest tests.test_completion
+"""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.completion import CompletionCache, RecentCompletions, fuzzy_score, rank  # noqa: E402
+from core.environment import import_jedi  # noqa: E402
+
+# CompletionCache.store reads jedi's case sensitivity setting
+import_jedi()
+
+CODE = "import os\nos.pa\nprint(os)\n"
+CURSOR = CODE.index("pa") + 2
+SUGGESTIONS = [
+    ("path\tmodule", "path"),
+    ("pardir\tstatement", "pardir"),
+    ("pathsep\tstatement", "pathsep"),
+    ("pipe\tfunction", "pipe"),
+]
+
+
+def typed(text):
+    """CODE with `text` typed after "os.pa", and the cursor after it"""
+    code = CODE[:CURSOR] + text + CODE[CURSOR:]
+    return code, CURSOR + len(text)
+
+
+class CompletionCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.cache = CompletionCache()
+        self.cache.store(1, CODE, CURSOR, SUGGESTIONS)
+
+    def test_same_prefix(self):
+        self.assertEqual(self.cache.lookup(1, CODE, CURSOR), SUGGESTIONS)
+        self.assertEqual(self.cache.lookup(1, CODE, CURSOR, limit=2), SUGGESTIONS[:2])
+
+    def test_longer_prefix_narrows(self):
+        code, cursor = typed("t")
+        self.assertEqual(
+            [contents for _, contents in self.cache.lookup(1, code, cursor)], ["path", "pathsep"]
+        )
+        code, cursor = typed("thS")
+        self.assertEqual([contents for _, contents in self.cache.lookup(1, code, cursor)], ["pathsep"])
+        code, cursor = typed("z")
+        self.assertEqual(self.cache.lookup(1, code, cursor), [])
+        self.assertEqual(self.cache.stats()["hits"], 3)
+
+    def test_longer_prefix_keeps_limit(self):
+        code, cursor = typed("t")
+        self.assertEqual(len(self.cache.lookup(1, code, cursor, limit=1)), 1)
+
+    def test_edits_miss(self):
+        # Deleting into the stored prefix
+        self.assertIsNone(self.cache.lookup(1, CODE[:CURSOR - 1] + CODE[CURSOR:], CURSOR - 1))
+        # Edits before the identifier, after it, and a new identifier elsewhere
+        self.assertIsNone(self.cache.lookup(1, "#\n" + CODE, CURSOR + 2))
+        self.assertIsNone(self.cache.lookup(1, CODE + "x = 1\n", CURSOR))
+        self.assertIsNone(self.cache.lookup(1, CODE, len(CODE)))
+        # Another view
+        self.assertIsNone(self.cache.lookup(2, CODE, CURSOR))
+        self.assertEqual(self.cache.stats()["misses"], 5)
+
+    def test_evict(self):
+        self.cache.evict(1)
+        self.assertIsNone(self.cache.lookup(1, CODE, CURSOR))
+        self.assertEqual(self.cache.sizes(), {})
+
+    def test_store_replaces_the_view_entry(self):
+        code = "x.re"
+        self.cache.store(1, code, len(code), [("read\tfunction", "read")])
+        self.assertIsNone(self.cache.lookup(1, CODE, CURSOR))
+        self.assertEqual(self.cache.lookup(1, code + "a", len(code) + 1), [("read\tfunction", "read")])
+
+
+def ranked(names, query, limit=None, recent=()):
+    return [names[index] for index in rank([name.lower() for name in names], query, limit, recent)]
+
+
+class RankTest(unittest.TestCase):
+    def test_fuzzy_score(self):
+        self.assertIsNone(fuzzy_score("xz", "abc"))
+        self.assertIsNone(fuzzy_score("ba", "abc"))
+        # Prefixes first, shorter ones before longer ones
+        self.assertGreater(fuzzy_score("co", "cost"), fuzzy_score("co", "config"))
+        self.assertGreater(fuzzy_score("co", "config"), fuzzy_score("co", "dict_of"))
+        # Letters starting words beat letters inside them
+        self.assertGreater(fuzzy_score("gc", "get_config"), fuzzy_score("gc", "logic"))
+
+    def test_prefix_then_fuzzy_order(self):
+        names = ["get_config", "configure", "cost", "Config", "recon"]
+        self.assertEqual(ranked(names, "co"), ["cost", "Config", "configure", "get_config", "recon"])
+        self.assertEqual(ranked(names, "cfg"), ["Config", "configure", "get_config"])
+
+    def test_private_names_come_last(self):
+        names = ["_config", "__config__", "config_file", "configure"]
+        self.assertEqual(ranked(names, "con"), ["configure", "config_file", "_config", "__config__"])
+        # Unless the query asks for them
+        self.assertEqual(ranked(names, "_con"), ["_config", "__config__"])
+
+    def test_recent_names_first(self):
+        names = ["configure", "config_file", "cost"]
+        self.assertEqual(ranked(names, "co"), ["cost", "configure", "config_file"])
+        self.assertEqual(ranked(names, "co", recent=["config_file"])[0], "config_file")
+        self.assertEqual(ranked(names, "co", recent=["Configure"])[0], "configure")
+        # The latest of several wins
+        self.assertEqual(ranked(["cab", "cad"], "ca", recent=["cad", "cab"]), ["cab", "cad"])
+        self.assertEqual(ranked(["cab", "cad"], "ca", recent=["cab", "cad"]), ["cad", "cab"])
+        # The boost outweighs the private penalty, not the prefix bonus
+        self.assertEqual(ranked(["recon", "_co"], "co"), ["recon", "_co"])
+        self.assertEqual(ranked(["recon", "_co"], "co", recent=["_co"]), ["_co", "recon"])
+        self.assertEqual(ranked(["cost", "_co"], "co", recent=["_co"]), ["cost", "_co"])
+
+    def test_limit_and_ties(self):
+        names = ["ab", "ac", "ad", "ae", "abc"]
+        self.assertEqual(ranked(names, "a"), ["ab", "ac", "ad", "ae", "abc"])
+        self.assertEqual(ranked(names, "a", limit=2), ["ab", "ac"])
+        self.assertEqual(ranked(names, "", limit=3), ["ab", "ac", "ad"])
+
+    def test_case_sensitive_keys(self):
+        keys = ["Config", "config"]
+        self.assertEqual(rank(keys, "Co", case_insensitive=False), [0])
+
+    def test_recent_completions(self):
+        recent = RecentCompletions(size=3)
+        for name in ("a", "b", "c", "a", "d"):
+            recent.add(name)
+        self.assertEqual(recent.names(), ["c", "a", "d"])
+
+
+if __name__ == "__main__":
+    unittest.main()
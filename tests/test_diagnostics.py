@@ -0,0 +1,83 @@
+"""
+Hover lookups of diagnostics by point. Run from the repository root:
+
+    python -m unittest tests.test_diagnostics
+"""
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.diagnostics import DiagnosticsStore, IntervalIndex  # noqa: E402
+
+
+def brute_force(entries, point):
+    """What IntervalIndex.at must return, by checking every interval"""
+    entries = sorted(entries, key=lambda entry: entry[:2])
+    return [message for begin, end, message in entries if begin <= point <= end]
+
+
+class IntervalIndexTest(unittest.TestCase):
+    def test_empty(self):
+        index = IntervalIndex([])
+        self.assertEqual(len(index), 0)
+        self.assertEqual(index.at(0), [])
+
+    def test_inclusive_bounds(self):
+        index = IntervalIndex([(5, 8, "a")])
+        self.assertEqual([index.at(point) for point in (4, 5, 8, 9)], [[], ["a"], ["a"], []])
+
+    def test_overlapping(self):
+        index = IntervalIndex([(10, 20, "inner"), (0, 100, "outer"), (15, 30, "right"), (40, 50, "apart")])
+        self.assertEqual(index.at(5), ["outer"])
+        self.assertEqual(index.at(12), ["outer", "inner"])
+        self.assertEqual(index.at(15), ["outer", "inner", "right"])
+        self.assertEqual(index.at(25), ["outer", "right"])
+        self.assertEqual(index.at(45), ["outer", "apart"])
+        self.assertEqual(index.at(101), [])
+
+    def test_long_interval_behind_short_ones(self):
+        # The walk back must not stop at the short intervals ending before the point
+        entries = [(0, 1000, "long")] + [(n * 10, n * 10 + 2, f"short {n}") for n in range(1, 50)]
+        index = IntervalIndex(entries)
+        self.assertEqual(index.at(495), ["long"])
+        self.assertEqual(index.at(491), ["long", "short 49"])
+
+    def test_same_interval_twice(self):
+        # In the order they were given
+        index = IntervalIndex([(3, 4, "unused import"), (3, 4, "undefined name")])
+        self.assertEqual(index.at(3), ["unused import", "undefined name"])
+
+    def test_matches_brute_force(self):
+        generator = random.Random(18)
+        for _ in range(50):
+            entries = []
+            for number in range(generator.randint(0, 40)):
+                begin = generator.randint(0, 200)
+                entries.append((begin, begin + generator.choice([0, 1, 5, 30, 150]), f"m{number}"))
+            index = IntervalIndex(entries)
+            for point in range(-1, 400, 3):
+                self.assertEqual(index.at(point), brute_force(entries, point), (entries, point))
+
+
+class DiagnosticsStoreTest(unittest.TestCase):
+    def test_sources_and_discard(self):
+        store = DiagnosticsStore()
+        store.set(1, "syntax", [(0, 5, "invalid syntax")])
+        store.set(1, "undefined", [(2, 4, "undefined name 'x'")])
+        self.assertEqual(sorted(store.at(1, 3)), ["invalid syntax", "undefined name 'x'"])
+        self.assertEqual(store.at(1, 3, "undefined"), ["undefined name 'x'"])
+        self.assertEqual(store.at(2, 3), [])
+
+        store.set(1, "syntax", [])
+        self.assertEqual(store.at(1, 3), ["undefined name 'x'"])
+        store.discard(1, "undefined")
+        self.assertEqual(store.at(1, 3), [])
+        store.discard(1)
+        self.assertEqual(store.views, {})
+
+
+if __name__ == "__main__":
+    unittest.main()
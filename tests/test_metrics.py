@@ -0,0 +1,84 @@
+"""
+Latency histograms over a moving window. Run from the repository root:
+
+    python -m unittest tests.test_metrics
+"""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.metrics import Histogram, Metrics, format_report  # noqa: E402
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class HistogramTest(unittest.TestCase):
+    def test_percentiles(self):
+        histogram = Histogram(clock=Clock())
+        for ms in range(1, 101):
+            histogram.record(float(ms))
+        summary = histogram.summary()
+        self.assertEqual(summary["count"], 100)
+        self.assertAlmostEqual(summary["mean"], 50.5)
+        # Bucket bounds are 10% apart
+        self.assertTrue(50 <= summary["p50"] <= 55, summary)
+        self.assertTrue(95 <= summary["p95"] <= 100, summary)
+        self.assertEqual(summary["max"], 100.0)
+
+    def test_old_durations_leave_the_window(self):
+        clock = Clock()
+        histogram = Histogram(window=600, slots=10, clock=clock)
+        # Days of fast operations, then a slowdown
+        for _ in range(10000):
+            histogram.record(1.0)
+            clock.now += 30
+        # A quiet spell, then five minutes of slow ones
+        clock.now += 600
+        for _ in range(10):
+            histogram.record(500.0)
+            clock.now += 30
+        summary = histogram.summary()
+        self.assertEqual(summary["count"], 10)
+        self.assertEqual(summary["p50"], 500.0)
+
+        clock.now += 900
+        self.assertEqual(histogram.summary()["count"], 0)
+        self.assertEqual(len(histogram.live_slots()), 0)
+
+    def test_window_moves_one_slot_at_a_time(self):
+        clock = Clock()
+        histogram = Histogram(window=600, slots=10, clock=clock)
+        histogram.record(1.0)
+        clock.now = 60
+        histogram.record(2.0)
+        clock.now = 599
+        self.assertEqual(histogram.summary()["count"], 2)
+        clock.now = 600
+        self.assertEqual(histogram.summary()["count"], 1)
+        self.assertEqual(len(histogram.slots), 2)
+
+
+class MetricsTest(unittest.TestCase):
+    def test_snapshot_and_report(self):
+        metrics = Metrics()
+        metrics.record("completion.request", 12.0, view=3)
+        metrics.record("syntax.check", 2.0)
+        snapshot = metrics.snapshot()
+        self.assertEqual(set(snapshot["operations"]), {"completion.request", "syntax.check"})
+        self.assertEqual(set(snapshot["views"]["3"]), {"completion.request"})
+        report = format_report(snapshot, "Plugin host", {3: "main.py"})
+        self.assertIn("Last 10 minutes", report)
+        self.assertIn("View 3: main.py", report)
+        self.assertIn("Nothing recorded", format_report(Metrics().snapshot(), "Analysis server"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,132 @@
+"""
+The analysis server's protocol, without Sublime or jedi. Run from the
+repository root:
+
+    python -m unittest tests.test_server
+"""
+import io
+import json
+import os
+import sys
+import threading
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.client import AnalysisError, ServerClient  # noqa: E402
+from core.server import AnalysisServer  # noqa: E402
+
+
+class FakeAnalyzer:
+    def __init__(self):
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def complete(self, view, code):
+        self.started.set()
+        self.release.wait(5)
+        return [[code, code]]
+
+    def hover(self, view):
+        return "<p>doc</p>"
+
+    def syntax(self, view, code):
+        raise SyntaxError("invalid syntax")
+
+    def undefined(self, code):
+        return [["y", 1, 4, 5]]
+
+
+def request(request_id, method, **params):
+    return json.dumps({"id": request_id, "method": method, "params": params}) + "\n"
+
+
+def control(method, **params):
+    return json.dumps({"method": method, "params": params}) + "\n"
+
+
+def serve(lines, analyzer=None):
+    """Run a server over `lines` and return its responses by id"""
+    output = io.StringIO()
+    AnalysisServer(analyzer or FakeAnalyzer(), output).serve(lines)
+    responses = [json.loads(line) for line in output.getvalue().splitlines()]
+    return {response["id"]: response for response in responses}, responses
+
+
+class AnalysisServerTest(unittest.TestCase):
+    def test_results_and_errors_by_id(self):
+        by_id, responses = serve([
+            request(1, "undefined", code="x = y"),
+            "\n",
+            request(2, "syntax", view=1, code="x ="),
+            request(3, "nonexistent"),
+            "not json\n",
+            request(4, "hover", view=1),
+        ])
+        self.assertEqual(len(responses), 5)
+        self.assertEqual(by_id[1], {"id": 1, "result": [["y", 1, 4, 5]]})
+        self.assertEqual(by_id[2]["error"], {"type": "SyntaxError", "message": "invalid syntax"})
+        self.assertEqual(by_id[3]["error"]["type"], "ValueError")
+        self.assertIn("nonexistent", by_id[3]["error"]["message"])
+        self.assertEqual(by_id[None]["error"]["type"], "ValueError")
+        self.assertEqual(by_id[4], {"id": 4, "result": "<p>doc</p>"})
+
+    def test_cancel_running_and_queued_requests(self):
+        analyzer = FakeAnalyzer()
+
+        def lines():
+            yield request(1, "complete", view=1, code="os.pa")
+            analyzer.started.wait(5)
+            # 1 is running, 2 waits behind it
+            yield request(2, "hover", view=1)
+            yield control("cancel", id=2)
+            yield control("cancel", id=1)
+            # Unknown and finished ids are ignored
+            yield control("cancel", id=99)
+            analyzer.release.set()
+            yield request(3, "hover", view=1)
+
+        by_id, responses = serve(lines(), analyzer)
+        self.assertEqual(by_id[1], {"id": 1, "cancelled": True})
+        self.assertEqual(by_id[2], {"id": 2, "cancelled": True})
+        self.assertEqual(by_id[3], {"id": 3, "result": "<p>doc</p>"})
+        self.assertEqual(len(responses), 3)
+
+    def test_shutdown_stops_reading(self):
+        by_id, responses = serve([
+            request(1, "hover", view=1),
+            control("shutdown"),
+            request(2, "hover", view=1),
+        ])
+        self.assertEqual(list(by_id), [1])
+
+
+# A server answering `echo` after a line of noise, and never answering `hang`
+FAKE_SERVER = """
+import json, sys
+print("starting up", flush=True)
+print("a warning", file=sys.stderr, flush=True)
+for line in sys.stdin:
+    message = json.loads(line)
+    if message.get("method") == "echo":
+        print(json.dumps({"id": message["id"], "result": message["params"]}), flush=True)
+"""
+
+
+class ServerClientTest(unittest.TestCase):
+    def setUp(self):
+        self.client = ServerClient([sys.executable, "-c", FAKE_SERVER])
+        self.addCleanup(self.client.close)
+
+    def test_noise_on_stdout_is_skipped(self):
+        self.assertEqual(self.client.call("echo", value=1), {"value": 1})
+
+    def test_call_times_out(self):
+        with self.assertRaises(AnalysisError):
+            self.client.call("hang", timeout=0.2)
+        self.assertEqual(self.client.futures, {})
+        self.assertEqual(self.client.call("echo", value=2), {"value": 2})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,193 @@
+"""
+Behaviour of the undefined name check. Run from the repository root:
+
+    python -m unittest tests.test_undefined
+"""
+import ast
+import os
+import sys
+import threading
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.undefined import ENGINES, IncrementalCheckers, SymtableSummary, find_undefined  # noqa: E402
+
+BLOCK = '''
+def handler{n}(values):
+    return [value for value in values if missing_{n}]
+
+
+class Model{n}:
+    size = lambda self: missing_{n}
+'''
+
+
+def make_module(blocks):
+    return "".join(BLOCK.format(n=n) for n in range(blocks))
+
+
+# code -> the undefined names both engines report, as (name, line, column, end column)
+CASES = {
+    "global": (
+        "def f():\n"
+        "    global counter\n"
+        "    counter = 1\n"
+        "\n"
+        "def g():\n"
+        "    return counter + other\n",
+        [("other", 6, 21, 26)],
+    ),
+    "nonlocal": (
+        "def outer():\n"
+        "    total = 0\n"
+        "    def inner():\n"
+        "        nonlocal total\n"
+        "        total += step\n"
+        "    return inner\n",
+        [("step", 5, 17, 21)],
+    ),
+    "keyword-only arguments": (
+        "def f(a, *, key=default, flag):\n"
+        "    return a, key, flag, nope\n",
+        [("default", 1, 16, 23), ("nope", 2, 25, 29)],
+    ),
+    "positional-only arguments": (
+        "def f(a, b, /, c=1):\n"
+        "    return a + b + c + nope\n",
+        [("nope", 2, 23, 27)],
+    ),
+    "lambda": (
+        "handler = lambda value, *rest, scale=offset: value * scale + len(rest) + shift\n",
+        [("offset", 1, 37, 43), ("shift", 1, 73, 78)],
+    ),
+    "walrus in a comprehension": (
+        "values = [1, 2]\n"
+        "found = [last := value for value in values]\n"
+        "print(last, value)\n",
+        [("value", 3, 12, 17)],
+    ),
+    "walrus in a generator in a function": (
+        "def f(values):\n"
+        "    if any((hit := v) > 2 for v in values):\n"
+        "        return hit, v\n",
+        [("v", 3, 20, 21)],
+    ),
+    "class scope": (
+        "class A:\n"
+        "    size = 1\n"
+        "    def m(self):\n"
+        "        return size\n",
+        [("size", 4, 15, 19)],
+    ),
+    "non-ASCII columns": (
+        "café = 1\n"
+        "print('é', café, thé)\n",
+        [("thé", 2, 17, 20)],
+    ),
+}
+
+MATCH = (
+    "match command:\n"
+    "    case [\"go\", direction]:\n"
+    "        print(direction)\n"
+    "    case {\"x\": x, **rest}:\n"
+    "        print(x, rest, y)\n"
+    "    case Point(x=px) as matched:\n"
+    "        print(px, matched)\n"
+    "    case [first, *others] if first > limit:\n"
+    "        print(others)\n"
+    "    case _:\n"
+    "        print(unknown)\n"
+)
+
+
+class EnginesTest(unittest.TestCase):
+    def assert_undefined(self, code, expected):
+        for engine in ENGINES:
+            with self.subTest(engine=engine):
+                self.assertEqual(find_undefined(code, engine), expected)
+
+    def test_cases(self):
+        for name, (code, expected) in CASES.items():
+            with self.subTest(name):
+                self.assert_undefined(code, expected)
+
+    @unittest.skipIf(sys.version_info < (3, 10), "match needs Python 3.10")
+    def test_match_captures(self):
+        self.assert_undefined(MATCH, [
+            ("command", 1, 6, 13), ("y", 5, 23, 24), ("Point", 6, 9, 14),
+            ("limit", 8, 37, 42), ("unknown", 11, 14, 21),
+        ])
+
+    def test_module_use_before_assignment(self):
+        # Only the visitor follows the order the module body runs in
+        code = "def f():\n    global late\n    late = 1\nprint(late)\n"
+        self.assertEqual(find_undefined(code, "symtable"), [])
+        self.assertEqual(find_undefined(code, "visitor"), [("late", 4, 6, 10)])
+
+    def test_syntax_error(self):
+        for engine in ENGINES:
+            with self.subTest(engine=engine):
+                with self.assertRaises(SyntaxError):
+                    find_undefined("def f(:\n", engine)
+
+    def test_incremental_edits(self):
+        # Statements the edit didn't touch are summarised from before
+        checkers = IncrementalCheckers()
+        code = "import os\n\ndef f():\n    return os.sep + name\n"
+        for engine in ENGINES:
+            with self.subTest(engine=engine):
+                self.assertEqual(checkers.check(1, code, engine=engine), [("name", 4, 20, 24)])
+                edited = "name = 'x'\n" + code
+                self.assertEqual(checkers.check(1, edited, engine=engine), [])
+                self.assertEqual(checkers.check(1, code.replace("import os", "import sys"), engine=engine),
+                                 [("os", 4, 11, 13), ("name", 4, 20, 24)])
+                self.assertEqual(checkers.check(1, code, defined={"name"}, engine=engine), [])
+
+
+class ConcurrentCheckTest(unittest.TestCase):
+    """Saving checks on the main thread while the debounced check runs on the async thread"""
+
+    def setUp(self):
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        self.addCleanup(sys.setswitchinterval, interval)
+
+    def run_threads(self, target, count=4):
+        results, errors = [], []
+
+        def run():
+            try:
+                results.append(target())
+            except Exception as ex:
+                errors.append(ex)
+
+        threads = [threading.Thread(target=run) for _ in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        return results
+
+    def test_shared_summary_finds_loads_once(self):
+        source = make_module(100)
+        statements = ast.parse(source).body
+        for _ in range(10):
+            summary = SymtableSummary(source)
+            results = self.run_threads(lambda: summary.find_loads(statements, 1))
+            self.assertEqual(len(results[0]), 200)
+            self.assertTrue(all(result == results[0] for result in results))
+
+    def test_checks_of_one_view(self):
+        code = make_module(200)
+        for _ in range(10):
+            checkers = IncrementalCheckers()
+            results = self.run_threads(lambda: checkers.check(1, code))
+            self.assertEqual(len(results[0]), 400)
+            self.assertTrue(all(result == results[0] for result in results))
+
+
+if __name__ == "__main__":
+    unittest.main()
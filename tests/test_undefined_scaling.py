@@ -0,0 +1,113 @@
+"""
+The undefined name check must stay near-linear in the size of the module.
+
+UndefinedVariableChecker used to walk the whole module for every loaded
+name to tell call arguments and comprehension targets apart, which made
+checking quadratic. Checking 4x the code may take at most 4 ** 1.5 = 8x the
+time here; a quadratic check takes about 16x. Run from the repository root:
+
+    python -m unittest tests.test_undefined_scaling
+"""
+import ast
+import os
+import sys
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.undefined import ENGINES, UndefinedVariableChecker, find_undefined  # noqa: E402
+
+BLOCK = '''
+def handler{n}(request, *args, limit=10, **options):
+    values = [item * limit for item in args if item]
+    lookup = {{key: value for key, value in options.items()}}
+    total = sum(value for value in values)
+    if total > limit:
+        return lookup.get(request, total)
+    return [handler{n}(inner) for inner in values[:1]]
+
+
+class Model{n}:
+    size = {n}
+
+    def method(self, other=None):
+        return (lambda x: x + self.size)(other or missing_{n})
+
+'''
+
+# Loads in call arguments, keywords and comprehensions, one module-level
+# statement per line, the shapes that were classified by a walk of the module
+CALLS = "print(value_{n}, sorted(items, key=len), sep=separator_{n})\n"
+COMPREHENSIONS = "found_{n} = [item for item in items if item in {{key: value for key, value in pairs}}]\n"
+
+LINES = 2000
+GROWTH = 4
+MAX_RATIO = GROWTH ** 1.5
+
+
+def make_module(lines):
+    block = BLOCK.count("\n")
+    return "".join(BLOCK.format(n=n) for n in range(lines // block))
+
+
+def best_time(code, engine, repeat=3):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        find_undefined(code, engine)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def visit_time(code, repeat=3):
+    """Best time of a full UndefinedVariableChecker visit of `code`, parsed beforehand"""
+    tree = ast.parse(code)
+    timings = []
+    for _ in range(repeat):
+        checker = UndefinedVariableChecker()
+        start = time.perf_counter()
+        checker.visit(tree)
+        timings.append(time.perf_counter() - start)
+    return min(timings), checker
+
+
+class VisitorScalingTest(unittest.TestCase):
+    """The name classification of UndefinedVariableChecker itself, without the incremental layer"""
+
+    def check_scaling(self, line):
+        small, large = (
+            "".join(line.format(n=n) for n in range(lines)) for lines in (LINES, LINES * GROWTH)
+        )
+        small_time, small_checker = visit_time(small)
+        large_time, large_checker = visit_time(large)
+        self.assertEqual(len(large_checker.undefined_vars), GROWTH * len(small_checker.undefined_vars))
+        ratio = large_time / small_time
+        self.assertLess(ratio, MAX_RATIO, f"{GROWTH}x the code took {ratio:.1f}x the time")
+
+    def test_call_arguments(self):
+        self.check_scaling(CALLS)
+
+    def test_comprehensions(self):
+        self.check_scaling(COMPREHENSIONS)
+
+
+class UndefinedScalingTest(unittest.TestCase):
+    def test_results_grow_with_the_module(self):
+        small, large = make_module(LINES), make_module(LINES * GROWTH)
+        for engine in ENGINES:
+            found = find_undefined(small, engine)
+            self.assertEqual(len(found), LINES // BLOCK.count("\n"), engine)
+            self.assertTrue(all(name.startswith("missing_") for name, _, _, _ in found), engine)
+            self.assertEqual(len(find_undefined(large, engine)), GROWTH * len(found), engine)
+
+    def test_near_linear_scaling(self):
+        small, large = make_module(LINES), make_module(LINES * GROWTH)
+        for engine in ENGINES:
+            with self.subTest(engine=engine):
+                ratio = best_time(large, engine) / best_time(small, engine)
+                self.assertLess(ratio, MAX_RATIO, f"{GROWTH}x the code took {ratio:.1f}x the time")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,343 +1,226 @@
 import sublime
 import sublime_plugin
-import ast
-import builtins
 import os
+import re
 import sys
 
-class UndefinedVariableChecker(ast.NodeVisitor):
-    def __init__(self):
-        self.defined_vars = set(dir(builtins))  # Include built-in names
-        self.undefined_vars = set()
-        self.scope_vars = [set()]  # Stack for handling different scopes
-        self.imports = set()
-        self.from_imports = {}
-        self.defined_functions = set()
-        self.defined_classes = set()
-        self.assigned_vars = set()
-        self.exception_vars = set()
-        self.comprehension_vars = set()  # Track comprehension variables
-        self.function_args = set()  # Track variables passed as function arguments
-        
-        # Add all special Python variables
-        self.special_vars = {
-            '__name__',
-            '__file__',
-            '__doc__',
-            '__package__',
-            '__cached__',
-            '__spec__',
-            '__annotations__',
-            '__builtins__',
-            '__loader__',
-            '__path__',
-            '__dict__',
-            '__module__',
-            '__class__',
-            '__bases__',
-            '__mro__',
-            '__subclasses__',
-            '__init__',
-            '__new__',
-            '__del__',
-            '__repr__',
-            '__str__',
-            '__format__',
-            '__len__',
-            '__getitem__',
-            '__setitem__',
-            '__delitem__',
-            '__iter__',
-            '__next__',
-            '__contains__',
-            '__call__',
-            '__enter__',
-            '__exit__',
-            '__get__',
-            '__set__',
-            '__delete__',
-            '__slots__',
-            '__metaclass__',
-            '__qualname__',
-            '__all__',
-            'self',
-            'cls',
-        }
-        self.defined_vars.update(self.special_vars)
+from .core.client import running_server
+from .core.diagnostics import DiagnosticsPublisher, diagnostics
+from .core.document import documents
+from .core.metrics import metrics
+from .core.scheduler import AnalysisScheduler
+from .core.symbols import package_name, star_imports, symbol_index
+from .core.text import line_starts
+from .core.undefined import undefined_checkers
+from .core.viewport import ViewportResults, ViewportWatcher, large_file_excerpt
 
-    def is_special_var(self, var_name):
-        """Check if a variable name is a special Python variable"""
-        # Check if it's in our predefined special vars
-        if var_name in self.special_vars:
-            return True
-            
-        # Check if it follows dunder pattern (__x__)
-        if (len(var_name) > 4 and 
-            var_name.startswith('__') and 
-            var_name.endswith('__')):
-            return True
-            
-        return False
-            
-    def is_function_argument(self, node):
-        """Check if a Name node is being used as a function argument"""
-        # Walk up to find parent of the current node
-        for parent in ast.walk(self.current_tree):
-            for field, value in ast.iter_fields(parent):
-                if isinstance(value, list) and node in value:
-                    # If parent is a Call node and the node is in the args or keywords
-                    if isinstance(parent, ast.Call) and (field == 'args' or field == 'keywords'):
-                        return True
-                elif value == node:
-                    if isinstance(parent, ast.Call) and (field == 'args' or field == 'keywords'):
-                        return True
-                    if isinstance(parent, ast.keyword):
-                        return True
-        return False
+SETTINGS_FILE = "kamal.sublime-settings"
 
-    def visit_Name(self, node):
-        if isinstance(node.ctx, ast.Store):
-            self.scope_vars[-1].add(node.id)
-            self.assigned_vars.add(node.id)
-        elif isinstance(node.ctx, ast.Load):
-            # First check if it's a special variable
-            if self.is_special_var(node.id):
-                return
 
-            # Check if it's a function argument to avoid false positives
-            if self.is_function_argument(node):
-                self.function_args.add(node.id)
-                
-            is_defined = (
-                any(node.id in scope for scope in self.scope_vars) or
-                node.id in self.defined_vars or
-                node.id in self.imports or
-                node.id in self.defined_functions or
-                node.id in self.defined_classes or
-                node.id in self.assigned_vars or
-                node.id in self.from_imports or
-                node.id in self.exception_vars or
-                node.id in self.comprehension_vars or  # Check comprehension variables
-                node.id in self.function_args  # Don't flag function arguments as undefined
-            )
-            if not is_defined:
-                # Don't add to undefined if it's a comprehension variable
-                if not self._is_in_comprehension(node):
-                    self.undefined_vars.add((node.id, node.lineno))
+def get_setting(key, default=None):
+    return sublime.load_settings(SETTINGS_FILE).get(key, default)
 
-    def _is_in_comprehension(self, node):
-        """Check if a Name node is being used in a comprehension target"""
-        # Walk up the AST to find parent nodes
-        for parent in ast.walk(self.current_tree):
-            for child in ast.iter_child_nodes(parent):
-                if child == node:
-                    # Check if parent is a comprehension
-                    if isinstance(parent, (ast.ListComp, ast.SetComp, ast.DictComp, ast.GeneratorExp)):
-                        return True
-                    # Check if parent is a comprehension generator
-                    if isinstance(parent, ast.comprehension):
-                        if parent.target == node:
-                            return True
-        return False
 
-    def visit_ListComp(self, node):
-        # Create a new scope for the list comprehension
-        old_comprehension_vars = self.comprehension_vars.copy()
-        
-        # Add the loop variables from all generators to comprehension vars
-        for gen in node.generators:
-            if isinstance(gen.target, ast.Name):
-                self.comprehension_vars.add(gen.target.id)
-            elif isinstance(gen.target, ast.Tuple):
-                for elt in gen.target.elts:
-                    if isinstance(elt, ast.Name):
-                        self.comprehension_vars.add(elt.id)
-                        
-        # Visit the comprehension components
-        self.generic_visit(node)
-        
-        # Restore the previous comprehension vars
-        self.comprehension_vars = old_comprehension_vars
+# Results of large files, checked one visible part at a time
+VIEWPORT_RESULTS = ViewportResults()
 
-    # Also handle other types of comprehensions similarly
-    visit_SetComp = visit_ListComp
-    visit_DictComp = visit_ListComp
-    visit_GeneratorExp = visit_ListComp
+# Repaints only when the undefined names moved or changed
+PUBLISHER = DiagnosticsPublisher(
+    'undefined_vars',
+    'invalid',
+    'dot',
+    sublime.DRAW_NO_FILL | sublime.DRAW_NO_OUTLINE | sublime.DRAW_SQUIGGLY_UNDERLINE
+)
 
-    def visit_For(self, node):
-        # This method defines the loop variable before visiting its children
-        if isinstance(node.target, ast.Name):
-            self.scope_vars[-1].add(node.target.id)
-        elif isinstance(node.target, ast.Tuple):
-            for elt in node.target.elts:
-                if isinstance(elt, ast.Name):
-                    self.scope_vars[-1].add(elt.id)
-        # Visit the loop body and other parts
-        self.generic_visit(node)
 
-    def visit_ExceptHandler(self, node):
-        if node.name:  # This is the 'e' in 'except Exception as e'
-            self.exception_vars.add(node.name)
-            self.scope_vars[-1].add(node.name)
-        self.generic_visit(node)
+STAR_IMPORT = re.compile(r"^[ \t]*from[ \t]+[\w.]+[ \t]+import[ \t]*\*", re.M)
 
-    def visit_ClassDef(self, node):
-        # Add class name to defined variables
-        self.defined_classes.add(node.name)
-        self.scope_vars[-1].add(node.name)
-        
-        # New scope for class
-        self.scope_vars.append(set())
-        self.generic_visit(node)
-        self.scope_vars.pop()
 
-    def visit_FunctionDef(self, node):
-        # Add function name to defined variables
-        self.defined_functions.add(node.name)
-        self.scope_vars[-1].add(node.name)
-        
-        # Create new scope for function arguments and body
-        function_scope = set()
-        
-        # Add arguments to the new scope
-        for arg in node.args.args:
-            function_scope.add(arg.arg)
-            
-        # Handle varargs and kwargs
-        if node.args.kwarg:
-            function_scope.add(node.args.kwarg.arg)
-        if node.args.vararg:
-            function_scope.add(node.args.vararg.arg)
-            
-        self.scope_vars.append(function_scope)
-        self.generic_visit(node)
-        self.scope_vars.pop()
+def large_file_size():
+    """Size in characters above which only the visible part is checked, 0 for never"""
+    return get_setting("large_file_size", 1000000)
 
-    # Support for async functions
-    def visit_AsyncFunctionDef(self, node):
-        # Same implementation as visit_FunctionDef
-        self.defined_functions.add(node.name)
-        self.scope_vars[-1].add(node.name)
-        
-        # Create new scope for function arguments and body
-        function_scope = set()
-        
-        # Add arguments to the new scope
-        for arg in node.args.args:
-            function_scope.add(arg.arg)
-            
-        # Handle varargs and kwargs
-        if node.args.kwarg:
-            function_scope.add(node.args.kwarg.arg)
-        if node.args.vararg:
-            function_scope.add(node.args.vararg.arg)
-            
-        self.scope_vars.append(function_scope)
-        self.generic_visit(node)
-        self.scope_vars.pop()
 
-    def visit_Import(self, node):
-        for alias in node.names:
-            if alias.asname:
-                self.imports.add(alias.asname)
-            else:
-                self.imports.add(alias.name.split('.')[0])
-        self.generic_visit(node)
+def visible_lines(view):
+    """First and last 1-based lines of the visible region"""
+    visible = view.visible_region()
+    return view.rowcol(visible.begin())[0] + 1, view.rowcol(visible.end())[0] + 1
 
-    def visit_ImportFrom(self, node):
-        module = node.module if node.module else ''
-        for alias in node.names:
-            if alias.asname:
-                self.from_imports[alias.asname] = f"{module}.{alias.name}"
-                self.imports.add(alias.asname)
-            else:
-                self.from_imports[alias.name] = f"{module}.{alias.name}"
-                self.imports.add(alias.name)
-        self.generic_visit(node)
 
-    def visit_Module(self, node):
-        self.current_tree = node
-        self.generic_visit(node)
+def star_imported_names(view, change_count, content, part=None):
+    """Names the code's star imports of indexed project modules bind"""
+    if not get_setting("symbol_index", True) or not STAR_IMPORT.search(content):
+        return set()
+    try:
+        tree = documents.get(view.id(), change_count, content, part).ast
+    except Exception:
+        # The check itself reports the syntax error
+        return set()
+    path = view.file_name()
+    names = set()
+    for module in star_imports(tree, package_name(path) if path else ""):
+        # Modules outside the index stay unresolved
+        names |= symbol_index.exports(module, path) or set()
+    return names
+
+
+def find_undefined_names(view, change_count, content, defined=(), part=None):
+    """
+    Use the analysis server when it is enabled and already started by the
+    jedi plugins; this check needs nothing but the stdlib otherwise.
+    Either way only the statements changed since the last check of the view
+    are analysed again. In process the AST is shared with the syntax check.
+    """
+    defined = set(defined) | star_imported_names(view, change_count, content, part)
+    engine = get_setting("undefined_engine", "symtable")
+    server = running_server() if get_setting("analysis_server", False) else None
+    if server is not None:
+        return [
+            tuple(item)
+            for item in server.call(
+                "undefined",
+                code=content,
+                view=view.id(),
+                defined=list(defined),
+                change_count=change_count,
+                part=part,
+                engine=engine
+            )
+        ]
+    document = documents.get(view.id(), change_count, content, part)
+    return undefined_checkers.check(view.id(), document.text, defined, document.ast, engine)
 
-    # Add support for call functions to track arguments
-    def visit_Call(self, node):
-        # Process all arguments
-        for arg in node.args:
-            if isinstance(arg, ast.Name):
-                self.function_args.add(arg.id)
-                
-        # Process keyword arguments
-        for keyword in node.keywords:
-            if isinstance(keyword.value, ast.Name):
-                self.function_args.add(keyword.value.id)
-                
-        self.generic_visit(node)
 
 class CheckUndefinedVariablesCommand(sublime_plugin.TextCommand):
     def run(self, edit):
         check_undefined_variables(self.view)
 
 class UndefinedVariablesEventListener(sublime_plugin.EventListener):
+    def __init__(self):
+        super().__init__()
+        self.scheduler = AnalysisScheduler(
+            lambda view, change_count: check_undefined_variables(view, quiet=True),
+            sublime.set_timeout_async
+        )
+        # Large files are checked piecewise, following the viewport
+        self.watcher = ViewportWatcher(self.follow_viewport, sublime.set_timeout_async)
+
     def on_post_save(self, view):
         # Only check Python files
         if view.file_name() and view.file_name().endswith('.py'):
             check_undefined_variables(view)
 
-def check_undefined_variables(view):
-    # Get the entire file content
-    region = sublime.Region(0, view.size())
-    content = view.substr(region)
+    def on_modified_async(self, view):
+        if not get_setting("check_undefined_as_you_type", True):
+            return
+        if view.match_selector(0, "source.python"):
+            if large_file_size() and view.size() > large_file_size():
+                self.watcher.watch(view)
+            self.scheduler.schedule(view, get_setting("syntax_check_delay", 300))
+
+    def follow_viewport(self, view):
+        """Check the part of a large file scrolled into view, if it is new"""
+        if not large_file_size() or view.size() <= large_file_size():
+            return False
+        first, last = visible_lines(view)
+        if not VIEWPORT_RESULTS.covers(view.id(), view.change_count(), first, last):
+            self.scheduler.schedule(view, 0)
+
+    def on_close(self, view):
+        self.scheduler.forget(view)
+        self.watcher.forget(view)
+        VIEWPORT_RESULTS.discard(view.id())
+        undefined_checkers.discard(view.id())
+        diagnostics.discard(view.id(), "undefined")
+        PUBLISHER.forget(view.id())
+        documents.discard(view.id())
+
+    def on_hover(self, view, point, hover_zone):
+        """Name the undefined variable under the mouse"""
+        if hover_zone != sublime.HOVER_TEXT:
+            return
+
+        messages = diagnostics.at(view.id(), point, "undefined")
+        if messages:
+            view.show_popup(
+                content="<br>".join(messages),
+                location=point,
+                flags=sublime.HIDE_ON_MOUSE_MOVE_AWAY,
+                max_width=600
+            )
+
+def check_undefined_variables(view, quiet=False):
+    """
+    Highlight undefined variables in the view. With `quiet`, as used while
+    typing, code that doesn't parse keeps the previous highlights instead of
+    raising an error dialog.
+    """
+    # Get the entire file content, unless another check already copied it
+    change_count = view.change_count()
+    document = documents.get(view.id(), change_count, lambda: view.substr(sublime.Region(0, view.size())))
+    content = document.text
+
+    # Only the visible part of large files, with its definitions and imports
+    visible = view.visible_region()
+    excerpt = large_file_excerpt(document, visible.begin(), visible.end(), large_file_size())
     
     try:
         # Parse the code
-        tree = ast.parse(content)
-        checker = UndefinedVariableChecker()
-        checker.visit(tree)
-        
-        # Clear existing highlights
-        view.erase_regions('undefined_vars')
+        with metrics.timed("undefined.check", view.id(), len(content)) as timing:
+            if excerpt:
+                timing.cause = f"visible part, lines {excerpt.first_line}-{excerpt.last_line}"
+                undefined_vars = [
+                    (name, excerpt.to_buffer(line_no), col, end_col)
+                    for name, line_no, col, end_col in find_undefined_names(
+                        view, change_count, excerpt.code, excerpt.defined, excerpt.version
+                    )
+                ]
+                # Names found in the parts of this version seen before stay
+                undefined_vars = VIEWPORT_RESULTS.add(
+                    view.id(), change_count, excerpt, undefined_vars, lambda item: item[1]
+                )
+                view.set_status("kamal_large_file", "kamal: checking the visible part")
+            else:
+                undefined_vars = find_undefined_names(view, change_count, content)
+                VIEWPORT_RESULTS.discard(view.id())
+                view.erase_status("kamal_large_file")
         
-        # Highlight undefined variables
-        if checker.undefined_vars:
+        with metrics.timed("undefined.paint", view.id()):
+            # Highlight undefined variables
             regions = []
-            for var_name, line_no in checker.undefined_vars:
-                # Get the line region
-                line_region = view.line(view.text_point(line_no - 1, 0))
-                line_text = view.substr(line_region)
-                
-                # Find all occurrences of the variable in the line
-                start = 0
-                while True:
-                    idx = line_text.find(var_name, start)
-                    if idx == -1:
-                        break
-                    # Make sure we found a whole word
-                    if (idx == 0 or not line_text[idx-1].isalnum() and line_text[idx-1] != '_') and \
-                       (idx + len(var_name) == len(line_text) or \
-                        not line_text[idx + len(var_name)].isalnum() and line_text[idx + len(var_name)] != '_'):
-                        regions.append(sublime.Region(
-                            line_region.begin() + idx,
-                            line_region.begin() + idx + len(var_name)
-                        ))
-                    start = idx + 1
-            
-            # Add squiggly underlines to undefined variables
-            view.add_regions(
-                'undefined_vars',
-                regions,
-                'invalid',
-                'dot',
-                sublime.DRAW_NO_FILL | sublime.DRAW_NO_OUTLINE | sublime.DRAW_SQUIGGLY_UNDERLINE
-            )
-            
-            # Show error message
-            undefined_vars_list = sorted(set(var_name for var_name, _ in checker.undefined_vars))
-            message = "Undefined variables found: " + ", ".join(undefined_vars_list)
-            sublime.status_message(message)
-        else:
-            sublime.status_message("No undefined variables found")
+            if undefined_vars:
+                # Offsets of all needed lines in one pass over the content
+                starts = line_starts(content, [line_no for _, line_no, _, _ in undefined_vars])
+                regions = [
+                    sublime.Region(starts[line_no] + col, starts[line_no] + end_col)
+                    for _, line_no, col, end_col in undefined_vars
+                ]
+
+                # Indexed for hover
+                diagnostics.set(view.id(), "undefined", [
+                    (region.begin(), region.end(), f"Undefined variable <b>{var_name}</b>")
+                    for region, (var_name, _, _, _) in zip(regions, undefined_vars)
+                ])
+            else:
+                diagnostics.discard(view.id(), "undefined")
+
+            # Add squiggly underlines to undefined variables, unless they
+            # are already there
+            changed = PUBLISHER.publish(view, regions)
+
+            # Show error message, while typing only when the result changed
+            if changed or not quiet:
+                if undefined_vars:
+                    undefined_vars_list = sorted(set(var_name for var_name, _, _, _ in undefined_vars))
+                    sublime.status_message("Undefined variables found: " + ", ".join(undefined_vars_list))
+                else:
+                    sublime.status_message("No undefined variables found")
             
     except SyntaxError as e:
-        sublime.error_message(f"Syntax error in the code: {str(e)}")
+        if not quiet:
+            sublime.error_message(f"Syntax error in the code: {str(e)}")
     except Exception as e:
-        sublime.error_message(f"Error checking variables: {str(e)}")
\ No newline at end of file
+        if quiet:
+            print(f"Error checking variables: {str(e)}")
+        else:
+            sublime.error_message(f"Error checking variables: {str(e)}")
\ No newline at end of file